@@ -4,7 +4,7 @@
 from pathlib import Path
 import mkdocs_gen_files
 
-exclude_words = ["__init__", "csv_merge", "main"]
+exclude_words = ["__init__", "csv_merge", "main", "cli", "benchmark"]
 src_path = Path(__file__).parent.parent / "src"
 
 for path in sorted(src_path.rglob("*.py")):
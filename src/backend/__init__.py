@@ -1,4 +1,5 @@
 """Classes for interacting with Redfin and preforming data processing."""
 from .helper import *  # noqa
+from .listingstore import ListingStore  # noqa
 from .redfinscraper import RedfinApi  # noqa
 from .secondarydata import EIADataRetriever, CensusDataRetriever  # noqa
@@ -0,0 +1,314 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Callable, Iterable, TextIO
+
+import polars as pl
+
+from backend.helper import log
+
+# the most bytes kept in a Census cache before the least recently used entries are removed
+CENSUS_CACHE_MAX_BYTES = 4 * 1024**3
+# fast compression, since responses are written once while they download
+CENSUS_CACHE_COMPRESS_LEVEL = 1
+# bytes hashed at a time when checking an entry
+CHECKSUM_CHUNK_SIZE = 1 << 20
+COMPRESSED_SUFFIX = ".gz"
+
+
+class CensusCache:
+    """Keep Census API responses and the tables parsed from them in a folder, up to a total size.
+
+    Note:
+        Responses are stored gzip compressed and read back as a stream. Parsed tables are stored as uncompressed Arrow IPC files and memory mapped on read, so that a cached table is not parsed again.
+
+        Every entry is written to a temporary file that is renamed once complete, and its SHA-256 is kept in an index next to it. An entry is checked against its checksum the first time it is read by a process. An entry that does not match is removed, so that it is fetched again. Once the entries are larger than `max_bytes`, the least recently read ones are removed.
+
+        Uncompressed files left in the folder by earlier versions are compressed into the cache the first time they are read.
+
+    Args:
+        cache_dir_path (Path): the folder
+        max_bytes (int, optional): the most bytes to keep. Defaults to CENSUS_CACHE_MAX_BYTES.
+    """
+
+    def __init__(
+        self, cache_dir_path: Path, max_bytes: int = CENSUS_CACHE_MAX_BYTES
+    ) -> None:
+        self.cache_dir_path = cache_dir_path
+        self.max_bytes = max_bytes
+        self.cache_dir_path.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.cache_dir_path / "cache_index.db"
+        self._verified_names: set[str] = set()
+        self._evict_lock = threading.Lock()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                    name TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                )"""
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _file_path(self, name: str) -> Path:
+        return self.cache_dir_path / name
+
+    def _write_entry(self, name: str, write: Callable[[Path], None]) -> None:
+        """Write an entry through a temporary file, then index it and make room for it.
+
+        Note:
+            If `write` raises, its temporary file is removed and the exception is raised again.
+
+        Args:
+            name (str): the entry's file name
+            write (Callable[[Path], None]): writes the entry to the path it is given
+        """
+        file_path = self._file_path(name)
+        temp_file_path = file_path.with_name(f"{name}.tmp{threading.get_ident()}")
+        try:
+            write(temp_file_path)
+        except BaseException:
+            temp_file_path.unlink(missing_ok=True)
+            raise
+        sha256 = file_sha256(temp_file_path)
+        size = temp_file_path.stat().st_size
+        os.replace(temp_file_path, file_path)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (name, size, sha256, time.time()),
+            )
+        self._verified_names.add(name)
+        self.evict(keep=name)
+
+    def _read_entry(self, name: str) -> Path | None:
+        """Find an entry's file, checking it the first time it is read.
+
+        Args:
+            name (str): the entry's file name
+
+        Returns:
+            Path | None: the file, or None if there is no such entry or it did not match its checksum
+        """
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT sha256 FROM entries WHERE name = ?", (name,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE entries SET last_used = ? WHERE name = ?",
+                    (time.time(), name),
+                )
+        if row is None:
+            return None
+        file_path = self._file_path(name)
+        if name not in self._verified_names:
+            try:
+                sha256 = file_sha256(file_path)
+            except FileNotFoundError:
+                sha256 = None
+            if sha256 != row[0]:
+                log(f"Cached census file {name} is missing or corrupt", "error")
+                self.remove(name)
+                return None
+            self._verified_names.add(name)
+        return file_path
+
+    def contains(self, name: str) -> bool:
+        """Check if there is an entry, without reading it.
+
+        Args:
+            name (str): the entry's name
+
+        Returns:
+            bool: if the entry is cached, compressed or not
+        """
+        with closing(self._connect()) as conn:
+            return (
+                conn.execute(
+                    "SELECT 1 FROM entries WHERE name IN (?, ?)",
+                    (name, f"{name}{COMPRESSED_SUFFIX}"),
+                ).fetchone()
+                is not None
+                or self._file_path(name).is_file()
+            )
+
+    def remove(self, name: str) -> None:
+        """Remove an entry and its file.
+
+        Args:
+            name (str): the entry's name. Its compressed entry is removed too
+        """
+        for stored_name in [name, f"{name}{COMPRESSED_SUFFIX}"]:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("DELETE FROM entries WHERE name = ?", (stored_name,))
+            self._verified_names.discard(stored_name)
+            try:
+                self._file_path(stored_name).unlink(missing_ok=True)
+            except OSError as e:
+                # a memory mapped file cannot be removed on Windows
+                log(f"Could not remove cached census file {stored_name}: {e}", "error")
+
+    def size(self) -> int:
+        """Get the total size of the entries.
+
+        Returns:
+            int: bytes
+        """
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()[0]
+
+    def evict(self, keep: str | None = None) -> int:
+        """Remove the least recently read entries until the cache fits in `max_bytes`.
+
+        Args:
+            keep (str | None, optional): an entry not to remove, such as the one just written. Defaults to None.
+
+        Returns:
+            int: the number of entries removed
+        """
+        with self._evict_lock:
+            with closing(self._connect()) as conn:
+                total_size = conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM entries"
+                ).fetchone()[0]
+                if total_size <= self.max_bytes:
+                    return 0
+                entries = conn.execute(
+                    "SELECT name, size FROM entries ORDER BY last_used"
+                ).fetchall()
+            removed = 0
+            for name, size in entries:
+                if total_size <= self.max_bytes:
+                    break
+                if name == keep:
+                    continue
+                self.remove(name)
+                total_size -= size
+                removed += 1
+            if removed > 0:
+                log(f"Removed {removed} census cache entries to fit the cache", "info")
+            return removed
+
+    def put_chunks(self, name: str, chunks: Iterable[bytes]) -> None:
+        """Compress a stream of bytes, such as a response body, into an entry.
+
+        Args:
+            name (str): the entry's name
+            chunks (Iterable[bytes]): the bytes
+        """
+
+        def write(file_path: Path) -> None:
+            with gzip.open(
+                file_path, "wb", compresslevel=CENSUS_CACHE_COMPRESS_LEVEL
+            ) as f:
+                for chunk in chunks:
+                    f.write(chunk)
+
+        self._write_entry(f"{name}{COMPRESSED_SUFFIX}", write)
+
+    def open_text(self, name: str) -> TextIO | None:
+        """Open an entry written with `CensusCache.put_chunks` or `CensusCache.put_json` as decompressed text.
+
+        Args:
+            name (str): the entry's name
+
+        Returns:
+            TextIO | None: the text, to be closed by the caller. None if the entry is not cached
+        """
+        file_path = self._read_entry(f"{name}{COMPRESSED_SUFFIX}")
+        if file_path is None:
+            legacy_file_path = self._file_path(name)
+            if not legacy_file_path.is_file():
+                return None
+            log(f"Compressing {name} into the census cache", "debug")
+            with open(legacy_file_path, "rb") as f:
+                self.put_chunks(name, iter(lambda: f.read(CHECKSUM_CHUNK_SIZE), b""))
+            legacy_file_path.unlink()
+            file_path = self._file_path(f"{name}{COMPRESSED_SUFFIX}")
+        try:
+            return io.TextIOWrapper(gzip.open(file_path, "rb"), encoding="utf-8")
+        except FileNotFoundError:
+            return None
+
+    def get_json(self, name: str) -> Any | None:
+        """Read a JSON entry.
+
+        Args:
+            name (str): the entry's name
+
+        Returns:
+            Any | None: the value, or None if it is not cached or could not be decoded
+        """
+        f = self.open_text(name)
+        if f is None:
+            return None
+        with f:
+            try:
+                return json.load(f)
+            except (json.JSONDecodeError, EOFError, gzip.BadGzipFile) as e:
+                log(f"Could not decode cached census file {name}: {e}", "error")
+        self.remove(name)
+        return None
+
+    def put_json(self, name: str, value: Any) -> None:
+        """Write a JSON entry.
+
+        Args:
+            name (str): the entry's name
+            value (Any): a JSON serializable value
+        """
+        self.put_chunks(name, [json.dumps(value).encode()])
+
+    def get_df(self, name: str) -> pl.DataFrame | None:
+        """Memory map a table entry.
+
+        Args:
+            name (str): the entry's name
+
+        Returns:
+            pl.DataFrame | None: the table, or None if it is not cached
+        """
+        file_path = self._read_entry(name)
+        if file_path is None:
+            return None
+        return pl.read_ipc(file_path, memory_map=True)
+
+    def put_df(self, name: str, df: pl.DataFrame) -> None:
+        """Write a table entry, uncompressed so that it can be memory mapped.
+
+        Args:
+            name (str): the entry's name
+            df (pl.DataFrame): the table
+        """
+        self._write_entry(
+            name, lambda file_path: df.write_ipc(file_path, compression="uncompressed")
+        )
+
+
+def file_sha256(file_path: Path) -> str:
+    """Hash a file without reading it into memory at once.
+
+    Args:
+        file_path (Path): the file
+
+    Returns:
+        str: the hex digest
+    """
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(CHECKSUM_CHUNK_SIZE):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
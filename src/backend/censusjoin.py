@@ -0,0 +1,103 @@
+import re
+from pathlib import Path
+
+import polars as pl
+
+from backend.helper import get_zip_zcta_crosswalk_df, log
+from backend.redfinscraper import OUTPUT_DIR_PATH
+from backend.secondarydata import CENSUS_PANEL_DIR_PATH
+
+LISTING_ZIP_COL = "ZIP OR POSTAL CODE"
+
+
+def acs5_panel_lf(
+    panel_name: str, year: int, column_patterns: list[str] | None = None
+) -> pl.LazyFrame | None:
+    """Scan one year of a panel built by `CensusDataRetriever.build_acs5_panel`.
+
+    Args:
+        panel_name (str): the panel's folder name in `CENSUS_PANEL_DIR_PATH`
+        year (int): the year
+        column_patterns (list[str] | None, optional): column names and case insensitive regular expressions of the columns to keep, like "S1901_.*median". Defaults to None, meaning every column.
+
+    Returns:
+        pl.LazyFrame | None: ZCTA and the chosen columns, one row per ZCTA. None if the panel does not exist
+    """
+    panel_dir_path = CENSUS_PANEL_DIR_PATH / panel_name
+    if not panel_dir_path.is_dir():
+        log(f"No census panel named {panel_name}", "error")
+        return None
+    panel_lf = pl.scan_parquet(panel_dir_path / "*" / "*.parquet")
+    columns = [
+        column
+        for column in panel_lf.columns
+        if column not in ("ZCTA", "year")
+        and (
+            column_patterns is None
+            or any(
+                column == pattern or re.search(pattern, column, re.IGNORECASE)
+                for pattern in column_patterns
+            )
+        )
+    ]
+    return panel_lf.filter(pl.col("year") == year).select("ZCTA", *columns)
+
+
+def census_enriched_listings_lf(
+    listings_lf: pl.LazyFrame,
+    census_lf: pl.LazyFrame,
+    zip_col: str = LISTING_ZIP_COL,
+) -> pl.LazyFrame:
+    """Attach Census columns to every listing through the ZCTA of its ZIP code.
+
+    Note:
+        Both joins are lazy hash joins on integer keys, with the crosswalk from `backend.helper.get_zip_zcta_crosswalk_df`, so any number of metros can be enriched in one query.
+
+    Args:
+        listings_lf (pl.LazyFrame): listings, such as a metro's `full_info.csv`
+        census_lf (pl.LazyFrame): a ZCTA column and the columns to attach, with one row per ZCTA. See `acs5_panel_lf`
+        zip_col (str, optional): the listings' ZIP code column. Defaults to LISTING_ZIP_COL.
+
+    Returns:
+        pl.LazyFrame: `listings_lf` with the ZCTA and Census columns, null for listings whose ZIP code has no ZCTA or whose ZCTA has no Census row
+    """
+    crosswalk_lf = get_zip_zcta_crosswalk_df().lazy().rename({"ZIP": "_ZIP"})
+    return (
+        listings_lf.with_columns(pl.col(zip_col).cast(pl.UInt32).alias("_ZIP"))
+        .join(crosswalk_lf, on="_ZIP", how="left")
+        .drop("_ZIP")
+        .join(census_lf, on="ZCTA", how="left")
+    )
+
+
+def enrich_metro_listings(
+    msa_name: str,
+    year: int,
+    column_patterns: list[str] | None = None,
+    panel_name: str | None = None,
+) -> Path | None:
+    """Save a crawled metro's listings with Census columns next to its `full_info.csv`.
+
+    Args:
+        msa_name (str): name of the Metropolitan Statistical Area
+        year (int): the panel year to use
+        column_patterns (list[str] | None, optional): see `acs5_panel_lf`. Defaults to None.
+        panel_name (str | None, optional): the panel to use. Defaults to None, meaning the metro's own panel. See `CensusDataRetriever.generate_acs5_panel_for_msa`
+
+    Returns:
+        Path | None: the saved `full_info_census.csv`, or None if the listings or panel do not exist
+    """
+    file_safe_msa_name = msa_name.strip().replace(", ", "_").replace(" ", "_")
+    metro_dir_path = OUTPUT_DIR_PATH / file_safe_msa_name
+    listings_path = metro_dir_path / "full_info.csv"
+    if not listings_path.exists():
+        log(f"No listings found for {file_safe_msa_name}", "error")
+        return None
+    census_lf = acs5_panel_lf(panel_name or file_safe_msa_name, year, column_patterns)
+    if census_lf is None:
+        return None
+    enriched_path = metro_dir_path / "full_info_census.csv"
+    census_enriched_listings_lf(
+        pl.scan_csv(listings_path, dtypes={LISTING_ZIP_COL: pl.UInt32}), census_lf
+    ).collect().write_csv(enriched_path)
+    return enriched_path
@@ -0,0 +1,339 @@
+import functools
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator
+from urllib.parse import parse_qs, urlparse
+
+from backend.helper import get_zip_zcta_crosswalk_df, log
+
+# estimated quantities in each synthetic table. Profile tables have 4 variables and 4 annotations per quantity, subject and detailed tables 2 and 2
+DEFAULT_MEASURES_PER_TABLE = 100
+# data rows written to the socket at a time
+ROWS_PER_WRITE = 256
+ZCTA_FOR_PREFIX = "zip code tabulation area:"
+DATA_PATH_PATTERN = re.compile(
+    r"^/data/(?P<year>\d{4})/acs/acs5(?:/(?P<dataset>profile|subject))?(?:/groups/(?P<table>\w+)\.json)?/?$"
+)
+
+# the words that ACS labels are made of, including the phrases in `backend.secondarydata.REPLACEMENT_DICT`
+LABEL_TOPICS = [
+    "SEX AND AGE",
+    "RACE",
+    "HISPANIC OR LATINO AND RACE",
+    "HOUSEHOLDS",
+    "INCOME IN THE PAST 12 MONTHS (IN 2022 INFLATION-ADJUSTED DOLLARS)",
+    "EDUCATIONAL ATTAINMENT",
+    "HOUSING OCCUPANCY",
+]
+LABEL_WORDS = [
+    "Total population",
+    "One race",
+    "Two or more races",
+    "White",
+    "Black or African American",
+    "American Indian and Alaska Native",
+    "Asian",
+    "Native Hawaiian and Other Pacific Islander",
+    "Some other race",
+    "Hispanic or Latino",
+    "Not Hispanic or Latino",
+    "Households",
+    "Families",
+    "Median income (dollars)",
+    "Mean income (dollars)",
+    "Less than $10,000",
+    "$50,000 to $74,999",
+    "$200,000 or more",
+    "25 years and over",
+    "65 years and over",
+    "Owner-occupied",
+    "Renter-occupied",
+    "Women's",
+]
+# profile variable suffix: (label prefix, predicateType)
+PROFILE_SUFFIXES = {
+    "E": ("Estimate", "int"),
+    "M": ("Margin of Error", "int"),
+    "PE": ("Percent", "float"),
+    "PM": ("Percent Margin of Error", "float"),
+}
+# subject and detailed variable suffix
+ESTIMATE_SUFFIXES = {
+    "E": ("Estimate", "int"),
+    "M": ("Margin of Error", "int"),
+}
+
+
+def synthetic_groups(
+    dataset: str, table: str, year: str, measures: int = DEFAULT_MEASURES_PER_TABLE
+) -> dict[str, Any]:
+    """Make a table's groups metadata, in the form the Census API returns it.
+
+    Note:
+        The same table and number of measures always makes the same variables and labels, in every year. Some labels repeat, like in real tables.
+
+    Args:
+        dataset (str): "profile", "subject" or "detailed"
+        table (str): the table, like "DP05", "S1901" or "B19013"
+        year (str): the year, which only changes the concept
+        measures (int, optional): the estimated quantities in the table. Defaults to DEFAULT_MEASURES_PER_TABLE.
+
+    Returns:
+        dict[str, Any]: `{"variables": {variable: attributes}}`
+    """
+    rng = random.Random(zlib.crc32(f"{dataset}{table}".encode()))
+    variables: dict[str, dict[str, Any]] = {
+        "GEO_ID": {"label": "Geography", "predicateType": "string", "group": table},
+        "NAME": {
+            "label": "Geographic Area Name",
+            "predicateType": "string",
+            "group": table,
+        },
+    }
+    suffixes = PROFILE_SUFFIXES if dataset == "profile" else ESTIMATE_SUFFIXES
+    for measure in range(1, measures + 1):
+        label = "!!".join(
+            [
+                rng.choice(LABEL_TOPICS),
+                *rng.sample(LABEL_WORDS, rng.randint(1, 3)),
+            ]
+        )
+        match dataset:
+            case "profile":
+                code = f"{table}_{measure:04}"
+            case "subject":
+                code = (
+                    f"{table}_C{(measure - 1) % 4 + 1:02}_{(measure - 1) // 4 + 1:03}"
+                )
+            case _:
+                code = f"{table}_{measure:03}"
+        for suffix, (label_prefix, predicate_type) in suffixes.items():
+            variables[f"{code}{suffix}"] = {
+                "label": f"{label_prefix}!!{label}",
+                "concept": f"{table} ({year})",
+                "predicateType": predicate_type,
+                "group": table,
+                "limit": 0,
+                "predicateOnly": True,
+            }
+            variables[f"{code}{suffix}A"] = {
+                "label": f"Annotation of {label_prefix}!!{label}",
+                "predicateType": "string",
+                "group": table,
+            }
+    return {"variables": variables}
+
+
+def synthetic_value(variable: str, predicate_type: str, rng: random.Random) -> Any:
+    """Make one value of a data row, as a string like the Census API, or None for annotations."""
+    if predicate_type == "int":
+        return str(rng.randrange(100_000))
+    if predicate_type == "float":
+        return f"{rng.random() * 100:.1f}"
+    return None
+
+
+class CensusStandInRequestHandler(BaseHTTPRequestHandler):
+    server: "CensusStandInServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        log(f"Census stand-in: {format % args}", "debug")
+
+    def send_json(self, status: int, body: Any) -> None:
+        encoded_body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded_body)))
+        self.end_headers()
+        self.wfile.write(encoded_body)
+
+    def send_error_text(self, status: int, text: str) -> None:
+        encoded_body = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(encoded_body)))
+        self.end_headers()
+        self.wfile.write(encoded_body)
+
+    def do_GET(self) -> None:
+        self.server.requests_served += 1
+        if self.server.latency_seconds > 0:
+            time.sleep(self.server.latency_seconds)
+
+        url = urlparse(self.path)
+        path_match = DATA_PATH_PATTERN.match(url.path)
+        if path_match is None:
+            self.send_error_text(404, f"error: unknown path {url.path}")
+            return
+        year, dataset, table = path_match.group("year", "dataset", "table")
+        # detailed tables are at the root of the acs5 path
+        dataset = dataset or "detailed"
+        if table is not None:
+            self.send_json(200, self.server.groups(dataset, table, year))
+            return
+
+        query = parse_qs(url.query)
+        get_value = query.get("get", [""])[0]
+        for_value = query.get("for", [""])[0]
+        if not for_value.startswith(ZCTA_FOR_PREFIX):
+            self.send_error_text(400, "error: only ZCTA geographies are served")
+            return
+        if self.server.should_fail():
+            self.send_error_text(400, "error: error: unknown variable 'INJECTED'")
+            return
+        columns = self.server.columns(dataset, year, get_value)
+        if isinstance(columns, str):
+            self.send_error_text(400, f"error: error: unknown variable '{columns}'")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        # no Content-Length: the body is streamed and the connection closed at its end
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for chunk in self.server.data_chunks(
+            columns, for_value.removeprefix(ZCTA_FOR_PREFIX)
+        ):
+            self.wfile.write(chunk)
+
+
+class CensusStandInServer(ThreadingHTTPServer):
+    """Local stand-in for the parts of the Census data API that `CensusDataRetriever` uses.
+
+    Note:
+        Serves repeatable synthetic groups metadata and ZCTA data for any ACS 5 year profile, subject or detailed table and year, for every ZCTA in `backend.helper.get_zip_zcta_crosswalk_df` or a `for` list of them. Data requests are streamed. Unknown variables are answered with a 400, like the Census API. Set the `CENSUS_BASE_URL` environment variable to :attr:base_url to use it.
+
+    Args:
+        address (tuple[str, int], optional): the address to listen on. Defaults to a free port on localhost.
+        latency_seconds (float, optional): added to every response. Defaults to 0.
+        unknown_variable_rate (float, optional): the fraction of data requests answered with an unknown variable 400. Defaults to 0.
+        measures_per_table (int, optional): see `synthetic_groups`. Defaults to DEFAULT_MEASURES_PER_TABLE.
+        seed (int, optional): the random seed for error injection. Defaults to 0.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int] = ("127.0.0.1", 0),
+        latency_seconds: float = 0.0,
+        unknown_variable_rate: float = 0.0,
+        measures_per_table: int = DEFAULT_MEASURES_PER_TABLE,
+        seed: int = 0,
+    ) -> None:
+        super().__init__(address, CensusStandInRequestHandler)
+        self.latency_seconds = latency_seconds
+        self.unknown_variable_rate = unknown_variable_rate
+        self.measures_per_table = measures_per_table
+        self.requests_served = 0
+        self.zctas = [
+            f"{zcta:05}"
+            for zcta in get_zip_zcta_crosswalk_df()
+            .get_column("ZCTA")
+            .unique()
+            .sort()
+            .to_list()
+        ]
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/data"
+
+    def should_fail(self) -> bool:
+        with self._rng_lock:
+            return self._rng.random() < self.unknown_variable_rate
+
+    def start_in_thread(self) -> threading.Thread:
+        """Serve requests in a daemon thread.
+
+        Returns:
+            threading.Thread: the thread
+        """
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    @functools.lru_cache(maxsize=64)
+    def groups(self, dataset: str, table: str, year: str) -> dict[str, Any]:
+        return synthetic_groups(dataset, table, year, self.measures_per_table)
+
+    def columns(
+        self, dataset: str, year: str, get_value: str
+    ) -> list[tuple[str, str]] | str:
+        """Find the variables of a `get` parameter.
+
+        Args:
+            dataset (str): "profile", "subject" or "detailed"
+            year (str): the year
+            get_value (str): `group(TABLE)` or comma separated variables
+
+        Returns:
+            list[tuple[str, str]] | str: `(variable, predicateType)` for every column, or the first unknown variable
+        """
+        group_match = re.fullmatch(r"group\((\w+)\)", get_value)
+        if group_match is not None:
+            return [
+                (variable, attributes["predicateType"])
+                for variable, attributes in self.groups(
+                    dataset, group_match.group(1), year
+                )["variables"].items()
+            ]
+
+        columns = []
+        for variable in get_value.split(","):
+            attributes = (
+                self.groups(dataset, variable.split("_")[0], year)["variables"].get(
+                    variable
+                )
+                if "_" in variable or variable in ("GEO_ID", "NAME")
+                else None
+            )
+            if attributes is None:
+                return variable
+            columns.append((variable, attributes["predicateType"]))
+        return columns
+
+    def data_chunks(
+        self, columns: list[tuple[str, str]], zcta_value: str
+    ) -> Iterator[bytes]:
+        """Make a data response, a few rows at a time.
+
+        Args:
+            columns (list[tuple[str, str]]): see `CensusStandInServer.columns`
+            zcta_value (str): "*" or comma separated ZCTAs
+
+        Yields:
+            Iterator[bytes]: the JSON array of the header row and one row per ZCTA
+        """
+        zctas = (
+            self.zctas
+            if zcta_value == "*"
+            else sorted(set(zcta_value.split(",")).intersection(self.zctas))
+        )
+        yield json.dumps(
+            [[*(variable for variable, _ in columns), "zip code tabulation area"]]
+        ).encode()[:-1]
+        for batch_start in range(0, len(zctas), ROWS_PER_WRITE):
+            rows = [""]
+            for zcta in zctas[batch_start : batch_start + ROWS_PER_WRITE]:
+                rng = random.Random(int(zcta))
+                row = [
+                    f"860Z200US{zcta}"
+                    if variable == "GEO_ID"
+                    else f"ZCTA5 {zcta}"
+                    if variable == "NAME"
+                    else synthetic_value(variable, predicate_type, rng)
+                    for variable, predicate_type in columns
+                ]
+                row.append(zcta)
+                rows.append(json.dumps(row))
+            yield ",\n".join(rows).encode()
+        yield b"]"
@@ -0,0 +1,323 @@
+import random
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from enum import StrEnum
+from pathlib import Path
+from typing import Any, Iterator
+
+import polars as pl
+
+from backend.helper import OUTPUT_DIR, get_uszips_df
+
+CRAWL_STATS_PATH = OUTPUT_DIR / "crawl_stats.db"
+
+# used until a run has recorded statistics for an endpoint
+DEFAULT_LATENCY_SECONDS = 1.0
+# mean of `RedfinApi._rate_limit`
+DEFAULT_RATE_LIMIT_SECONDS = 1.3
+# recorded requests are written to the database in batches of this many, or once the oldest is this old
+RECORD_BATCH_SIZE = 50
+RECORD_FLUSH_SECONDS = 30.0
+# only the latest requests of each endpoint are kept, so that estimates follow current network conditions
+MAX_RECORDS_PER_ENDPOINT = 1000
+
+
+class CrawlPhase(StrEnum):
+    NOT_STARTED = "Not started"
+    SEARCHING = "Searching"
+    CLASSIFYING = "Classifying"
+    DONE = "Done"
+    # the crawl raised before it was done
+    FAILED = "Failed"
+
+
+class RedfinEndpoint(StrEnum):
+    REGION = "api/region"
+    GIS_CSV = "api/gis-csv"
+    INITIAL_INFO = "api/home/details/initialInfo"
+    BELOW_THE_FOLD = "api/home/details/belowTheFold"
+    RATE_LIMIT = "rate limit"
+
+
+class RequestStats:
+    """Record how long each Redfin endpoint takes, so that the cost of future crawls can be estimated.
+
+    Note:
+        Rate limit waits are recorded under `RedfinEndpoint.RATE_LIMIT`. Records are kept in memory and written in batches, see `RECORD_BATCH_SIZE`, and only the latest `MAX_RECORDS_PER_ENDPOINT` of each endpoint are kept.
+    """
+
+    def __init__(self, db_path: Path = CRAWL_STATS_PATH) -> None:
+        self.db_path = db_path
+        self._pending_records: list[tuple[str, float, int, float]] = []
+        self._pending_lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS request_stats (
+                    endpoint TEXT NOT NULL,
+                    seconds REAL NOT NULL,
+                    failed INTEGER NOT NULL,
+                    recorded_at REAL NOT NULL
+                )"""
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def record(self, endpoint: RedfinEndpoint, seconds: float, failed: bool = False):
+        """Record one request or rate limit wait.
+
+        Args:
+            endpoint (RedfinEndpoint): the endpoint
+            seconds (float): how long it took
+            failed (bool, optional): whether the request raised. Defaults to False.
+        """
+        with self._pending_lock:
+            self._pending_records.append(
+                (endpoint.value, seconds, int(failed), time.time())
+            )
+            should_flush = (
+                len(self._pending_records) >= RECORD_BATCH_SIZE
+                or time.time() - self._pending_records[0][3] >= RECORD_FLUSH_SECONDS
+            )
+        if should_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the pending records to the database and drop the oldest records past `MAX_RECORDS_PER_ENDPOINT`."""
+        with self._pending_lock:
+            records, self._pending_records = self._pending_records, []
+        if len(records) == 0:
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("INSERT INTO request_stats VALUES (?, ?, ?, ?)", records)
+            conn.execute(
+                """DELETE FROM request_stats WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (
+                            PARTITION BY endpoint ORDER BY recorded_at DESC
+                        ) AS newest_first
+                        FROM request_stats
+                    )
+                    WHERE newest_first > ?
+                )""",
+                (MAX_RECORDS_PER_ENDPOINT,),
+            )
+
+    @contextmanager
+    def time(self, endpoint: RedfinEndpoint) -> Iterator[None]:
+        """Time the body of a `with` block as a request to `endpoint`.
+
+        Args:
+            endpoint (RedfinEndpoint): the endpoint
+        """
+        start = time.perf_counter()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            self.record(endpoint, time.perf_counter() - start, failed)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Summarize the recorded statistics.
+
+        Returns:
+            dict[str, dict[str, float]]: `endpoint: {"count", "mean_seconds", "failure_rate"}`
+        """
+        self.flush()
+        with closing(self._connect()) as conn:
+            return {
+                endpoint: {
+                    "count": count,
+                    "mean_seconds": mean_seconds,
+                    "failure_rate": failure_rate,
+                }
+                for endpoint, count, mean_seconds, failure_rate in conn.execute(
+                    """SELECT endpoint, COUNT(*), AVG(seconds), AVG(failed)
+                    FROM request_stats GROUP BY endpoint"""
+                )
+            }
+
+    def estimate_seconds(self, request_counts: dict[RedfinEndpoint, int]) -> float:
+        """Estimate how long a number of requests will take.
+
+        Note:
+            Failed requests are assumed to be retried once.
+
+        Args:
+            request_counts (dict[RedfinEndpoint, int]): `endpoint: number of requests`, with rate limit waits under `RedfinEndpoint.RATE_LIMIT`
+
+        Returns:
+            float: the estimate, in seconds
+        """
+        summary = self.summary()
+        seconds = 0.0
+        for endpoint, count in request_counts.items():
+            default_seconds = (
+                DEFAULT_RATE_LIMIT_SECONDS
+                if endpoint == RedfinEndpoint.RATE_LIMIT
+                else DEFAULT_LATENCY_SECONDS
+            )
+            endpoint_summary = summary.get(
+                endpoint.value, {"mean_seconds": default_seconds, "failure_rate": 0}
+            )
+            seconds += (
+                count
+                * endpoint_summary["mean_seconds"]
+                * (1 + endpoint_summary["failure_rate"])
+            )
+        return seconds
+
+
+class CrawlProgress:
+    """Thread safe progress of a metro crawl.
+
+    Note:
+        Listings are classified in the order given by :func:plan_listing_order, so the heating makeup of the houses classified so far is an estimate of the whole metro's, and is exposed through :meth:interim_estimate.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear all progress, for starting a new crawl."""
+        with self._lock:
+            self.phase = CrawlPhase.NOT_STARTED
+            self.total = 0
+            self.done = 0
+            self.houses_found = 0
+            self.houses_classified = 0
+            self.category_counts: dict[str, int] = {}
+
+    def start_phase(self, phase: CrawlPhase, total: int = 0) -> None:
+        """Move on to the next phase of the crawl.
+
+        Args:
+            phase (CrawlPhase): the phase
+            total (int, optional): the number of steps in the phase. Defaults to 0.
+        """
+        with self._lock:
+            self.phase = phase
+            self.total = total
+            self.done = 0
+
+    def step(
+        self, houses_found: int = 0, heating_dict: dict[str, bool] | None = None
+    ) -> None:
+        """Record that a step of the current phase is done.
+
+        Args:
+            houses_found (int, optional): houses found by a search step. Defaults to 0.
+            heating_dict (dict[str, bool] | None, optional): the heating dict of a classified house. Defaults to None.
+        """
+        with self._lock:
+            self.done += 1
+            self.houses_found += houses_found
+            if heating_dict is not None:
+                self.houses_classified += 1
+                for category, has_category in heating_dict.items():
+                    self.category_counts[category] = self.category_counts.get(
+                        category, 0
+                    ) + int(has_category)
+
+    def interim_estimate(self) -> dict[str, float]:
+        """Estimate the share of houses in the metro that fall in each heating category.
+
+        Returns:
+            dict[str, float]: `category: share` of the houses classified so far. Empty if no house has been classified
+        """
+        with self._lock:
+            if self.houses_classified == 0:
+                return {}
+            return {
+                category: count / self.houses_classified
+                for category, count in self.category_counts.items()
+            }
+
+    def snapshot(self) -> dict[str, Any]:
+        """Get the current progress.
+
+        Returns:
+            dict[str, Any]: the phase, steps done and total steps, fraction done, houses found and classified, and the interim estimate
+        """
+        interim_estimate = self.interim_estimate()
+        with self._lock:
+            return {
+                "phase": self.phase,
+                "done": self.done,
+                "total": self.total,
+                "fraction": self.done / self.total if self.total > 0 else 0.0,
+                "houses_found": self.houses_found,
+                "houses_classified": self.houses_classified,
+                "interim_estimate": interim_estimate,
+            }
+
+
+def plan_zip_code_order(zip_codes: list[int], seed: int = 0) -> list[int]:
+    """Order ZIP codes so that the ZIP codes searched first are a population weighted sample of the metro.
+
+    Note:
+        This is weighted sampling without replacement: each ZIP code is keyed by `u ** (1 / population)` for a uniform random `u`, and the keys are sorted from largest to smallest.
+
+    Args:
+        zip_codes (list[int]): the ZIP codes
+        seed (int, optional): the random seed. Defaults to 0.
+
+    Returns:
+        list[int]: the ZIP codes in the order they should be searched
+    """
+    population_by_zip = dict(
+        get_uszips_df()
+        .select(
+            pl.col("zip").cast(pl.Int64),
+            pl.col("population").fill_null(0),
+        )
+        .rows()
+    )
+    rng = random.Random(seed)
+    keys = {
+        zip_code: rng.random() ** (1 / max(population_by_zip.get(zip_code, 0), 1))
+        for zip_code in zip_codes
+    }
+    return sorted(zip_codes, key=lambda zip_code: keys[zip_code], reverse=True)
+
+
+def plan_listing_order(
+    df: pl.DataFrame, zip_col: str = "ZIP OR POSTAL CODE", seed: int = 0
+) -> pl.DataFrame:
+    """Interleave listings across ZIP codes in proportion to each ZIP code's listing count.
+
+    Note:
+        Listings are shuffled within their ZIP code, then the i-th of n listings in a ZIP code is placed at `(i + offset) / n`, where `offset` is a random per ZIP code jitter. Any prefix of the result is then a stratified sample of the metro.
+
+    Args:
+        df (pl.DataFrame): the listings
+        zip_col (str, optional): the ZIP code column. Defaults to "ZIP OR POSTAL CODE".
+        seed (int, optional): the random seed. Defaults to 0.
+
+    Returns:
+        pl.DataFrame: the listings in the order they should be classified
+    """
+    if df.height == 0:
+        return df
+    rng = random.Random(seed)
+    zip_offsets_df = df.select(pl.col(zip_col).unique(maintain_order=True))
+    zip_offsets_df = zip_offsets_df.with_columns(
+        pl.Series("_offset", [rng.random() for _ in range(zip_offsets_df.height)])
+    )
+    return (
+        df.sample(fraction=1, shuffle=True, seed=seed)
+        .join(zip_offsets_df, on=zip_col, how="left")
+        .with_columns(
+            (
+                (pl.col(zip_col).cum_count().over(zip_col) + pl.col("_offset"))
+                / pl.count().over(zip_col)
+            ).alias("_order")
+        )
+        .sort("_order")
+        .drop("_offset", "_order")
+    )
@@ -0,0 +1,281 @@
+import datetime
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+from backend.helper import log
+from backend.us import states as sts
+
+# the most rows the EIA API returns per request
+MAX_ROWS_PER_RESPONSE = 5000
+# data served when a request has no start or end
+DEFAULT_START_DATE = datetime.date(2015, 1, 1)
+
+# route: (frequency, data column, state facet, state facet value format, typical price, unit, extra row fields)
+ROUTES: dict[str, tuple[str, str, str, str, float, str, dict[str, str]]] = {
+    "electricity/retail-sales": (
+        "monthly",
+        "price",
+        "stateid",
+        "{}",
+        14.0,
+        "cents per kilowatt-hour",
+        {"sectorid": "RES", "sectorName": "residential"},
+    ),
+    "natural-gas/pri/sum": (
+        "monthly",
+        "value",
+        "duoarea",
+        "S{}",
+        14.0,
+        "$/MCF",
+        {"product": "EPG0", "process": "PRS"},
+    ),
+    "petroleum/pri/wfr": (
+        "weekly",
+        "value",
+        "duoarea",
+        "S{}",
+        3.5,
+        "$/GAL",
+        {"process": "PRS"},
+    ),
+}
+# propane is cheaper than heating oil per gallon
+PETROLEUM_PRODUCT_PRICE_FACTORS = {"EPD2F": 1.0, "EPLLPA": 0.8}
+HEATING_SEASON_MONTHS = {10, 11, 12, 1, 2, 3}
+
+
+def synthetic_price(
+    typical_price: float, state: str, period: datetime.date, salt: str = ""
+) -> float:
+    """Make a repeatable price for a state and period.
+
+    Note:
+        Prices vary by state, rise about 3% a year from 2015 and peak in winter.
+
+    Args:
+        typical_price (float): the price the series varies around
+        state (str): 2 character postal code
+        period (datetime.date): the period
+        salt (str, optional): distinguishes series of the same route. Defaults to "".
+
+    Returns:
+        float: the price, rounded to 3 decimal places
+    """
+    state_factor = 0.8 + (zlib.crc32(f"{state}{salt}".encode()) % 400) / 1000
+    trend_factor = 1.03 ** (period.year - 2015 + period.month / 12)
+    season_factor = 1 + 0.08 * math.cos(2 * math.pi * (period.month - 1) / 12)
+    return round(typical_price * state_factor * trend_factor * season_factor, 3)
+
+
+def series_periods(
+    frequency: str, start: str | None, end: str | None
+) -> list[datetime.date]:
+    """List the periods of a series between `start` and `end`, both inclusive like the EIA API.
+
+    Note:
+        Weekly series are on Mondays, and only in the heating season. Nothing after today is returned.
+
+    Args:
+        frequency (str): "monthly" or "weekly"
+        start (str | None): `YYYY-MM` or `YYYY-MM-DD`
+        end (str | None): `YYYY-MM` or `YYYY-MM-DD`
+
+    Returns:
+        list[datetime.date]: the periods
+    """
+    start_date = (
+        DEFAULT_START_DATE
+        if start is None
+        else datetime.date.fromisoformat(start if len(start) > 7 else f"{start}-01")
+    )
+    end_date = (
+        datetime.date.today()
+        if end is None
+        else datetime.date.fromisoformat(end if len(end) > 7 else f"{end}-01")
+    )
+    end_date = min(end_date, datetime.date.today())
+
+    periods = []
+    if frequency == "monthly":
+        period = start_date.replace(day=1)
+        while period <= end_date:
+            periods.append(period)
+            period = datetime.date(
+                period.year + period.month // 12, period.month % 12 + 1, 1
+            )
+    else:
+        period = start_date + datetime.timedelta(days=-start_date.weekday() % 7)
+        while period <= end_date:
+            if period.month in HEATING_SEASON_MONTHS:
+                periods.append(period)
+            period += datetime.timedelta(days=7)
+    return periods
+
+
+class EIAStandInRequestHandler(BaseHTTPRequestHandler):
+    server: "EIAStandInServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        log(f"EIA stand-in: {format % args}", "debug")
+
+    def send_json(self, status: int, body: dict[str, Any]) -> None:
+        encoded_body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded_body)))
+        self.end_headers()
+        self.wfile.write(encoded_body)
+
+    def do_GET(self) -> None:
+        self.server.requests_served += 1
+        if self.server.latency_seconds > 0:
+            time.sleep(self.server.latency_seconds)
+        if self.server.should_fail():
+            self.send_json(503, {"error": "injected error", "code": 503})
+            return
+
+        url = urlparse(self.path)
+        route = url.path.removeprefix("/v2/").removesuffix("/").removesuffix("/data")
+        if route not in ROUTES:
+            self.send_json(404, {"error": f"unknown route {route}", "code": 404})
+            return
+        query = parse_qs(url.query)
+        if "api_key" not in query:
+            self.send_json(403, {"error": "no api_key", "code": 403})
+            return
+
+        rows = self.server.rows(route, query)
+        offset = int(query.get("offset", ["0"])[0])
+        length = min(
+            int(query.get("length", [str(MAX_ROWS_PER_RESPONSE)])[0]),
+            MAX_ROWS_PER_RESPONSE,
+        )
+        self.send_json(
+            200,
+            {
+                "response": {
+                    "total": str(len(rows)),
+                    "frequency": ROUTES[route][0],
+                    "data": rows[offset : offset + length],
+                },
+                "request": {"command": f"/v2/{route}/data/"},
+                "apiVersion": "2.1.0",
+            },
+        )
+
+
+class EIAStandInServer(ThreadingHTTPServer):
+    """Local stand-in for the parts of the EIA v2 API that `EIADataRetriever` uses.
+
+    Note:
+        Serves repeatable synthetic prices for the electricity, natural gas and weekly petroleum routes, with the facets, start, end, offset and length parameters, and the 5000 row limit. Set the `EIA_BASE_URL` environment variable to :attr:base_url to use it.
+
+    Args:
+        address (tuple[str, int], optional): the address to listen on. Defaults to a free port on localhost.
+        latency_seconds (float, optional): added to every response. Defaults to 0.
+        error_rate (float, optional): the fraction of requests answered with a 503. Defaults to 0.
+        seed (int, optional): the random seed for error injection. Defaults to 0.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int] = ("127.0.0.1", 0),
+        latency_seconds: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        super().__init__(address, EIAStandInRequestHandler)
+        self.latency_seconds = latency_seconds
+        self.error_rate = error_rate
+        self.requests_served = 0
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v2"
+
+    def should_fail(self) -> bool:
+        with self._rng_lock:
+            return self._rng.random() < self.error_rate
+
+    def start_in_thread(self) -> threading.Thread:
+        """Serve requests in a daemon thread.
+
+        Returns:
+            threading.Thread: the thread
+        """
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def rows(self, route: str, query: dict[str, list[str]]) -> list[dict[str, Any]]:
+        """Make every row matching a request, sorted by period then state.
+
+        Args:
+            route (str): the route, like "electricity/retail-sales"
+            query (dict[str, list[str]]): the parsed query string
+
+        Returns:
+            list[dict[str, Any]]: the rows
+        """
+        (
+            frequency,
+            data_column,
+            state_facet,
+            state_format,
+            typical_price,
+            unit,
+            extra_fields,
+        ) = ROUTES[route]
+        state_prefix = state_format.removesuffix("{}")
+        states = sorted(
+            facet_value.removeprefix(state_prefix)
+            for facet_value in query.get(
+                f"facets[{state_facet}][]",
+                [state_format.format(state.abbr) for state in sts.STATES],
+            )
+        )
+        products = query.get("facets[product][]", [extra_fields.get("product", "")])
+
+        rows = []
+        for period in series_periods(
+            frequency, query.get("start", [None])[0], query.get("end", [None])[0]
+        ):
+            period_str = (
+                f"{period.year}-{period.month:02}"
+                if frequency == "monthly"
+                else period.isoformat()
+            )
+            for state in states:
+                for product in products:
+                    price = synthetic_price(
+                        typical_price * PETROLEUM_PRODUCT_PRICE_FACTORS.get(product, 1),
+                        state,
+                        period,
+                        salt=product,
+                    )
+                    row = {
+                        "period": period_str,
+                        state_facet: state_format.format(state),
+                        **extra_fields,
+                        data_column: price,
+                        f"{data_column}-units"
+                        if data_column == "price"
+                        else "units": unit,
+                    }
+                    if product != "":
+                        row["product"] = product
+                    rows.append(row)
+        return rows
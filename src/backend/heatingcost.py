@@ -0,0 +1,225 @@
+import datetime
+from pathlib import Path
+
+import polars as pl
+
+from backend.redfinscraper import CATEGORY_PATTERNS
+from backend.secondarydata import EIADataRetriever
+
+STATE_COL = "STATE OR PROVINCE"
+SQUARE_FEET_COL = "SQUARE FEET"
+
+# space heating load of an average US home, about 40 million BTU a year over about 2,000 square feet
+# https://www.eia.gov/consumption/residential/data/2020/
+DEFAULT_MBTU_PER_SQUARE_FOOT = 20.0
+
+# the share of a year's heating load that falls in each month, following the national heating degree day normals
+MONTHLY_HEATING_LOAD_SHARES = {
+    1: 0.22,
+    2: 0.18,
+    3: 0.14,
+    4: 0.07,
+    5: 0.02,
+    6: 0.0,
+    7: 0.0,
+    8: 0.0,
+    9: 0.01,
+    10: 0.05,
+    11: 0.12,
+    12: 0.19,
+}
+
+# the heater a listing is assumed to have, from its heating categories. The first match wins
+# see `backend.redfinscraper.CATEGORY_PATTERNS`. Propane comes before natural gas, since "Propane Gas" also matches the natural gas pattern
+CURRENT_HEATER_RULES: list[tuple[pl.Expr, str]] = [
+    (pl.col("Heat Pump"), "HEAT_PUMP_DUCTED"),
+    (pl.col("Propane") & (pl.col("Boiler") | pl.col("Radiator")), "PROPANE_BOILER"),
+    (pl.col("Propane"), "PROPANE_FURNACE"),
+    (
+        pl.col("Natural Gas") & (pl.col("Boiler") | pl.col("Radiator")),
+        "NG_BOILER",
+    ),
+    (pl.col("Natural Gas"), "NG_FURNACE"),
+    (pl.col("Diesel/Heating Oil") & pl.col("Furnace"), "OIL_FURNACE"),
+    (pl.col("Diesel/Heating Oil"), "OIL_BOILER"),
+    (pl.col("Electricity") | pl.col("Baseboard"), "BASEBOARD"),
+]
+HEAT_PUMP_HEATERS = ["HEAT_PUMP_DUCTED", "HEAT_PUMP_DUCTLESS"]
+HEATER_PRICE_SCHEMA = {
+    "state": pl.Utf8,
+    "period": pl.Date,
+    "heater": pl.Utf8,
+    "price_per_mbtu": pl.Float64,
+}
+
+
+def current_heater_expr() -> pl.Expr:
+    """Make an expression for the heater a listing is assumed to have.
+
+    Returns:
+        pl.Expr: the heater name in `EIADataRetriever.HeaterEfficiencies`, or null for listings heated with wood, solar or nothing that was classified
+    """
+    (first_condition, first_heater), *other_rules = CURRENT_HEATER_RULES
+    heater_expr = pl.when(first_condition).then(pl.lit(first_heater))
+    for condition, heater in other_rules:
+        heater_expr = heater_expr.when(condition).then(pl.lit(heater))
+    return heater_expr.otherwise(pl.lit(None, dtype=pl.Utf8)).alias("current_heater")
+
+
+def annual_heater_price_lf(
+    heater_price_lf: pl.LazyFrame,
+    monthly_load_shares: dict[int, float] = MONTHLY_HEATING_LOAD_SHARES,
+) -> pl.LazyFrame:
+    """Weigh each state's monthly heater prices by how much heating is done in that month.
+
+    Note:
+        Months without a price, such as propane and heating oil outside of the heating season, are left out and the remaining shares are scaled back up to 1.
+
+    Args:
+        heater_price_lf (pl.LazyFrame): a year of prices with state, period, heater and price_per_mbtu columns. See `EIADataRetriever.heater_price_per_mbtu_df` and `EIADataRetriever.price_cube_slice`
+        monthly_load_shares (dict[int, float], optional): `month: share of the year's heating load`. Defaults to MONTHLY_HEATING_LOAD_SHARES.
+
+    Returns:
+        pl.LazyFrame: one row per state and heater, with the columns state, heater and annual_price_per_mbtu
+    """
+    load_share_lf = pl.LazyFrame(
+        {
+            "_month": list(monthly_load_shares),
+            "_load_share": list(monthly_load_shares.values()),
+        },
+        schema={"_month": pl.Int8, "_load_share": pl.Float64},
+    )
+    return (
+        heater_price_lf.drop_nulls("price_per_mbtu")
+        .with_columns(pl.col("period").dt.month().cast(pl.Int8).alias("_month"))
+        .join(load_share_lf, on="_month", how="inner")
+        .group_by("state", "heater")
+        .agg(
+            (
+                (pl.col("price_per_mbtu") * pl.col("_load_share")).sum()
+                / pl.col("_load_share").sum()
+            ).alias("annual_price_per_mbtu")
+        )
+        .filter(pl.col("annual_price_per_mbtu").is_finite())
+    )
+
+
+def heating_cost_lf(
+    listings_lf: pl.LazyFrame,
+    heater_price_lf: pl.LazyFrame,
+    mbtu_per_square_foot: float = DEFAULT_MBTU_PER_SQUARE_FOOT,
+    monthly_load_shares: dict[int, float] = MONTHLY_HEATING_LOAD_SHARES,
+) -> pl.LazyFrame:
+    """Estimate each listing's annual heating cost, and what it would save with a ducted or ductless heat pump.
+
+    Note:
+        The monthly prices are first reduced to one load weighted price per state and heater, so that every listing is joined to a small table instead of to every month, all in one lazy query. A listing's heating load is its square footage times `mbtu_per_square_foot`.
+
+    Args:
+        listings_lf (pl.LazyFrame): listings in the form of a metro's `full_info.csv`, with state, square footage and heating category columns. Any number of metros can be concatenated
+        heater_price_lf (pl.LazyFrame): a year of heater prices. See `annual_heater_price_lf`
+        mbtu_per_square_foot (float, optional): the yearly heating load per square foot, in MBTU. Defaults to DEFAULT_MBTU_PER_SQUARE_FOOT.
+        monthly_load_shares (dict[int, float], optional): see `annual_heater_price_lf`. Defaults to MONTHLY_HEATING_LOAD_SHARES.
+
+    Returns:
+        pl.LazyFrame: `listings_lf` with the columns current_heater, heating_mbtu, current_cost, heat_pump_ducted_cost, heat_pump_ductless_cost, heat_pump_ducted_savings and heat_pump_ductless_savings. Costs are null where the heater or its state's price is unknown
+    """
+    annual_price_lf = annual_heater_price_lf(heater_price_lf, monthly_load_shares)
+    cost_lf = listings_lf.with_columns(
+        current_heater_expr(),
+        (pl.col(SQUARE_FEET_COL).cast(pl.Float64) * mbtu_per_square_foot).alias(
+            "heating_mbtu"
+        ),
+    ).join(
+        annual_price_lf.rename(
+            {"heater": "current_heater", "annual_price_per_mbtu": "_current_price"}
+        ),
+        left_on=[STATE_COL, "current_heater"],
+        right_on=["state", "current_heater"],
+        how="left",
+    )
+    for heater in HEAT_PUMP_HEATERS:
+        cost_lf = cost_lf.join(
+            annual_price_lf.filter(pl.col("heater") == heater).select(
+                "state", pl.col("annual_price_per_mbtu").alias(f"_{heater}_price")
+            ),
+            left_on=STATE_COL,
+            right_on="state",
+            how="left",
+        )
+    return (
+        cost_lf.with_columns(
+            (pl.col("heating_mbtu") * pl.col("_current_price")).alias("current_cost"),
+            *[
+                (pl.col("heating_mbtu") * pl.col(f"_{heater}_price")).alias(
+                    f"{heater.lower()}_cost"
+                )
+                for heater in HEAT_PUMP_HEATERS
+            ],
+        )
+        .with_columns(
+            *[
+                (pl.col("current_cost") - pl.col(f"{heater.lower()}_cost")).alias(
+                    f"{heater.lower()}_savings"
+                )
+                for heater in HEAT_PUMP_HEATERS
+            ]
+        )
+        .drop("_current_price", *[f"_{heater}_price" for heater in HEAT_PUMP_HEATERS])
+    )
+
+
+def metro_heating_cost_df(
+    listings_path: Path,
+    year: int,
+    mbtu_per_square_foot: float = DEFAULT_MBTU_PER_SQUARE_FOOT,
+    eia: EIADataRetriever | None = None,
+) -> pl.DataFrame:
+    """Estimate the heating costs of every listing in a metro's `full_info.csv`.
+
+    Note:
+        Prices are read from the energy price cube. States that are not in it for `year`, or whose `year` is stale (see `EIADataRetriever.is_price_cube_slice_stale`), are fetched, like the energy plot on the data page.
+
+    Args:
+        listings_path (Path): a `full_info.csv`, or a glob of several
+        year (int): the year of prices to use
+        mbtu_per_square_foot (float, optional): see `heating_cost_lf`. Defaults to DEFAULT_MBTU_PER_SQUARE_FOOT.
+        eia (EIADataRetriever | None, optional): the retriever to get prices with. Defaults to None, meaning a new one.
+
+    Returns:
+        pl.DataFrame: see `heating_cost_lf`
+    """
+    if eia is None:
+        eia = EIADataRetriever()
+    listings_lf = pl.scan_csv(
+        listings_path,
+        dtypes={
+            STATE_COL: pl.Utf8,
+            SQUARE_FEET_COL: pl.UInt32,
+            **{category: pl.Boolean for category in CATEGORY_PATTERNS},
+        },
+    )
+    states = (
+        listings_lf.select(pl.col(STATE_COL).unique().drop_nulls())
+        .collect()
+        .to_series()
+        .to_list()
+    )
+
+    heater_price_dfs = [pl.DataFrame(schema=HEATER_PRICE_SCHEMA)]
+    for state in states:
+        heater_price_df = eia.price_cube_slice(state, year)
+        if eia.is_price_cube_slice_stale(heater_price_df, year):
+            heater_price_df = eia.heater_price_per_mbtu_df(
+                eia.monthly_price_per_mbtu_df_by_state(
+                    state, datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+                )
+            )
+        heater_price_dfs.append(
+            heater_price_df.select("state", "period", "heater", "price_per_mbtu")
+        )
+    heater_price_lf = pl.concat(
+        heater_price_dfs,
+        how="vertical_relaxed",
+    ).lazy()
+    return heating_cost_lf(listings_lf, heater_price_lf, mbtu_per_square_foot).collect()
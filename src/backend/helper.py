@@ -1,8 +1,13 @@
+import functools
 import logging
 import os
+import re
+import threading
 import time
+import zipfile
 from enum import StrEnum
 from pathlib import Path
+from urllib.parse import quote_plus, urlparse
 
 import polars as pl
 import requests
@@ -12,12 +17,26 @@ from .us import states as sts
 LOGGING_DIR = Path(__file__).parent.parent.parent / "output" / "logging"
 LOGGING_FILE_PATH = LOGGING_DIR / "logging.log"
 OUTPUT_DIR = Path(__file__).parent.parent.parent / "output"
+AUGMENTING_DATA_DIR = Path(__file__).parent.parent.parent / "augmenting_data"
+USZIPS_ZIP_FILE_PATH = AUGMENTING_DATA_DIR / "simplemaps_uszips_basicv1.82.zip"
+ZIP_ZCTA_CROSSWALK_PATH = OUTPUT_DIR / "zip_zcta_crosswalk.arrow"
+CBSA_FIPS_CROSSWALK_PATH = AUGMENTING_DATA_DIR / "cbsa2fipsxw.csv"
 
-MASTER_DF = pl.read_csv(
-    Path(__file__).parent.parent.parent / "augmenting_data" / "master.csv"
-)
-CENSUS_REPORTER_API_BASE_URL = "https://api.censusreporter.org"
+MASTER_DF = pl.read_csv(AUGMENTING_DATA_DIR / "master.csv")
 CENSUS_REPORTER_BASE_URL = "https://censusreporter.org"
+# Core Based Statistical Area type: Census Reporter name suffix
+CBSA_PROFILE_SUFFIXES = {
+    "Metropolitan Statistical Area": "Metro Area",
+    "Micropolitan Statistical Area": "Micro Area",
+}
+
+# minimum seconds between the starts of two requests to the same host
+MIN_SECONDS_BETWEEN_HOST_REQUESTS = 0.3
+REQUEST_TIMEOUT_SECONDS = 30
+
+_host_locks: dict[str, threading.Lock] = {}
+_host_locks_lock = threading.Lock()
+_host_next_request_times: dict[str, float] = {}
 
 
 class ASCIIColors(StrEnum):
@@ -78,9 +97,32 @@ def is_valid_zipcode(zip: int) -> bool:
     return zip in MASTER_DF["ZIP"]
 
 
-def req_get_wrapper(url: str) -> requests.Response:
-    time.sleep(0.3)
-    req = requests.get(url=url)
+def wait_for_host(url: str) -> None:
+    """Block until a request to the URL's host may start.
+
+    Note:
+        Requests to the same host are started at least `MIN_SECONDS_BETWEEN_HOST_REQUESTS` apart, across all threads. Requests to different hosts do not wait on each other.
+
+    Args:
+        url (str): the URL about to be requested
+    """
+    host = urlparse(url).netloc
+    with _host_locks_lock:
+        host_lock = _host_locks.setdefault(host, threading.Lock())
+    with host_lock:
+        wait_seconds = _host_next_request_times.get(host, 0.0) - time.monotonic()
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+        _host_next_request_times[host] = (
+            time.monotonic() + MIN_SECONDS_BETWEEN_HOST_REQUESTS
+        )
+
+
+def req_get_wrapper(
+    url: str, timeout: float = REQUEST_TIMEOUT_SECONDS
+) -> requests.Response:
+    wait_for_host(url)
+    req = requests.get(url=url, timeout=timeout)
     req.raise_for_status()
     req.encoding = "utf-8"
     return req
@@ -112,6 +154,43 @@ def metro_name_to_zip_code_list(msa_name: str) -> list[int]:
     )
 
 
+@functools.cache
+def get_uszips_df() -> pl.DataFrame:
+    """Read the simplemaps US ZIP code file out of its archive.
+
+    Returns:
+        pl.DataFrame: DataFrame of every ZIP code with its lat/long, population, and ZCTA information
+    """
+    with zipfile.ZipFile(USZIPS_ZIP_FILE_PATH) as zip_file:
+        uszips_bytes = zip_file.read("uszips.csv")
+    return pl.read_csv(
+        uszips_bytes,
+        dtypes={"zip": pl.Utf8, "parent_zcta": pl.Utf8, "population": pl.Int64},
+    )
+
+
+def metro_name_to_zip_lat_long_df(msa_name: str) -> pl.DataFrame:
+    """Return the location and population of the constituent ZIP codes of the given Metropolitan Statistical Area.
+
+    Args:
+        msa_name (str): name of the Metropolitan Statistical Area
+
+    Returns:
+        pl.DataFrame: DataFrame with the columns ZIP, LATITUDE, LONGITUDE and POPULATION. ZIP codes without a known location are left out
+    """
+    zip_codes = metro_name_to_zip_code_list(msa_name)
+    return (
+        get_uszips_df()
+        .select(
+            pl.col("zip").cast(pl.Int64).alias("ZIP"),
+            pl.col("lat").alias("LATITUDE"),
+            pl.col("lng").alias("LONGITUDE"),
+            pl.col("population").fill_null(0).alias("POPULATION"),
+        )
+        .filter(pl.col("ZIP").is_in(zip_codes))
+    )
+
+
 def zip_to_metro(zip: int) -> str:
     """Find the Metropolitan Statistical Area name for the specified ZIP code.
 
@@ -193,29 +272,176 @@ def get_zip_codes_in_state(state: str) -> list[str]:
         .to_list()
     )
 
-def get_census_report_url_page(search_term: str):
-    census_reporter_headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Accept-Language": "en-US,en;q=0.7",
-        "Cache-Control": "max-age=0",
-        "Dnt": "1",
-        "Sec-Fetch-Dest": "document",
-        "Sec-Fetch-Mode": "navigate",
-        "Sec-Fetch-Site": "none",
-        "Sec-GPC": "1",
-        "Upgrade-Insecure-Requests": "1",
+
+@functools.cache
+def get_zip_zcta_crosswalk_df() -> pl.DataFrame:
+    """Get the ZIP Code Tabulation Area that covers every ZIP code.
+
+    Note:
+        ZIP codes that are not ZCTAs themselves, such as PO boxes, are covered by their parent ZCTA. ZIP codes without a ZCTA are left out.
+
+        Built from the simplemaps US ZIP code file into `ZIP_ZCTA_CROSSWALK_PATH` the first time it is needed, or when that file changes, then memory mapped.
+
+    Returns:
+        pl.DataFrame: the columns ZIP (UInt32), like the listings' "ZIP OR POSTAL CODE", and ZCTA (Int32), like the Census tables. Sorted by ZIP
+    """
+    if (
+        not ZIP_ZCTA_CROSSWALK_PATH.exists()
+        or ZIP_ZCTA_CROSSWALK_PATH.stat().st_mtime
+        < USZIPS_ZIP_FILE_PATH.stat().st_mtime
+    ):
+        log("Building the ZIP code to ZCTA crosswalk", "info")
+        crosswalk_df = (
+            get_uszips_df()
+            .select(
+                pl.col("zip").cast(pl.UInt32).alias("ZIP"),
+                pl.when(pl.col("zcta"))
+                .then(pl.col("zip"))
+                .otherwise(pl.col("parent_zcta"))
+                .cast(pl.Int32)
+                .alias("ZCTA"),
+            )
+            .drop_nulls()
+            .unique(subset="ZIP")
+            .sort("ZIP")
+        )
+        ZIP_ZCTA_CROSSWALK_PATH.parent.mkdir(parents=True, exist_ok=True)
+        temp_crosswalk_path = ZIP_ZCTA_CROSSWALK_PATH.with_name(
+            f"{ZIP_ZCTA_CROSSWALK_PATH.name}.tmp"
+        )
+        crosswalk_df.write_ipc(temp_crosswalk_path, compression="uncompressed")
+        os.replace(temp_crosswalk_path, ZIP_ZCTA_CROSSWALK_PATH)
+    return pl.read_ipc(ZIP_ZCTA_CROSSWALK_PATH, memory_map=True)
+
+
+def zip_codes_to_zcta_list(zip_codes: list[int]) -> list[str]:
+    """Find the ZIP Code Tabulation Areas that cover the given ZIP codes.
+
+    Note:
+        See `get_zip_zcta_crosswalk_df`.
+
+    Args:
+        zip_codes (list[int]): the ZIP codes
+
+    Returns:
+        list[str]: the 5 digit ZCTAs, sorted
+    """
+    return (
+        get_zip_zcta_crosswalk_df()
+        .filter(pl.col("ZIP").is_in(pl.Series(zip_codes, dtype=pl.UInt32)))
+        .select(pl.col("ZCTA").unique().sort().cast(pl.Utf8).str.zfill(5))
+        .to_series()
+        .to_list()
+    )
+
+
+def metro_name_to_zcta_list(msa_name: str) -> list[str]:
+    """Return the ZIP Code Tabulation Areas of the given Metropolitan Statistical Area.
+
+    Args:
+        msa_name (str): name of the Metropolitan Statistical Area
+
+    Returns:
+        list[str]: the 5 digit ZCTAs. Is empty if MSA name is invalid
+    """
+    return zip_codes_to_zcta_list(metro_name_to_zip_code_list(msa_name))
+
+
+def state_to_zcta_list(state: str) -> list[str]:
+    """Return the ZIP Code Tabulation Areas of a state.
+
+    Args:
+        state (str): the state's name or postal code
+
+    Returns:
+        list[str]: the 5 digit ZCTAs. Is empty if the state is invalid
+    """
+    state_code = sts.lookup(state)
+    if state_code is None:
+        return []
+    return zip_codes_to_zcta_list(
+        get_uszips_df()
+        .filter(pl.col("state_id").eq(state_code.abbr))
+        .get_column("zip")
+        .cast(pl.Int64)
+        .to_list()
+    )
+
+
+def census_reporter_profile_url(geoid: str, name: str) -> str:
+    """Make the URL of a Census Reporter profile page.
+
+    Args:
+        geoid (str): the Census Reporter geoid, like "04000US51" for Virginia
+        name (str): the display name, made into the URL's slug
+
+    Returns:
+        str: the URL
+    """
+    slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+    return f"{CENSUS_REPORTER_BASE_URL}/profiles/{geoid}-{slug}/"
+
+
+@functools.cache
+def get_census_reporter_url_index() -> dict[str, str]:
+    """Map every state and Core Based Statistical Area name to its Census Reporter profile URL.
+
+    Note:
+        Built once, without network, from the FIPS state codes in `CBSA_FIPS_CROSSWALK_PATH` and the CBSA codes in `MASTER_DF` and `CBSA_FIPS_CROSSWALK_PATH`. States are summary level 040 and CBSAs summary level 310.
+
+    Returns:
+        dict[str, str]: `lowercase name: URL`, like `"richmond, va": "https://censusreporter.org/profiles/31000US40060-richmond-va-metro-area/"`
+    """
+    cbsa_fips_df = pl.read_csv(CBSA_FIPS_CROSSWALK_PATH, infer_schema_length=0)
+    url_index = {
+        state_name.lower(): census_reporter_profile_url(
+            f"04000US{int(state_fips):02}", state_name
+        )
+        for state_name, state_fips in cbsa_fips_df.select("statename", "fipsstatecode")
+        .unique()
+        .drop_nulls()
+        .rows()
     }
-    req = requests.get(
-        f"{CENSUS_REPORTER_API_BASE_URL}/2.1/full-text/search?q={search_term}",
-        headers=census_reporter_headers,
+    cbsa_rows = (
+        MASTER_DF.select(
+            pl.col("METRO_NAME"), pl.col("CBSA").cast(pl.Utf8), pl.col("LSAD")
+        )
+        .filter(pl.col("LSAD").is_in(list(CBSA_PROFILE_SUFFIXES)))
+        .unique()
+        .rows()
+    ) + cbsa_fips_df.select(
+        "cbsatitle", "cbsacode", "metropolitanmicropolitanstatis"
+    ).unique().drop_nulls().rows()
+    for cbsa_name, cbsa_code, cbsa_type in cbsa_rows:
+        url_index.setdefault(
+            cbsa_name.lower(),
+            census_reporter_profile_url(
+                f"31000US{cbsa_code}",
+                f"{cbsa_name} {CBSA_PROFILE_SUFFIXES[cbsa_type]}",
+            ),
+        )
+    return url_index
+
+
+def census_reporter_url(name: str) -> str:
+    """Find the Census Reporter profile page of a state or Core Based Statistical Area.
+
+    Args:
+        name (str): the state's name or postal code, or the CBSA's name, like "Richmond, VA"
+
+    Returns:
+        str: the profile's URL, or a Census Reporter search for the name if it is not in `get_census_reporter_url_index`
+    """
+    url_index = get_census_reporter_url_index()
+    state = sts.lookup(name)
+    url = url_index.get(name.strip().lower()) or (
+        url_index.get(state.name.lower()) if state is not None else None
     )
-    req.raise_for_status()
-    req_json = req.json()
-    profile_url = req_json["results"][0].get("url")
+    if url is None:
+        log(f"No Census Reporter profile found for {name}", "info")
+        return f"{CENSUS_REPORTER_BASE_URL}/search/?q={quote_plus(name)}"
+    return url
 
-    return f"{profile_url}"
 
 def _set_up_logger(level: int) -> logging.Logger:
     """Setup a logger that prints to a file.
@@ -0,0 +1,221 @@
+import datetime
+import json
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Any
+
+import polars as pl
+
+from backend.helper import OUTPUT_DIR, log
+
+LISTING_STORE_PATH = OUTPUT_DIR / "listing_store.db"
+# cached `api/region` responses older than this are fetched again
+REGION_INFO_TTL = datetime.timedelta(days=30)
+
+# gis-csv column name to listing store column name
+GIS_COLUMNS_TO_STORE_COLUMNS = {
+    "PROPERTY ID": "property_id",
+    "ADDRESS": "address",
+    "CITY": "city",
+    "STATE OR PROVINCE": "state",
+    "ZIP OR POSTAL CODE": "zip",
+    "YEAR BUILT": "year_built",
+    "PRICE": "price",
+    "SQUARE FEET": "square_feet",
+    "URL (SEE https://www.redfin.com/buy-a-home/comparative-market-analysis FOR INFO ON PRICING)": "url",
+    "LATITUDE": "latitude",
+    "LONGITUDE": "longitude",
+}
+
+
+class ListingStore:
+    """Persist listings across crawls, keyed by Redfin property ID.
+
+    Note:
+        Holds the latest GIS attributes of a listing, its heating classification, and when it was last seen. A listing that is classified in one crawl is not classified again, no matter how many metros or filter sets include it.
+    """
+
+    def __init__(self, db_path: Path = LISTING_STORE_PATH) -> None:
+        self.db_path = db_path
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS listings (
+                    property_id INTEGER PRIMARY KEY,
+                    address TEXT,
+                    city TEXT,
+                    state TEXT,
+                    zip INTEGER,
+                    year_built INTEGER,
+                    price INTEGER,
+                    square_feet INTEGER,
+                    url TEXT,
+                    latitude REAL,
+                    longitude REAL,
+                    heating TEXT,
+                    classified_at TEXT,
+                    last_seen TEXT NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS listings_zip ON listings (zip)")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS regions (
+                    zip TEXT PRIMARY KEY,
+                    region_info TEXT NOT NULL,
+                    fetched_at TEXT NOT NULL
+                )"""
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def upsert_listings(self, df: pl.DataFrame) -> None:
+        """Insert or update the GIS attributes of listings and mark them as seen now.
+
+        Note:
+            Rows without a property ID are skipped. Heating classifications are left untouched.
+
+        Args:
+            df (pl.DataFrame): gis-csv DataFrame with a "PROPERTY ID" column
+        """
+        rows = (
+            df.filter(pl.col("PROPERTY ID").is_not_null())
+            .select(list(GIS_COLUMNS_TO_STORE_COLUMNS.keys()))
+            .rows()
+        )
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        columns = list(GIS_COLUMNS_TO_STORE_COLUMNS.values())
+        updates = ", ".join(
+            f"{column} = excluded.{column}" for column in columns[1:] + ["last_seen"]
+        )
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                f"""INSERT INTO listings ({", ".join(columns)}, last_seen)
+                VALUES ({", ".join("?" * (len(columns) + 1))})
+                ON CONFLICT (property_id) DO UPDATE SET {updates}""",
+                [(*row, now) for row in rows],
+            )
+        log(f"Stored {len(rows)} listings in {self.db_path}.", "debug")
+
+    def get_heating_classifications(
+        self, property_ids: list[int]
+    ) -> dict[int, dict[str, bool]]:
+        """Get the stored heating classifications of listings.
+
+        Args:
+            property_ids (list[int]): the property IDs to look up
+
+        Returns:
+            dict[int, dict[str, bool]]: `property_id: heating dict` for the listings that have already been classified
+        """
+        classifications = {}
+        with closing(self._connect()) as conn:
+            conn.execute("CREATE TEMP TABLE wanted (property_id INTEGER PRIMARY KEY)")
+            conn.executemany(
+                "INSERT OR IGNORE INTO wanted VALUES (?)",
+                [(property_id,) for property_id in property_ids],
+            )
+            for property_id, heating in conn.execute(
+                """SELECT listings.property_id, listings.heating FROM listings
+                JOIN wanted ON listings.property_id = wanted.property_id
+                WHERE listings.heating IS NOT NULL"""
+            ):
+                classifications[property_id] = json.loads(heating)
+        return classifications
+
+    def set_heating_classification(
+        self, property_id: int, heating_dict: dict[str, bool]
+    ) -> None:
+        """Store the heating classification of a listing.
+
+        Args:
+            property_id (int): the property ID
+            heating_dict (dict[str, bool]): the filled out heating dict. See `RedfinApi.column_dict`
+        """
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """INSERT INTO listings (property_id, heating, classified_at, last_seen)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (property_id) DO UPDATE SET heating = excluded.heating, classified_at = excluded.classified_at""",
+                (property_id, json.dumps(heating_dict), now, now),
+            )
+
+    def count_listings_by_zip(self, zip_codes: list[int]) -> dict[int, tuple[int, int]]:
+        """Count the stored listings in ZIP codes.
+
+        Args:
+            zip_codes (list[int]): the ZIP codes
+
+        Returns:
+            dict[int, tuple[int, int]]: `zip: (listings, classified listings)` for the ZIP codes that have stored listings
+        """
+        counts = {}
+        with closing(self._connect()) as conn:
+            conn.execute("CREATE TEMP TABLE wanted (zip INTEGER PRIMARY KEY)")
+            conn.executemany(
+                "INSERT OR IGNORE INTO wanted VALUES (?)",
+                [(zip_code,) for zip_code in zip_codes],
+            )
+            for zip_code, listings, classified in conn.execute(
+                """SELECT listings.zip, COUNT(*), COUNT(listings.heating) FROM listings
+                JOIN wanted ON listings.zip = wanted.zip
+                GROUP BY listings.zip"""
+            ):
+                counts[zip_code] = (listings, classified)
+        return counts
+
+    def _region_info_cutoff(self) -> str:
+        return (datetime.datetime.now() - REGION_INFO_TTL).isoformat(timespec="seconds")
+
+    def get_region_info(self, zip_code: str) -> Any | None:
+        """Get the cached `api/region` response of a ZIP code.
+
+        Args:
+            zip_code (str): the 5 digit ZIP code
+
+        Returns:
+            Any | None: the response. None if it has not been cached, or was cached more than `REGION_INFO_TTL` ago
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT region_info FROM regions WHERE zip = ? AND fetched_at >= ?",
+                (zip_code, self._region_info_cutoff()),
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def set_region_info(self, zip_code: str, region_info: Any) -> None:
+        """Cache the `api/region` response of a ZIP code.
+
+        Args:
+            zip_code (str): the 5 digit ZIP code
+            region_info (Any): the response
+        """
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO regions VALUES (?, ?, ?)",
+                (zip_code, json.dumps(region_info), now),
+            )
+
+    def get_cached_region_zip_codes(self, zip_codes: list[str]) -> set[str]:
+        """Find which ZIP codes have a cached `api/region` response.
+
+        Args:
+            zip_codes (list[str]): the 5 digit ZIP codes
+
+        Returns:
+            set[str]: the ZIP codes that are cached and younger than `REGION_INFO_TTL`
+        """
+        with closing(self._connect()) as conn:
+            cached_zip_codes = {
+                row[0]
+                for row in conn.execute(
+                    "SELECT zip FROM regions WHERE fetched_at >= ?",
+                    (self._region_info_cutoff(),),
+                )
+            }
+        return cached_zip_codes.intersection(zip_codes)
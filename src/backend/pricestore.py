@@ -0,0 +1,219 @@
+import datetime
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import polars as pl
+
+from backend.helper import OUTPUT_DIR
+
+ENERGY_PRICE_STORE_PATH = OUTPUT_DIR / "energy_prices.db"
+
+# the EIA can still revise months this close to the current month
+REVISABLE_MONTHS = 3
+# revisable months are refetched once they were fetched longer ago than this
+REVISABLE_MAX_AGE = datetime.timedelta(days=1)
+# months stored without a price are refetched once they were fetched longer ago than this, since the EIA publishes some fuels 2 to 3 months late
+NULL_PRICE_MAX_AGE = datetime.timedelta(days=7)
+
+
+def month_periods(start_date: datetime.date, end_date: datetime.date) -> list[str]:
+    """List the months between two dates.
+
+    Args:
+        start_date (datetime.date): the start date, inclusive
+        end_date (datetime.date): the end date, non inclusive
+
+    Returns:
+        list[str]: the months in `YYYY-MM` form
+    """
+    periods = []
+    year, month = start_date.year, start_date.month
+    while datetime.date(year, month, 1) < end_date:
+        periods.append(f"{year}-{month:02}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return periods
+
+
+def first_revisable_period(today: datetime.date | None = None) -> str:
+    """Get the first month that the EIA can still revise.
+
+    Args:
+        today (datetime.date | None, optional): the current date. Defaults to None, meaning today.
+
+    Returns:
+        str: the month in `YYYY-MM` form, `REVISABLE_MONTHS` before the current month
+    """
+    if today is None:
+        today = datetime.date.today()
+    revisable_year, revisable_month = divmod(
+        today.year * 12 + today.month - 1 - REVISABLE_MONTHS, 12
+    )
+    return f"{revisable_year}-{revisable_month + 1:02}"
+
+
+class EnergyPriceStore:
+    """Persist normalized monthly energy prices, keyed by fuel, state and month.
+
+    Note:
+        Prices are stored before efficiency conversion, in the unit the EIA publishes them in, along with where and when they were fetched. A month that was fetched but has no data is stored with a null price, so that it is not requested again until `NULL_PRICE_MAX_AGE` has passed.
+    """
+
+    def __init__(self, db_path: Path = ENERGY_PRICE_STORE_PATH) -> None:
+        self.db_path = db_path
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS prices (
+                    fuel TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    period TEXT NOT NULL,
+                    price REAL,
+                    unit TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    fetched_at TEXT NOT NULL,
+                    PRIMARY KEY (fuel, state, period)
+                )"""
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def put_prices(
+        self,
+        fuel: str,
+        state: str,
+        prices: dict[str, float | None],
+        unit: str,
+        source: str,
+    ) -> None:
+        """Insert or replace the prices of a fuel in a state.
+
+        Args:
+            fuel (str): the fuel. See `EIADataRetriever.EnergyType`
+            state (str): the 2 character postal code of a state
+            prices (dict[str, float | None]): `YYYY-MM: price`. None for a month that was fetched but had no data
+            unit (str): the unit of the prices
+            source (str): where the prices came from
+        """
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (fuel, state, period, price, unit, source, now)
+                    for period, price in prices.items()
+                ],
+            )
+
+    def get_prices(
+        self, fuel: str, state: str, periods: list[str]
+    ) -> dict[str, float | None]:
+        """Get stored prices.
+
+        Args:
+            fuel (str): the fuel. See `EIADataRetriever.EnergyType`
+            state (str): the 2 character postal code of a state
+            periods (list[str]): the months in `YYYY-MM` form
+
+        Returns:
+            dict[str, float | None]: `YYYY-MM: price` for the stored months
+        """
+        if len(periods) == 0:
+            return {}
+        with closing(self._connect()) as conn:
+            return dict(
+                conn.execute(
+                    """SELECT period, price FROM prices
+                    WHERE fuel = ? AND state = ? AND period BETWEEN ? AND ?""",
+                    (fuel, state, min(periods), max(periods)),
+                ).fetchall()
+            )
+
+    def get_price_df(
+        self, fuels: list[str], states: list[str], first_period: str, last_period: str
+    ) -> pl.DataFrame:
+        """Get stored prices as a long format DataFrame.
+
+        Args:
+            fuels (list[str]): the fuels. See `EIADataRetriever.EnergyType`
+            states (list[str]): the 2 character postal codes of the states
+            first_period (str): the first month in `YYYY-MM` form, inclusive
+            last_period (str): the last month in `YYYY-MM` form, inclusive
+
+        Returns:
+            pl.DataFrame: one row per stored month, with the columns state, fuel, period (the first day of the month), raw_price and unit
+        """
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"""SELECT state, fuel, period, price, unit FROM prices
+                WHERE fuel IN ({", ".join("?" * len(fuels))})
+                AND state IN ({", ".join("?" * len(states))})
+                AND period BETWEEN ? AND ?
+                ORDER BY state, fuel, period""",
+                (*fuels, *states, first_period, last_period),
+            ).fetchall()
+        return pl.DataFrame(
+            rows,
+            schema={
+                "state": pl.Utf8,
+                "fuel": pl.Utf8,
+                "period": pl.Utf8,
+                "raw_price": pl.Float64,
+                "unit": pl.Utf8,
+            },
+            orient="row",
+        ).with_columns((pl.col("period") + "-01").str.to_date())
+
+    def missing_periods(
+        self,
+        fuel: str,
+        state: str,
+        periods: list[str],
+        today: datetime.date | None = None,
+    ) -> list[str]:
+        """Find which months have to be fetched.
+
+        Note:
+            A month has to be fetched if it is not stored, if the EIA can still revise it and it was fetched longer ago than `REVISABLE_MAX_AGE`, or if it is stored without a price and was fetched longer ago than `NULL_PRICE_MAX_AGE`. Months after the current month are never fetched.
+
+        Args:
+            fuel (str): the fuel. See `EIADataRetriever.EnergyType`
+            state (str): the 2 character postal code of a state
+            periods (list[str]): the wanted months in `YYYY-MM` form
+            today (datetime.date | None, optional): the current date. Defaults to None, meaning today.
+
+        Returns:
+            list[str]: the months to fetch, in `YYYY-MM` form
+        """
+        if today is None:
+            today = datetime.date.today()
+        current_period = f"{today.year}-{today.month:02}"
+        revisable_period = first_revisable_period(today)
+        now = datetime.datetime.now()
+        stale_before = (now - REVISABLE_MAX_AGE).isoformat(timespec="seconds")
+        null_stale_before = (now - NULL_PRICE_MAX_AGE).isoformat(timespec="seconds")
+
+        wanted_periods = [period for period in periods if period <= current_period]
+        if len(wanted_periods) == 0:
+            return []
+        with closing(self._connect()) as conn:
+            stored_by_period = {
+                period: (price, fetched_at)
+                for period, price, fetched_at in conn.execute(
+                    """SELECT period, price, fetched_at FROM prices
+                    WHERE fuel = ? AND state = ? AND period BETWEEN ? AND ?""",
+                    (fuel, state, min(wanted_periods), max(wanted_periods)),
+                )
+            }
+        missing_periods = []
+        for period in wanted_periods:
+            if period not in stored_by_period:
+                missing_periods.append(period)
+                continue
+            price, fetched_at = stored_by_period[period]
+            if (period >= revisable_period and fetched_at < stale_before) or (
+                price is None and fetched_at < null_stale_before
+            ):
+                missing_periods.append(period)
+        return missing_periods
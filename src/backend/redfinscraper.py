@@ -3,7 +3,9 @@ import io
 import json
 import random
 import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import StrEnum
 from pathlib import Path
 from typing import Any
@@ -17,7 +19,17 @@ import requests
 from backend import (
     log,
     metro_name_to_zip_code_list,
+    metro_name_to_zip_lat_long_df,
 )
+from backend.crawlplanner import (
+    CrawlPhase,
+    CrawlProgress,
+    RedfinEndpoint,
+    RequestStats,
+    plan_listing_order,
+    plan_zip_code_order,
+)
+from backend.listingstore import ListingStore
 
 # super group include
 SUPER_GROUP_INCLUDE_PATTERNS = re.compile(r"heat|property|interior|utilit", re.I)
@@ -81,6 +93,25 @@ CATEGORY_PATTERNS = {
 
 OUTPUT_DIR_PATH = Path(__file__).parent.parent.parent / "output" / "metro_data"
 
+URL_COL_NAME = "URL (SEE https://www.redfin.com/buy-a-home/comparative-market-analysis FOR INFO ON PRICING)"
+
+# most homes a single gis-csv query returns. a response this size is assumed to be truncated
+NUM_HOMES_CAP = 350
+MAX_SUB_QUERY_WORKERS = 4
+# gis-csv requests in flight at once, across every nested pool of sub-queries and tiles
+_gis_csv_request_slots = threading.BoundedSemaphore(MAX_SUB_QUERY_WORKERS)
+# used by crawl plans for ZIP codes that have never been crawled, until the listing store has data
+DEFAULT_LISTINGS_PER_ZIP = 50
+
+# min long, min lat, max long, max lat
+Tile = tuple[float, float, float, float]
+# a tile is split before it is ever requested if the ZIP codes inside of it hold more people than this
+TILE_POPULATION_SPLIT_THRESHOLD = 100_000
+# tiles with no ZIP code centroid within this many degrees are assumed to be empty
+TILE_MARGIN_DEGREES = 0.05
+# below this size, saturated tiles are split by price and year built instead
+MIN_TILE_SIZE_DEGREES = 0.005
+
 
 class RedfinApi:
     """Scrape redfin using their stingray api. Use this class for getting and the iterating over ZIP code level data, creating an object for each new zip code."""
@@ -150,6 +181,10 @@ class RedfinApi:
         NINE_MIL = "9000000"
         TEN_MIL = "10000000"
 
+    class CrawlStrategy(StrEnum):
+        ZIP = "ZIP"
+        TILE = "Tile"
+
     class SortOrder(StrEnum):
         RECOMMENDED = "redfin-recommended-asc"
         NEWEST = "days-on-redfin-asc"
@@ -233,6 +268,9 @@ class RedfinApi:
         }
         self.search_params = None
         self.column_dict = {key: False for key in CATEGORY_PATTERNS.keys()}
+        self.listing_store = ListingStore()
+        self.progress = CrawlProgress()
+        self.request_stats = RequestStats()
 
     def set_search_params(self, zip: str, search_filters: dict[str, Any]) -> None:
         """Set the parameters for searching by ZIP code.
@@ -250,12 +288,6 @@ class RedfinApi:
             log(f"Could not retrieve region info for {zip}.", "warn")
             return None
 
-        if search_filters.get("for sale sold") == "Sold":
-            sort_order = self.SortOrder.MOST_RECENTLY_SOLD.value
-        else:
-            sort_order = self.SortOrder.NEWEST.value
-        # TODO make sure to fix filtering so that its not just "single family homes"
-
         try:
             market = region_info["payload"]["rootDefaults"]["market"]
             region_id = region_info["payload"]["rootDefaults"]["region_id"]
@@ -264,7 +296,30 @@ class RedfinApi:
             log("Market, region, or status could not be identified ", "warn")
             return None
 
-        self.search_params = {
+        self.search_params = self.search_filters_to_params(
+            search_filters, market, status
+        ) | {"region_id": region_id, "region_type": "2"}
+
+    def search_filters_to_params(
+        self, search_filters: dict[str, Any], market: str, status: str
+    ) -> dict[str, Any]:
+        """Translate search filters into gis-csv parameters that are not tied to a region.
+
+        Args:
+            search_filters (dict[str, Any]): search filters
+            market (str): the Redfin market
+            status (str): the default listing status of the market
+
+        Returns:
+            dict[str, Any]: search filters for appending to a gis-csv path
+        """
+        if search_filters.get("for sale sold") == "Sold":
+            sort_order = self.SortOrder.MOST_RECENTLY_SOLD.value
+        else:
+            sort_order = self.SortOrder.NEWEST.value
+        # TODO make sure to fix filtering so that its not just "single family homes"
+
+        search_params = {
             "al": 1,
             "has_deal": "false",
             "has_dishwasher": "false",
@@ -282,12 +337,10 @@ class RedfinApi:
             "min_year_built": search_filters.get("min year built"),
             "market": market,
             "min_stories": search_filters.get("min stories"),
-            "num_homes": 350,
+            "num_homes": NUM_HOMES_CAP,
             "ord": sort_order,
             "page_number": "1",
             "pool": "false",
-            "region_id": region_id,
-            "region_type": "2",
             "status": status,
             "travel_with_traffic": "false",
             "travel_within_region": "false",
@@ -295,10 +348,10 @@ class RedfinApi:
             "v": "8",
         }
         if search_filters.get("for sale sold") == "Sold":
-            self.search_params["sold_within_days"] = search_filters.get("sold within")
-            self.search_params["status"] = 9
+            search_params["sold_within_days"] = search_filters.get("sold within")
+            search_params["status"] = 9
         else:
-            self.search_params["sf"] = "1, 2, 3, 4, 5, 6, 7"
+            search_params["sf"] = "1, 2, 3, 4, 5, 6, 7"
             match [
                 search_filters.get("status coming soon"),
                 search_filters.get("status active"),
@@ -319,17 +372,17 @@ class RedfinApi:
                 case [True, True, True]:
                     status = "139"
 
-            self.search_params["status"] = status
+            search_params["status"] = status
 
         if (max_sqft := search_filters.get("max sqft")) != "None":
-            self.search_params["max_sqft"] = max_sqft
+            search_params["max_sqft"] = max_sqft
         if (min_sqft := search_filters.get("min sqft")) != "None":
-            self.search_params["min_sqft"] = min_sqft
+            search_params["min_sqft"] = min_sqft
 
         if (max_price := search_filters.get("max price")) != "None":
-            self.search_params["max_price"] = max_price
+            search_params["max_price"] = max_price
         if (min_price := search_filters.get("min price")) != "None":
-            self.search_params["min_price"] = min_price
+            search_params["min_price"] = min_price
 
         houses = ""  # figure out how to join into comma string
         if search_filters.get("house type house") is True:
@@ -341,7 +394,9 @@ class RedfinApi:
         if search_filters.get("house type mul fam") is True:
             houses = houses + "4"
 
-        self.search_params["uipt"] = ",".join(list(houses))
+        search_params["uipt"] = ",".join(list(houses))
+
+        return search_params
 
     # redfin setup
     def meta_request_download(self, url: str, search_params) -> str:
@@ -385,34 +440,67 @@ class RedfinApi:
                 "propertyId": property_id,
                 "pageType": 1,
             }
-        return self.rf.meta_request("/api/home/details/belowTheFold", params)
+        with self.request_stats.time(RedfinEndpoint.BELOW_THE_FOLD):
+            return self.rf.meta_request("/api/home/details/belowTheFold", params)
+
+    def has_root_defaults(self, region_info: Any) -> bool:
+        """Check that an `api/region` response has the defaults that searches are made with.
+
+        Args:
+            region_info (Any): the response, or None
+
+        Returns:
+            bool: if `payload.rootDefaults` is in the response
+        """
+        try:
+            return region_info["payload"]["rootDefaults"] is not None
+        except (KeyError, TypeError):
+            return False
 
     def get_region_info_from_zipcode(self, zip_code: str) -> Any:
         """Get the region ifo from a ZIP code.
 
+        Note:
+            Responses are cached in the listing store, see `backend.listingstore.REGION_INFO_TTL`. Only responses with `payload.rootDefaults` are cached, so that an error response is fetched again on the next crawl.
+
         Args:
             zip_code (str): the ZIP code
 
         Returns:
             Any: response
         """
-        return self.rf.meta_request(
-            "api/region", {"region_id": zip_code, "region_type": 2, "tz": True, "v": 8}
-        )
+        region_info = self.listing_store.get_region_info(zip_code)
+        if self.has_root_defaults(region_info):
+            return region_info
+        with self.request_stats.time(RedfinEndpoint.REGION):
+            region_info = self.rf.meta_request(
+                "api/region",
+                {"region_id": zip_code, "region_type": 2, "tz": True, "v": 8},
+            )
+        if self.has_root_defaults(region_info):
+            self.listing_store.set_region_info(zip_code, region_info)
+        else:
+            log(f"Region response for {zip_code} has no rootDefaults.", "debug")
+        return region_info
 
     def get_gis_csv(self, params: dict[str, Any]) -> str:
         """Get the gis-csv of an area based on the contents of `params`
 
+        Note:
+            At most `MAX_SUB_QUERY_WORKERS` requests run at once, however deeply queries and tiles are split.
+
         Args:
             params (dict[str, Any]): the parameters
 
         Returns:
             str: the CSV file as a unicode string
         """
-        return self.meta_request_download("api/gis-csv", search_params=params)
+        with _gis_csv_request_slots, self.request_stats.time(RedfinEndpoint.GIS_CSV):
+            return self.meta_request_download("api/gis-csv", search_params=params)
 
     def _rate_limit(self) -> None:
-        time.sleep(random.uniform(1, 1.6))
+        with self.request_stats.time(RedfinEndpoint.RATE_LIMIT):
+            time.sleep(random.uniform(1, 1.6))
 
     # calls stuff
     def get_heating_info_from_super_group(self, super_group: dict) -> list[str]:
@@ -525,7 +613,8 @@ class RedfinApi:
 
         try:
             self._rate_limit()
-            initial_info = self.rf.initial_info(listing_url)
+            with self.request_stats.time(RedfinEndpoint.INITIAL_INFO):
+                initial_info = self.rf.initial_info(listing_url)
         except json.JSONDecodeError:
             log(f"Could not get initial info for {listing_url =}", "critical")
             return None
@@ -558,28 +647,20 @@ class RedfinApi:
             return None
         return super_groups
 
-    def get_heating_terms_dict_from_listing(
-        self, address_and_url_list: list[str]
+    def get_heating_terms_dict_from_super_groups(
+        self, super_groups: list, address: str, listing_url: str
     ) -> dict[str, bool]:
-        """Generate a filled out dictionary based on `self.column_dict` and the contents of :meth:get_heating_info_from_super_group(address_url_list).
-
-        TODO:
-            Since addresses can be doubled and it is random which one gets chosen, just printing listing url so that we can see which one has been chosen
+        """Generate a filled out dictionary based on `self.column_dict` and the heating terms in a listing's super groups.
 
         Args:
-            address_and_url_list (list[str]): address in the first position, and the listing URL in the second position
+            super_groups (list): the super groups of the listing. See :meth:get_super_groups_from_url
+            address (str): the address of the listing
+            listing_url (str): the listing URL
 
         Returns:
-            dict[str, bool]: the filled out `self.column_dict` for the supplied address/listing URL
+            dict[str, bool]: the filled out `self.column_dict` for the listing
         """
-        address = address_and_url_list[0]
-        listing_url = address_and_url_list[1]
         terms = []
-
-        super_groups = self.get_super_groups_from_url(listing_url)
-        if super_groups is None:
-            log("No amenities found", "info")
-            return copy.deepcopy(self.column_dict)
         for super_group in super_groups:  # dict
             if any(
                 SUPER_GROUP_INCLUDE_PATTERNS.findall(super_group.get("titleString", ""))
@@ -611,19 +692,69 @@ class RedfinApi:
         log(f"Heating amenities found for {address}.", "info")
         return master_dict
 
+    def get_heating_terms_dict_with_store(
+        self,
+        property_id: int | None,
+        address: str,
+        listing_url: str,
+        stored_heating_dicts: dict[int, dict[str, bool]],
+    ) -> dict[str, bool]:
+        """Get the heating dict of a listing from the listing store, classifying and storing it if it has not been seen before.
+
+        Note:
+            Listings whose amenities could not be retrieved are not stored, so that they are retried by the next crawl.
+
+        Args:
+            property_id (int | None): the property ID. None if it could not be parsed from the listing URL
+            address (str): the address of the listing
+            listing_url (str): the listing URL
+            stored_heating_dicts (dict[int, dict[str, bool]]): already classified listings. See `ListingStore.get_heating_classifications`
+
+        Returns:
+            dict[str, bool]: the filled out `self.column_dict` for the listing
+        """
+        if property_id in stored_heating_dicts:
+            return copy.deepcopy(self.column_dict) | stored_heating_dicts[property_id]
+
+        super_groups = self.get_super_groups_from_url(listing_url)
+        if super_groups is None:
+            log("No amenities found", "info")
+            return copy.deepcopy(self.column_dict)
+        heating_dict = self.get_heating_terms_dict_from_super_groups(
+            super_groups, address, listing_url
+        )
+        if property_id is not None:
+            self.listing_store.set_heating_classification(property_id, heating_dict)
+        return heating_dict
+
     def get_gis_csv_from_zip_with_filters(
         self,
     ) -> pl.DataFrame | None:
         """Clean the GIS CSV retrieved from using the `search_params` field into the desired schema.
 
+        Note:
+            If the query is saturated (returns `NUM_HOMES_CAP` homes), it is split into sub-queries until each is under the cap. See :meth:get_gis_csv_with_query_splitting
+
         Returns:
             pl.DataFrame | None: returns the DataFrame of cleaned information. None if there was not information in the GIS CSV file.
         """
         if self.search_params is None:
             return
-        csv_text = self.get_gis_csv(self.search_params)
+        return self.get_gis_csv_with_query_splitting(self.search_params)
+
+    def gis_csv_text_to_df(
+        self, csv_text: str, params: dict[str, Any]
+    ) -> tuple[pl.DataFrame | None, bool]:
+        """Read a GIS CSV into the desired schema, filtering on the home types in `params`.
+
+        Args:
+            csv_text (str): the GIS CSV as a unicode string
+            params (dict[str, Any]): the parameters the GIS CSV was requested with
 
-        home_types: str = self.search_params.get("uipt", "")
+        Returns:
+            tuple[pl.DataFrame | None, bool]: the cleaned DataFrame, None if there was no information in the GIS CSV, and whether the response hit the `num_homes` cap
+        """
+        home_types: str = params.get("uipt", "")
         if "1" in home_types:
             home_types = home_types.replace("1", "Single Family Residential")
         if "2" in home_types:
@@ -634,12 +765,13 @@ class RedfinApi:
             home_types = home_types.replace("4", "Multi-Family (2-4 Unit)")
 
         try:
+            raw_df = pl.read_csv(
+                io.StringIO(csv_text),
+                dtypes=self.STRING_ZIP_CSV_SCHEMA,
+            )
+            is_saturated = raw_df.height >= int(params.get("num_homes", NUM_HOMES_CAP))
             df = (
-                pl.read_csv(
-                    io.StringIO(csv_text),
-                    dtypes=self.STRING_ZIP_CSV_SCHEMA,
-                )
-                .with_columns(
+                raw_df.with_columns(
                     pl.col("ZIP OR POSTAL CODE").str.extract(r"([0-9]{5})", 1)
                 )
                 .cast({"ZIP OR POSTAL CODE": pl.UInt32})
@@ -656,7 +788,7 @@ class RedfinApi:
                     "ZIP OR POSTAL CODE",
                     "PRICE",
                     "SQUARE FEET",
-                    "URL (SEE https://www.redfin.com/buy-a-home/comparative-market-analysis FOR INFO ON PRICING)",
+                    URL_COL_NAME,
                     "LATITUDE",
                     "LONGITUDE",
                 )
@@ -666,11 +798,98 @@ class RedfinApi:
                     "CSV was empty. This can happen if local MLS rules dont allow downloads.",
                     "debug",
                 )
-                return None
+                return None, is_saturated
         except Exception as e:
             log(f"Could not read gis csv into dataframe.\n{csv_text = }\n{e}", "warn")
+            return None, False
+        return df, is_saturated
+
+    def split_search_params(self, params: dict[str, Any]) -> list[dict[str, Any]]:
+        """Split a query into two narrower queries.
+
+        Note:
+            The price range is halved along the `RedfinApi.Price` breakpoints. Once no breakpoint is left inside the price range, the year built range is halved instead. Boundaries are shared between the two halves, so results should be deduplicated.
+
+        Args:
+            params (dict[str, Any]): the parameters of the saturated query
+
+        Returns:
+            list[dict[str, Any]]: the parameters of the sub-queries. Empty if the query cannot be split any further
+        """
+        min_price = int(params.get("min_price", 0))
+        max_price = params.get("max_price")
+        max_price = float("inf") if max_price is None else int(max_price)
+        price_breakpoints = [
+            int(price.value)
+            for price in self.Price
+            if price is not self.Price.NONE and min_price < int(price.value) < max_price
+        ]
+        if len(price_breakpoints) > 0:
+            split_price = str(price_breakpoints[len(price_breakpoints) // 2])
+            return [
+                params | {"max_price": split_price},
+                params | {"min_price": split_price},
+            ]
+
+        min_year_built = params.get("min_year_built")
+        max_year_built = params.get("max_year_built")
+        if min_year_built is None or max_year_built is None:
+            return []
+        min_year_built = int(min_year_built)
+        max_year_built = int(max_year_built)
+        if max_year_built <= min_year_built:
+            return []
+        split_year = (min_year_built + max_year_built) // 2
+        return [
+            params | {"max_year_built": str(split_year)},
+            params | {"min_year_built": str(split_year + 1)},
+        ]
+
+    def get_gis_csv_with_query_splitting(
+        self, params: dict[str, Any]
+    ) -> pl.DataFrame | None:
+        """Get the cleaned GIS CSV for `params`, recursively splitting the query while it is saturated.
+
+        Note:
+            Sub-queries are run concurrently, and their results are merged and deduplicated on the listing URL.
+
+        Args:
+            params (dict[str, Any]): the parameters
+
+        Returns:
+            pl.DataFrame | None: the DataFrame of cleaned information. None if there was no information for any query
+        """
+        df, is_saturated = self.gis_csv_text_to_df(self.get_gis_csv(params), params)
+        if not is_saturated:
+            return df
+
+        sub_params_list = self.split_search_params(params)
+        if len(sub_params_list) == 0:
+            log(
+                f"Query hit the {NUM_HOMES_CAP} home cap and could not be split further. Results are truncated.",
+                "warn",
+            )
+            return df
+        log(
+            f"Query hit the {NUM_HOMES_CAP} home cap, splitting into {len(sub_params_list)} sub-queries.",
+            "debug",
+        )
+        with ThreadPoolExecutor(max_workers=MAX_SUB_QUERY_WORKERS) as executor:
+            sub_dfs = list(executor.map(self._get_sub_query_gis_csv, sub_params_list))
+
+        # the saturated result is kept in case a sub-query fails
+        dfs = [sub_df for sub_df in [df, *sub_dfs] if sub_df is not None]
+        if len(dfs) == 0:
+            return None
+        return pl.concat(dfs).unique(subset=URL_COL_NAME, keep="first")
+
+    def _get_sub_query_gis_csv(self, params: dict[str, Any]) -> pl.DataFrame | None:
+        self._rate_limit()
+        try:
+            return self.get_gis_csv_with_query_splitting(params)
+        except requests.RequestException as e:
+            log(f"Could not retrieve sub-query {params}.\n{e}", "warn")
             return None
-        return df
 
     def get_gis_csv_for_zips_in_metro_with_filters(
         self, msa_name: str, search_filters: dict[str, Any]
@@ -685,12 +904,25 @@ class RedfinApi:
             pl.DataFrame | None: return a DataFrame of all GIS CSVs retrieved for individual ZIP codes. None if there were no CSVs
         """
         log(f"Searching {msa_name} with filters {search_filters}.", "log")
-        zip_codes = metro_name_to_zip_code_list(msa_name)
+        # searched in a population weighted order so that a partial search is representative
+        zip_codes = plan_zip_code_order(metro_name_to_zip_code_list(msa_name))
         formatted_zip_codes = [f"{zip_code:0{5}}" for zip_code in zip_codes]
+        cached_region_zip_codes = self.listing_store.get_cached_region_zip_codes(
+            formatted_zip_codes
+        )
+        estimated_seconds = self.request_stats.estimate_seconds(
+            {
+                RedfinEndpoint.REGION: len(formatted_zip_codes)
+                - len(cached_region_zip_codes),
+                RedfinEndpoint.GIS_CSV: len(formatted_zip_codes),
+                RedfinEndpoint.RATE_LIMIT: len(formatted_zip_codes),
+            }
+        )
         log(
-            f"Estimated search time: {len(formatted_zip_codes) * 4.5}",
+            f"Estimated search time: {estimated_seconds:.0f} seconds",
             "info",
         )
+        self.progress.start_phase(CrawlPhase.SEARCHING, len(formatted_zip_codes))
         list_of_csv_dfs = []
         for zip in formatted_zip_codes:
             self._rate_limit()
@@ -698,19 +930,351 @@ class RedfinApi:
             temp = self.get_gis_csv_from_zip_with_filters()
             if temp is None:
                 log(f"Did not find any houses in {zip}.", "info")
+                self.progress.step()
                 continue
             log(f"Found data for {temp.height} houses in {zip}.", "info")
+            self.progress.step(houses_found=temp.height)
             list_of_csv_dfs.append(temp)
 
         if len(list_of_csv_dfs) == 0:
             return None
         return pl.concat(list_of_csv_dfs)
 
+    def tile_to_poly(self, tile: Tile) -> str:
+        """Format a tile as a closed polygon for the gis-csv `poly` parameter.
+
+        Args:
+            tile (Tile): the tile
+
+        Returns:
+            str: the polygon, as comma separated "long lat" pairs
+        """
+        min_long, min_lat, max_long, max_lat = tile
+        corners = [
+            (min_long, min_lat),
+            (max_long, min_lat),
+            (max_long, max_lat),
+            (min_long, max_lat),
+            (min_long, min_lat),
+        ]
+        return ",".join(f"{long:.6f} {lat:.6f}" for long, lat in corners)
+
+    def split_tile(self, tile: Tile) -> list[Tile]:
+        """Split a tile into its four quadrants.
+
+        Args:
+            tile (Tile): the tile
+
+        Returns:
+            list[Tile]: the quadrants
+        """
+        min_long, min_lat, max_long, max_lat = tile
+        mid_long = (min_long + max_long) / 2
+        mid_lat = (min_lat + max_lat) / 2
+        return [
+            (min_long, min_lat, mid_long, mid_lat),
+            (mid_long, min_lat, max_long, mid_lat),
+            (min_long, mid_lat, mid_long, max_lat),
+            (mid_long, mid_lat, max_long, max_lat),
+        ]
+
+    def zip_points_in_tile(
+        self, tile: Tile, zip_points_df: pl.DataFrame, margin: float = 0
+    ) -> pl.DataFrame:
+        """Get the ZIP codes whose centroid is inside of a tile.
+
+        Args:
+            tile (Tile): the tile
+            zip_points_df (pl.DataFrame): ZIP codes with LATITUDE and LONGITUDE columns
+            margin (float, optional): degrees to grow the tile by on every side. Defaults to 0.
+
+        Returns:
+            pl.DataFrame: the ZIP codes inside of the tile
+        """
+        min_long, min_lat, max_long, max_lat = tile
+        return zip_points_df.filter(
+            pl.col("LONGITUDE").is_between(min_long - margin, max_long + margin)
+            & pl.col("LATITUDE").is_between(min_lat - margin, max_lat + margin)
+        )
+
+    def plan_metro_tiles(self, zip_points_df: pl.DataFrame) -> list[Tile]:
+        """Cover the extent of a set of ZIP codes with a quadtree of tiles.
+
+        Note:
+            Tiles are split while they hold more than one ZIP code and the population of their ZIP codes is over `TILE_POPULATION_SPLIT_THRESHOLD`, as population stands in for listing density. Tiles that are not near any ZIP code are dropped.
+
+        Args:
+            zip_points_df (pl.DataFrame): ZIP codes with LATITUDE, LONGITUDE and POPULATION columns
+
+        Returns:
+            list[Tile]: the tiles to request
+        """
+        root_tile = (
+            zip_points_df["LONGITUDE"].min() - TILE_MARGIN_DEGREES,  # type: ignore
+            zip_points_df["LATITUDE"].min() - TILE_MARGIN_DEGREES,  # type: ignore
+            zip_points_df["LONGITUDE"].max() + TILE_MARGIN_DEGREES,  # type: ignore
+            zip_points_df["LATITUDE"].max() + TILE_MARGIN_DEGREES,  # type: ignore
+        )
+        tiles = []
+        tiles_to_check = [root_tile]
+        while len(tiles_to_check) > 0:
+            tile = tiles_to_check.pop()
+            if (
+                self.zip_points_in_tile(tile, zip_points_df, TILE_MARGIN_DEGREES).height
+                == 0
+            ):
+                continue
+            zip_points_in_tile_df = self.zip_points_in_tile(tile, zip_points_df)
+            # population is attributed to the centroid, so splitting a single ZIP code will not spread it out
+            if (
+                zip_points_in_tile_df.height > 1
+                and zip_points_in_tile_df["POPULATION"].sum()
+                > TILE_POPULATION_SPLIT_THRESHOLD
+            ):
+                tiles_to_check.extend(self.split_tile(tile))
+            else:
+                tiles.append(tile)
+        return tiles
+
+    def get_gis_csv_for_tile(
+        self, tile: Tile, base_params: dict[str, Any], zip_points_df: pl.DataFrame
+    ) -> pl.DataFrame | None:
+        """Get the cleaned GIS CSV for a tile, splitting it into quadrants while it is saturated.
+
+        Args:
+            tile (Tile): the tile
+            base_params (dict[str, Any]): parameters that are not tied to a region. See :meth:search_filters_to_params
+            zip_points_df (pl.DataFrame): ZIP codes with LATITUDE and LONGITUDE columns, used to skip empty quadrants
+
+        Returns:
+            pl.DataFrame | None: the DataFrame of cleaned information. None if there was no information in the tile
+        """
+        params = base_params | {"poly": self.tile_to_poly(tile)}
+        self._rate_limit()
+        try:
+            df, is_saturated = self.gis_csv_text_to_df(self.get_gis_csv(params), params)
+            if not is_saturated:
+                return df
+            if tile[2] - tile[0] <= MIN_TILE_SIZE_DEGREES:
+                return self.get_gis_csv_with_query_splitting(params)
+        except (requests.RequestException, json.JSONDecodeError) as e:
+            log(f"Could not retrieve tile {tile}.\n{e}", "warn")
+            return None
+
+        child_tiles = [
+            child_tile
+            for child_tile in self.split_tile(tile)
+            if self.zip_points_in_tile(
+                child_tile, zip_points_df, TILE_MARGIN_DEGREES
+            ).height
+            > 0
+        ]
+        with ThreadPoolExecutor(max_workers=MAX_SUB_QUERY_WORKERS) as executor:
+            child_dfs = list(
+                executor.map(
+                    lambda child_tile: self.get_gis_csv_for_tile(
+                        child_tile, base_params, zip_points_df
+                    ),
+                    child_tiles,
+                )
+            )
+        dfs = [child_df for child_df in [df, *child_dfs] if child_df is not None]
+        if len(dfs) == 0:
+            return None
+        return pl.concat(dfs).unique(subset=URL_COL_NAME, keep="first")
+
+    def _get_gis_csv_for_tile_with_progress(
+        self, tile: Tile, base_params: dict[str, Any], zip_points_df: pl.DataFrame
+    ) -> pl.DataFrame | None:
+        tile_df = self.get_gis_csv_for_tile(tile, base_params, zip_points_df)
+        self.progress.step(houses_found=0 if tile_df is None else tile_df.height)
+        return tile_df
+
+    def get_gis_csv_for_tiles_in_metro_with_filters(
+        self, msa_name: str, search_filters: dict[str, Any]
+    ) -> pl.DataFrame | None:
+        """Get a DataFrame of all GIS CSVs of a Metropolitan Statistical Area by covering it with tiles instead of querying each ZIP code.
+
+        Note:
+            Only one region lookup is made, and its market is used for every tile.
+
+        Args:
+            msa_name (str): a Metropolitan Statistical Area
+            search_filters (dict[str, Any]): filters to search with
+
+        Returns:
+            pl.DataFrame | None: return a DataFrame of all houses in the ZIP codes of the metro. None if there were no houses
+        """
+        log(f"Searching {msa_name} by tile with filters {search_filters}.", "info")
+        zip_codes = metro_name_to_zip_code_list(msa_name)
+        zip_points_df = metro_name_to_zip_lat_long_df(msa_name)
+        if zip_points_df.height == 0:
+            log(f"No ZIP code locations are known for {msa_name}.", "warn")
+            return None
+
+        base_params = None
+        for zip in zip_points_df["ZIP"].head(5):
+            try:
+                root_defaults = self.get_region_info_from_zipcode(f"{zip:0{5}}")[
+                    "payload"
+                ]["rootDefaults"]
+                base_params = self.search_filters_to_params(
+                    search_filters,
+                    root_defaults["market"],
+                    str(root_defaults["status"]),
+                )
+                break
+            except (json.JSONDecodeError, requests.HTTPError, KeyError):
+                log(f"Could not identify the market for {zip}.", "debug")
+        if base_params is None:
+            log(f"Could not identify the market for {msa_name}.", "warn")
+            return None
+
+        tiles = self.plan_metro_tiles(zip_points_df)
+        log(
+            f"Covering {zip_points_df.height} ZIP codes in {msa_name} with {len(tiles)} tiles.",
+            "info",
+        )
+        self.progress.start_phase(CrawlPhase.SEARCHING, len(tiles))
+        with ThreadPoolExecutor(max_workers=MAX_SUB_QUERY_WORKERS) as executor:
+            tile_dfs = list(
+                executor.map(
+                    lambda tile: self._get_gis_csv_for_tile_with_progress(
+                        tile, base_params, zip_points_df
+                    ),
+                    tiles,
+                )
+            )
+        tile_dfs = [tile_df for tile_df in tile_dfs if tile_df is not None]
+        if len(tile_dfs) == 0:
+            return None
+        # tiles extend past the metro, so only keep houses in the metro's ZIP codes
+        df = (
+            pl.concat(tile_dfs)
+            .unique(subset=URL_COL_NAME, keep="first")
+            .filter(pl.col("ZIP OR POSTAL CODE").is_in(zip_codes))
+        )
+        if df.height == 0:
+            return None
+        return df
+
+    def add_property_id_column(self, df: pl.DataFrame) -> pl.DataFrame:
+        """Parse the Redfin property ID out of the listing URL.
+
+        Args:
+            df (pl.DataFrame): gis-csv DataFrame
+
+        Returns:
+            pl.DataFrame: the DataFrame with a "PROPERTY ID" column. Null if the URL has no property ID
+        """
+        return df.with_columns(
+            pl.col(URL_COL_NAME)
+            .str.extract(r"/home/([0-9]+)", 1)
+            .cast(pl.Int64)
+            .alias("PROPERTY ID")
+        )
+
+    def plan_metro_crawl(
+        self,
+        msa_name: str,
+        use_cached_gis_csv_csv: bool = False,
+        crawl_strategy: CrawlStrategy = CrawlStrategy.ZIP,
+    ) -> dict[str, Any]:
+        """Estimate the requests and time a crawl of a metro would take, without making any requests.
+
+        Note:
+            Region responses, the cached metro GIS CSV and the listing store are checked to see which requests are still needed. The number of listings in a ZIP code that has never been crawled is estimated from the ZIP codes that have been, and request times come from `self.request_stats`.
+
+        Args:
+            msa_name (str): Metropolitan Statistical Area name
+            use_cached_gis_csv_csv (bool, optional): Whether the crawl would use an already made GIS CSV DataFrame. Defaults to False.
+            crawl_strategy (CrawlStrategy, optional): Whether the crawl would query each ZIP code or cover the metro with tiles. Defaults to CrawlStrategy.ZIP.
+
+        Returns:
+            dict[str, Any]: the number of ZIP codes, the estimated number of listings and of listings left to classify, the requests per endpoint (rate limit waits included), and the estimated seconds
+        """
+        zip_codes = metro_name_to_zip_code_list(msa_name)
+        formatted_zip_codes = [f"{zip_code:0{5}}" for zip_code in zip_codes]
+        file_safe_msa_name = msa_name.strip().replace(", ", "_").replace(" ", "_")
+        metro_csv_path = (
+            OUTPUT_DIR_PATH / file_safe_msa_name / (file_safe_msa_name + ".csv")
+        )
+
+        region_requests = 0
+        gis_csv_requests = 0
+        if use_cached_gis_csv_csv and metro_csv_path.exists():
+            property_ids = (
+                self.add_property_id_column(
+                    pl.read_csv(metro_csv_path, dtypes=self.DESIRED_CSV_SCHEMA)
+                )["PROPERTY ID"]
+                .drop_nulls()
+                .to_list()
+            )
+            listings = len(property_ids)
+            listings_to_classify = listings - len(
+                self.listing_store.get_heating_classifications(property_ids)
+            )
+        else:
+            cached_region_zip_codes = self.listing_store.get_cached_region_zip_codes(
+                formatted_zip_codes
+            )
+            if crawl_strategy == self.CrawlStrategy.TILE:
+                zip_points_df = metro_name_to_zip_lat_long_df(msa_name)
+                region_requests = int(len(cached_region_zip_codes) == 0)
+                if zip_points_df.height > 0:
+                    gis_csv_requests = len(self.plan_metro_tiles(zip_points_df))
+            else:
+                region_requests = len(formatted_zip_codes) - len(
+                    cached_region_zip_codes
+                )
+                gis_csv_requests = len(formatted_zip_codes)
+
+            counts_by_zip = self.listing_store.count_listings_by_zip(zip_codes)
+            if len(counts_by_zip) > 0:
+                listings_per_zip = sum(
+                    listings for listings, _ in counts_by_zip.values()
+                ) / len(counts_by_zip)
+            else:
+                listings_per_zip = DEFAULT_LISTINGS_PER_ZIP
+            uncrawled_listings = round(
+                listings_per_zip * (len(zip_codes) - len(counts_by_zip))
+            )
+            listings = (
+                sum(listings for listings, _ in counts_by_zip.values())
+                + uncrawled_listings
+            )
+            listings_to_classify = (
+                sum(
+                    listings - classified
+                    for listings, classified in counts_by_zip.values()
+                )
+                + uncrawled_listings
+            )
+
+        request_counts = {
+            RedfinEndpoint.REGION: region_requests,
+            RedfinEndpoint.GIS_CSV: gis_csv_requests,
+            RedfinEndpoint.INITIAL_INFO: listings_to_classify,
+            RedfinEndpoint.BELOW_THE_FOLD: listings_to_classify,
+            RedfinEndpoint.RATE_LIMIT: gis_csv_requests + 2 * listings_to_classify,
+        }
+        return {
+            "msa_name": msa_name,
+            "zip_codes": len(zip_codes),
+            "listings": listings,
+            "listings_to_classify": listings_to_classify,
+            "requests": {
+                endpoint.value: count for endpoint, count in request_counts.items()
+            },
+            "estimated_seconds": self.request_stats.estimate_seconds(request_counts),
+        }
+
     def get_house_attributes_from_metro(
         self,
         msa_name: str,
         search_filters: dict[str, Any],
         use_cached_gis_csv_csv: bool = False,
+        crawl_strategy: CrawlStrategy = CrawlStrategy.ZIP,
     ) -> None:
         """Main function. Get the heating attributes of a Metropolitan Statistical Area.
 
@@ -722,12 +1286,36 @@ class RedfinApi:
             msa_name (str): Metropolitan Statistical Area name
             search_filters (dict[str, Any]): search filters
             use_cached_gis_csv_csv (bool, optional): Whether to use an already made GIS CSV DataFrame. Defaults to False.
+            crawl_strategy (CrawlStrategy, optional): Whether to query each ZIP code or to cover the metro with tiles. Defaults to CrawlStrategy.ZIP.
 
         Returns:
             None: None if there were no houses found in the metro
         """
+        self.progress.reset()
+        try:
+            return self._get_house_attributes_from_metro(
+                msa_name, search_filters, use_cached_gis_csv_csv, crawl_strategy
+            )
+        except Exception:
+            # so that anything polling the progress stops
+            self.progress.start_phase(CrawlPhase.FAILED)
+            raise
+        finally:
+            self.request_stats.flush()
+
+    def _get_house_attributes_from_metro(
+        self,
+        msa_name: str,
+        search_filters: dict[str, Any],
+        use_cached_gis_csv_csv: bool,
+        crawl_strategy: CrawlStrategy,
+    ) -> None:
         file_safe_msa_name = msa_name.strip().replace(", ", "_").replace(" ", "_")
         METRO_OUTPUT_DIR_PATH = OUTPUT_DIR_PATH / file_safe_msa_name
+        if crawl_strategy == self.CrawlStrategy.TILE:
+            get_gis_csv_for_metro = self.get_gis_csv_for_tiles_in_metro_with_filters
+        else:
+            get_gis_csv_for_metro = self.get_gis_csv_for_zips_in_metro_with_filters
 
         if use_cached_gis_csv_csv:
             log("Loading csv from cache.", "info")
@@ -745,19 +1333,16 @@ class RedfinApi:
                     f"Loading csv from {METRO_OUTPUT_DIR_PATH / (file_safe_msa_name + ".csv")} has failed, continuing with API search.",
                     "info",
                 )
-                search_page_csvs_df = self.get_gis_csv_for_zips_in_metro_with_filters(
-                    msa_name, search_filters
-                )
+                search_page_csvs_df = get_gis_csv_for_metro(msa_name, search_filters)
         else:
-            search_page_csvs_df = self.get_gis_csv_for_zips_in_metro_with_filters(
-                msa_name, search_filters
-            )
+            search_page_csvs_df = get_gis_csv_for_metro(msa_name, search_filters)
 
         if search_page_csvs_df is None:
             log(f"No houses found within {msa_name}. Try relaxing filters.", "info")
+            self.progress.start_phase(CrawlPhase.DONE)
             return None
 
-        url_col_name = "URL (SEE https://www.redfin.com/buy-a-home/comparative-market-analysis FOR INFO ON PRICING)"
+        url_col_name = URL_COL_NAME
         search_page_csvs_df = search_page_csvs_df.filter(
             (~pl.col(url_col_name).str.contains("(?i)unknown"))
             .and_(pl.col("ADDRESS").str.len_chars().gt(0))
@@ -797,27 +1382,57 @@ class RedfinApi:
             f"Unique ZIP codes: {search_page_csvs_df["ZIP OR POSTAL CODE"].n_unique()}",
             "info",
         )
+
+        # the listing store is consulted so that houses classified by earlier crawls are not looked up again
+        search_page_csvs_df = self.add_property_id_column(search_page_csvs_df)
+        self.listing_store.upsert_listings(search_page_csvs_df)
+        stored_heating_dicts = self.listing_store.get_heating_classifications(
+            search_page_csvs_df["PROPERTY ID"].drop_nulls().to_list()
+        )
         log(
-            f"Estimated completion time: {search_page_csvs_df.height * 4.5} seconds",
+            f"{len(stored_heating_dicts)} of {search_page_csvs_df.height} houses have already been classified.",
+            "info",
+        )
+        houses_to_classify = search_page_csvs_df.height - len(stored_heating_dicts)
+        estimated_seconds = self.request_stats.estimate_seconds(
+            {
+                RedfinEndpoint.INITIAL_INFO: houses_to_classify,
+                RedfinEndpoint.BELOW_THE_FOLD: houses_to_classify,
+                RedfinEndpoint.RATE_LIMIT: 2 * houses_to_classify,
+            }
+        )
+        log(
+            f"Estimated completion time: {estimated_seconds:.0f} seconds",
             "info",
         )
 
-        list_of_dfs_by_zip = search_page_csvs_df.partition_by("ZIP OR POSTAL CODE")
-
-        for i, _ in enumerate(list_of_dfs_by_zip):
-            list_of_dfs_by_zip[i] = (
-                list_of_dfs_by_zip[i]
-                .with_columns(
-                    pl.concat_list([pl.col("ADDRESS"), pl.col(url_col_name)])
-                    .map_elements(self.get_heating_terms_dict_from_listing)
-                    .alias("nest")
-                )
-                .drop(url_col_name)
-                .unnest("nest")
+        def classify_listing(listing: dict[str, Any]) -> dict[str, bool]:
+            heating_dict = self.get_heating_terms_dict_with_store(
+                listing["PROPERTY ID"],
+                listing["ADDRESS"],
+                listing[url_col_name],
+                stored_heating_dicts,
+            )
+            self.progress.step(heating_dict=heating_dict)
+            return heating_dict
+
+        # listings are interleaved across ZIP codes so that the interim estimate is representative of the metro
+        planned_df = plan_listing_order(search_page_csvs_df)
+        self.progress.start_phase(CrawlPhase.CLASSIFYING, planned_df.height)
+        classified_df = (
+            planned_df.with_columns(
+                pl.struct(["PROPERTY ID", "ADDRESS", url_col_name])
+                .map_elements(classify_listing)
+                .alias("nest")
             )
+            .drop(url_col_name)
+            .unnest("nest")
+        )
 
-            zip = list_of_dfs_by_zip[i].select("ZIP OR POSTAL CODE").item(0, 0)
-            list_of_dfs_by_zip[i].write_csv(f"{METRO_OUTPUT_DIR_PATH / str(zip)}.csv")
+        list_of_dfs_by_zip = classified_df.partition_by("ZIP OR POSTAL CODE")
+        for df_by_zip in list_of_dfs_by_zip:
+            zip = df_by_zip.select("ZIP OR POSTAL CODE").item(0, 0)
+            df_by_zip.write_csv(f"{METRO_OUTPUT_DIR_PATH / str(zip)}.csv")
 
         if len(list_of_dfs_by_zip) > 0:
             concat_df = pl.concat(list_of_dfs_by_zip)
@@ -829,4 +1444,5 @@ class RedfinApi:
 
             concat_df.write_csv(f"{METRO_OUTPUT_DIR_PATH}/full_info.csv")
 
+        self.progress.start_phase(CrawlPhase.DONE)
         log(f"Done with searching houses in {msa_name}!", "info")
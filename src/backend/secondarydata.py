@@ -1,15 +1,34 @@
 import datetime
+import functools
+import hashlib
+import io
 import json
 import os
+import shutil
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
 import re
 from enum import Enum, StrEnum
-from typing import Any
+from typing import Any, Callable, Iterable, Iterator, TextIO
 
 import polars as pl
-import polars.selectors as cs
 import requests
-from backend.helper import log, req_get_wrapper
+from backend.censuscache import CENSUS_CACHE_MAX_BYTES, CensusCache
+from backend.helper import (
+    log,
+    metro_name_to_zcta_list,
+    req_get_wrapper,
+    state_to_zcta_list,
+    wait_for_host,
+)
+from backend.pricestore import (
+    ENERGY_PRICE_STORE_PATH,
+    EnergyPriceStore,
+    first_revisable_period,
+    month_periods,
+)
 from backend.us import states as sts
 from dotenv import load_dotenv
 
@@ -18,6 +37,56 @@ load_dotenv()
 
 CENSUS_DATA_DIR_PATH = Path(__file__).parent.parent.parent / "output" / "census_data"
 CENSUS_DATA_CACHE_PATH = CENSUS_DATA_DIR_PATH / "cache"
+CENSUS_API_BASE_URL = "https://api.census.gov/data"
+CENSUS_PANEL_DIR_PATH = CENSUS_DATA_DIR_PATH / "panels"
+ENERGY_PRICE_CUBE_PATH = (
+    Path(__file__).parent.parent.parent / "output" / "energy_price_cube.arrow"
+)
+EIA_API_BASE_URL = "https://api.eia.gov/v2"
+
+# how long to wait for all of a state's energy price series
+EIA_SERIES_TIMEOUT_SECONDS = 60
+# the most rows the EIA API returns per request
+EIA_MAX_ROWS_PER_REQUEST = 5000
+MAX_EIA_PAGE_WORKERS = 4
+# only one price cube build writes at a time
+_price_cube_lock = threading.Lock()
+# `(start_date, end_date, cube_path)` of the background price cube builds that are running
+_price_cube_builds_in_flight: set[tuple[datetime.date, datetime.date, Path]] = set()
+_price_cube_builds_lock = threading.Lock()
+# years of prior prices used to fill gaps. See `EIADataRetriever.fill_price_gaps`
+GAP_FILL_LOOKBACK_YEARS = 3
+
+# characters read from a JSON file at a time by `iter_json_array_rows`
+JSON_READ_CHUNK_SIZE = 1 << 16
+# Census data rows parsed into each typed batch by `census_rows_to_df`
+CENSUS_ROWS_PER_BATCH = 4096
+# Census variable predicateType: dtype. Other predicate types are kept as strings
+CENSUS_PREDICATE_TYPE_DTYPES = {"int": pl.Int64, "float": pl.Float64}
+# the most variables the Census API returns per request
+CENSUS_MAX_VARIABLES_PER_REQUEST = 50
+MAX_CENSUS_WORKERS = 4
+# Census downloads in progress at once, across all threads and retrievers
+_census_request_slots = threading.BoundedSemaphore(MAX_CENSUS_WORKERS)
+# the last year of the most recent ACS 5 year release
+LATEST_ACS5_YEAR = 2022
+# tables and years of a panel when none are given. See `CensusDataRetriever.build_acs5_panel`
+DEFAULT_ACS5_PANEL_TABLES = ["S1901", "DP05", "DP04"]
+DEFAULT_ACS5_PANEL_YEARS = [
+    str(year) for year in range(LATEST_ACS5_YEAR - 4, LATEST_ACS5_YEAR + 1)
+]
+# the longest comma separated ZCTA list sent in the `for` parameter of one request, so that URLs stay well under server limits
+CENSUS_MAX_ZCTA_LIST_LENGTH = 4000
+# values that stand in for an estimate or margin of error that could not be computed
+# https://www.census.gov/data/developers/data-sets/acs-1year/notes-on-acs-estimate-and-annotation-values.html
+CENSUS_JAM_VALUES = [
+    -999999999,
+    -888888888,
+    -666666666,
+    -555555555,
+    -333333333,
+    -222222222,
+]
 
 # https://www.dcf.ks.gov/services/PPS/Documents/PPM_Forms/Section_5000_Forms/PPS5460_Instr.pdf
 REPLACEMENT_DICT = {
@@ -47,6 +116,204 @@ REPLACEMENT_DICT = {
     "Three": "3",
 }
 
+# every replacement of `REPLACEMENT_DICT` in one pass. At each position the first key in dict order that matches wins, so keys that must be replaced before others are listed first
+REPLACEMENT_PATTERN = re.compile(
+    "|".join(f"(?P<_{idx}>{key})" for idx, key in enumerate(REPLACEMENT_DICT))
+)
+REPLACEMENT_VALUES = list(REPLACEMENT_DICT.values())
+WHITESPACE_PATTERN = re.compile(r"\s+")
+# change when `shorten_census_label` changes, so that label indexes saved by earlier versions are rebuilt
+CENSUS_LABEL_INDEX_VERSION = 1
+# label indexes by (cache folder, year, dataset, table). See `CensusDataRetriever.acs5_label_index`
+_census_label_indexes: dict[tuple[str, str, str, str], dict[str, str]] = {}
+_census_label_index_lock = threading.Lock()
+
+
+def iter_json_array_rows(file: TextIO) -> Iterator[Any]:
+    """Parse a JSON array one element at a time.
+
+    Note:
+        Only `JSON_READ_CHUNK_SIZE` characters and the element being parsed are held in memory. The elements must be arrays or objects, like the rows of a Census API response.
+
+    Args:
+        file (TextIO): the open JSON file
+
+    Raises:
+        ValueError: if the file is not a JSON array
+
+    Yields:
+        Iterator[Any]: the elements
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(JSON_READ_CHUNK_SIZE).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array")
+    position = 1
+    end_of_file = False
+    while True:
+        # skip to the start of the next element
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) or end_of_file:
+                break
+            buffer, position = file.read(JSON_READ_CHUNK_SIZE), 0
+            end_of_file = buffer == ""
+        if position >= len(buffer):
+            raise ValueError("Unterminated JSON array")
+        if buffer[position] == "]":
+            return
+
+        try:
+            element, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if end_of_file:
+                raise
+            # the element continues past the end of the buffer
+            chunk = file.read(JSON_READ_CHUNK_SIZE)
+            end_of_file = chunk == ""
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield element
+
+
+def census_rows_to_df(
+    rows: Iterable[list[str | None]],
+    columns: dict[int, tuple[str, pl.PolarsDataType]],
+) -> pl.DataFrame:
+    """Build a typed DataFrame from Census API data rows, `CENSUS_ROWS_PER_BATCH` rows at a time.
+
+    Note:
+        Each batch is cast to its final types before the next one is parsed, so the string form of the whole table is never held in memory. Numeric `CENSUS_JAM_VALUES` become null.
+
+    Args:
+        rows (Iterable[list[str | None]]): the data rows, without the header row. See `iter_json_array_rows`
+        columns (dict[int, tuple[str, pl.PolarsDataType]]): `index in a row: (column name, dtype)` of the columns to keep
+
+    Returns:
+        pl.DataFrame: the table
+    """
+    cast_exprs = [
+        pl.col(name).cast(dtype, strict=False)
+        if dtype not in CENSUS_PREDICATE_TYPE_DTYPES.values()
+        else pl.when(pl.col(name).cast(dtype, strict=False).is_in(CENSUS_JAM_VALUES))
+        .then(None)
+        .otherwise(pl.col(name).cast(dtype, strict=False))
+        .alias(name)
+        for name, dtype in columns.values()
+    ]
+
+    def batch_to_df(batch: list[list[str | None]]) -> pl.DataFrame:
+        # built a column at a time, which is faster than from rows
+        return pl.DataFrame(
+            [
+                pl.Series(name, [row[index] for row in batch], dtype=pl.Utf8)
+                for index, (name, _) in columns.items()
+            ]
+        ).select(cast_exprs)
+
+    batch_dfs = [batch_to_df([])]
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == CENSUS_ROWS_PER_BATCH:
+            batch_dfs.append(batch_to_df(batch))
+            batch = []
+    if len(batch) > 0:
+        batch_dfs.append(batch_to_df(batch))
+    return pl.concat(batch_dfs, rechunk=True)
+
+
+def shorten_census_label(label: str, max_length: int) -> str:
+    """Shorten a Census variable label into a column name.
+
+    Note:
+        QGIS does not allow field names of 80+ characters, so labels are massaged into CamelCase, shortened with `REPLACEMENT_DICT`, then cut off.
+
+    Args:
+        label (str): the label, like "Estimate!!SEX AND AGE!!Total population"
+        max_length (int): the longest column name
+
+    Returns:
+        str: the column name, like "ESTSexAndAgeTPOP"
+    """
+    # delimiter for table subsection
+    col_name = label.replace("$", "D").replace(",", "").replace("'", "")
+    col_name = WHITESPACE_PATTERN.sub(" ", col_name).replace("!!", " ")
+    # easier to read
+    col_name = "".join(part.capitalize() for part in col_name.split(" "))
+    # shortenings to fit length requirement
+    col_name = REPLACEMENT_PATTERN.sub(
+        lambda match: REPLACEMENT_VALUES[int(match.lastgroup[1:])],  # type: ignore
+        col_name,
+    )
+    return col_name[:max_length]
+
+
+def census_variable_dtype(
+    variable_metadata: dict[str, Any], variable: str
+) -> pl.PolarsDataType:
+    """Get the dtype of a Census variable from its predicateType.
+
+    Args:
+        variable_metadata (dict[str, Any]): groups metadata variables
+        variable (str): the variable
+
+    Returns:
+        pl.PolarsDataType: see `CENSUS_PREDICATE_TYPE_DTYPES`. Utf8 for unknown variables
+    """
+    predicate_type = variable_metadata.get(variable, {}).get("predicateType")
+    return CENSUS_PREDICATE_TYPE_DTYPES.get(predicate_type, pl.Utf8)
+
+
+def zcta_for_values(zctas: list[str] | None) -> list[str]:
+    """Split ZCTAs into the values of the `for` parameter of Census API requests.
+
+    Args:
+        zctas (list[str] | None): the 5 digit ZCTAs, or None for all ZCTAs
+
+    Returns:
+        list[str]: comma separated ZCTA lists no longer than `CENSUS_MAX_ZCTA_LIST_LENGTH`, or ["*"] for all ZCTAs
+    """
+    if zctas is None:
+        return ["*"]
+    for_values = []
+    batch: list[str] = []
+    batch_length = 0
+    for zcta in sorted(set(zctas)):
+        if len(batch) > 0 and batch_length + len(zcta) > CENSUS_MAX_ZCTA_LIST_LENGTH:
+            for_values.append(",".join(batch))
+            batch = []
+            batch_length = 0
+        batch.append(zcta)
+        batch_length += len(zcta) + 1
+    if len(batch) > 0:
+        for_values.append(",".join(batch))
+    return for_values
+
+
+def read_census_response_df(
+    file: TextIO,
+    header_columns: Callable[[list[str]], dict[int, tuple[str, pl.PolarsDataType]]],
+) -> pl.DataFrame | None:
+    """Stream a cached Census API data response into a typed DataFrame.
+
+    Args:
+        file (TextIO): the cached response. See `CensusCache.open_text`
+        header_columns (Callable[[list[str]], dict[int, tuple[str, pl.PolarsDataType]]]): makes the columns to keep from the header row. See `census_rows_to_df`
+
+    Returns:
+        pl.DataFrame | None: the table, or None if the file is not a valid response
+    """
+    with file:
+        try:
+            rows = iter_json_array_rows(file)
+            headers = next(rows)
+            return census_rows_to_df(rows, header_columns(headers))
+        except (ValueError, StopIteration, EOFError, OSError) as e:
+            log(f"Could not decode cached census response: {e}", "error")
+            return None
+
 
 class EIADataRetriever:
     """Interact with the EIA open data API.
@@ -161,6 +428,13 @@ class EIADataRetriever:
         PROPANE = "EPLLPA"
         HEATING_OIL = "EPD2F"
 
+    class GapPolicy(StrEnum):
+        """How to fill months without a price."""
+
+        NULL = "null"
+        FORWARD_FILL = "forward fill"
+        SEASONAL = "seasonal"
+
     class FuelBTUConversion(Enum):
         # https://www.edf.org/sites/default/files/10071_EDF_BottomBarrel_Ch3.pdf
         # https://www.eia.gov/energyexplained/units-and-calculators/british-thermal-units.php
@@ -177,15 +451,169 @@ class EIADataRetriever:
         PROPANE_BTU_PER_GAL = 91_452
         WOOD_BTU_PER_CORD = 20_000_000
 
+    # the unit and EIA route that each energy type's raw price comes from
+    ENERGY_TYPE_UNITS_AND_SOURCES = {
+        EnergyType.PROPANE: ("$/gal", "petroleum/pri/wfr"),
+        EnergyType.HEATING_OIL: ("$/gal", "petroleum/pri/wfr"),
+        EnergyType.NATURAL_GAS: ("$/mcf", "natural-gas/pri/sum"),
+        EnergyType.ELECTRICITY: ("cents/kWh", "electricity/retail-sales"),
+    }
+
+    # route, frequency, data column, state facet, state facet value format and other facets of each energy type's series
+    ENERGY_TYPE_SERIES = {
+        EnergyType.PROPANE: (
+            "petroleum/pri/wfr",
+            "weekly",
+            "value",
+            "duoarea",
+            "S{}",
+            {"process": ["PRS"], "product": ["EPLLPA"]},
+        ),
+        EnergyType.HEATING_OIL: (
+            "petroleum/pri/wfr",
+            "weekly",
+            "value",
+            "duoarea",
+            "S{}",
+            {"process": ["PRS"], "product": ["EPD2F"]},
+        ),
+        EnergyType.NATURAL_GAS: (
+            "natural-gas/pri/sum",
+            "monthly",
+            "value",
+            "duoarea",
+            "S{}",
+            {"process": ["PRS"]},
+        ),
+        EnergyType.ELECTRICITY: (
+            "electricity/retail-sales",
+            "monthly",
+            "price",
+            "stateid",
+            "{}",
+            {"sectorid": ["RES"]},
+        ),
+    }
+
+    # propane and heating oil prices are only collected October through March
+    HEATING_SEASON_MONTHS = {10, 11, 12, 1, 2, 3}
+
+    # series IDs in the EIA bulk download files, with the state as the first group
+    # https://www.eia.gov/opendata/bulkfiles.php
+    BULK_SERIES_ID_PATTERNS = {
+        EnergyType.PROPANE: re.compile(r"PET\.W_EPLLPA_PRS_S([A-Z]{2})_DPG\.W"),
+        EnergyType.HEATING_OIL: re.compile(r"PET\.W_EPD2F_PRS_S([A-Z]{2})_DPG\.W"),
+        EnergyType.NATURAL_GAS: re.compile(r"NG\.N3010([A-Z]{2})3\.M"),
+        EnergyType.ELECTRICITY: re.compile(r"ELEC\.PRICE\.([A-Z]{2})-RES\.M"),
+    }
+
+    # BTU per unit of each energy type's raw price, dollars per unit of the raw price, and the appliance that its price per MBTU is for
+    ENERGY_TYPE_CONVERSIONS = {
+        EnergyType.PROPANE: (
+            FuelBTUConversion.PROPANE_BTU_PER_GAL.value,
+            1,
+            HeaterEfficiencies.PROPANE_FURNACE,
+        ),
+        EnergyType.HEATING_OIL: (
+            FuelBTUConversion.HEATING_OIL_BTU_PER_GAL.value,
+            1,
+            HeaterEfficiencies.OIL_BOILER,
+        ),
+        EnergyType.NATURAL_GAS: (
+            FuelBTUConversion.NG_BTU_PER_MCT.value,
+            1,
+            HeaterEfficiencies.NG_FURNACE,
+        ),
+        EnergyType.ELECTRICITY: (
+            FuelBTUConversion.ELECTRICITY_BTU_PER_KWH.value,
+            1 / 100,  # cents
+            HeaterEfficiencies.HEAT_PUMP_DUCTED,
+        ),
+    }
+
+    # the energy type each heater burns and the BTU per unit of its price. None for heaters that burn a fuel the EIA does not price
+    # keyed by name, since heaters with the same efficiency are aliases of each other in `HeaterEfficiencies`
+    HEATER_FUELS = {
+        "HEAT_PUMP_GEOTHERMAL": (
+            EnergyType.ELECTRICITY,
+            FuelBTUConversion.ELECTRICITY_BTU_PER_KWH.value,
+        ),
+        "HEAT_PUMP_DUCTLESS": (
+            EnergyType.ELECTRICITY,
+            FuelBTUConversion.ELECTRICITY_BTU_PER_KWH.value,
+        ),
+        "HEAT_PUMP_DUCTED": (
+            EnergyType.ELECTRICITY,
+            FuelBTUConversion.ELECTRICITY_BTU_PER_KWH.value,
+        ),
+        "BASEBOARD": (
+            EnergyType.ELECTRICITY,
+            FuelBTUConversion.ELECTRICITY_BTU_PER_KWH.value,
+        ),
+        # kerosene is No. 1 heating oil, priced with No. 2
+        "KEROSENE_ROOM_HEATER": (
+            EnergyType.HEATING_OIL,
+            FuelBTUConversion.NO1_OIL_BTU_PER_GAL.value,
+        ),
+        "PROPANE_BOILER": (
+            EnergyType.PROPANE,
+            FuelBTUConversion.PROPANE_BTU_PER_GAL.value,
+        ),
+        "NG_BOILER": (
+            EnergyType.NATURAL_GAS,
+            FuelBTUConversion.NG_BTU_PER_MCT.value,
+        ),
+        "NG_ROOM_HEATER": (
+            EnergyType.NATURAL_GAS,
+            FuelBTUConversion.NG_BTU_PER_MCT.value,
+        ),
+        "PROPANE_ROOM_HEATER": (
+            EnergyType.PROPANE,
+            FuelBTUConversion.PROPANE_BTU_PER_GAL.value,
+        ),
+        "OIL_BOILER": (
+            EnergyType.HEATING_OIL,
+            FuelBTUConversion.HEATING_OIL_BTU_PER_GAL.value,
+        ),
+        "WOOD_STOVE": None,
+        "PELLET_STOVE": None,
+        "NG_FURNACE": (
+            EnergyType.NATURAL_GAS,
+            FuelBTUConversion.NG_BTU_PER_MCT.value,
+        ),
+        "PROPANE_FURNACE": (
+            EnergyType.PROPANE,
+            FuelBTUConversion.PROPANE_BTU_PER_GAL.value,
+        ),
+        "OIL_FURNACE": (
+            EnergyType.HEATING_OIL,
+            FuelBTUConversion.HEATING_OIL_BTU_PER_GAL.value,
+        ),
+        "PELLET_BOILER": None,
+    }
+
     def __init__(self):
-        self.eia_base_url = "https://api.eia.gov/v2"
+        # point this at `backend.eiaserver.EIAStandInServer` to work offline
+        self.eia_base_url = os.getenv("EIA_BASE_URL", EIA_API_BASE_URL)
+        # prices from another server, such as a stand-in, are kept apart
+        if self.eia_base_url == EIA_API_BASE_URL:
+            price_store_path = ENERGY_PRICE_STORE_PATH
+            self.price_cube_path = ENERGY_PRICE_CUBE_PATH
+        else:
+            url_hash = hashlib.sha1(self.eia_base_url.encode()).hexdigest()[:8]
+            price_store_path = ENERGY_PRICE_STORE_PATH.with_name(
+                f"energy_prices-{url_hash}.db"
+            )
+            self.price_cube_path = ENERGY_PRICE_CUBE_PATH.with_name(
+                f"energy_price_cube-{url_hash}.arrow"
+            )
+        self.price_store = EnergyPriceStore(price_store_path)
         self.api_key = os.getenv("EIA_API_KEY")
         if self.api_key is None:
             log(
-                "No Census API key found in a .env file in project directory. please request a key at https://www.eia.gov/opendata/register.php",
-                "critical",
+                "No EIA API key found in a .env file in project directory, only stored prices can be used. please request a key at https://www.eia.gov/opendata/register.php",
+                "info",
             )
-            exit()
 
     def price_per_mbtu_with_efficiency(
         self, energy_price_dict: dict
@@ -204,73 +632,22 @@ class EIADataRetriever:
         Returns:
             dict: new dictionary with btu centric pricing
         """
-        #! make new function based on burner type/ end usage type
-        CENTS_IN_DOLLAR = 100
-        match energy_price_dict.get("type"):
-            case self.EnergyType.PROPANE.value:
-                # for loop is done for every case since i dont want to use `eval` or parse a string of division to keep PEMDAS. this is why i dont have an efficiency func yet
-                for key, value in energy_price_dict.items():
-                    if (
-                        key in ["type", "state", None]
-                        or energy_price_dict.get(key) is None
-                    ):
-                        continue
-                    energy_price_dict[key] = (
-                        value
-                        / (
-                            self.FuelBTUConversion.PROPANE_BTU_PER_GAL.value
-                            * self.HeaterEfficiencies.PROPANE_FURNACE.value
-                        )
-                        * 1_000
-                    )
-            case self.EnergyType.NATURAL_GAS.value:
-                for key, value in energy_price_dict.items():
-                    if (
-                        key in ["type", "state", None]
-                        or energy_price_dict.get(key) is None
-                    ):
-                        continue
-                    energy_price_dict[key] = (
-                        value
-                        / (
-                            self.FuelBTUConversion.NG_BTU_PER_MCT.value
-                            * self.HeaterEfficiencies.NG_FURNACE.value
-                        )
-                        * 1_000
-                    )
-            case self.EnergyType.ELECTRICITY.value:
-                for key, value in energy_price_dict.items():
-                    if (
-                        key in ["type", "state", None]
-                        or energy_price_dict.get(key) is None
-                    ):
-                        continue
-                    energy_price_dict[key] = (
-                        value
-                        / CENTS_IN_DOLLAR
-                        / (
-                            self.FuelBTUConversion.ELECTRICITY_BTU_PER_KWH.value
-                            * self.HeaterEfficiencies.HEAT_PUMP_DUCTED.value
-                        )
-                        * 1_000
-                    )
-            case self.EnergyType.HEATING_OIL.value:
-                for key, value in energy_price_dict.items():
-                    if (
-                        key in ["type", "state", None]
-                        or energy_price_dict.get(key) is None
-                    ):
-                        continue
-                    energy_price_dict[key] = (
-                        value
-                        / (
-                            self.FuelBTUConversion.HEATING_OIL_BTU_PER_GAL.value
-                            * self.HeaterEfficiencies.OIL_BOILER.value
-                        )
-                        * 1_000
-                    )
-            case _:
-                log("Could not translate dict to btu per price.", "warn")
+        energy_types_by_value = {
+            energy_type.value: energy_type for energy_type in self.EnergyType
+        }
+        energy_type = energy_types_by_value.get(energy_price_dict.get("type"))  # type: ignore
+        if energy_type not in self.ENERGY_TYPE_CONVERSIONS:
+            log("Could not translate dict to btu per price.", "warn")
+            return energy_price_dict
+
+        btu_per_unit, dollars_per_unit, heater = self.ENERGY_TYPE_CONVERSIONS[
+            energy_type
+        ]
+        dollars_per_mbtu = dollars_per_unit / (btu_per_unit * heater.value) * 1_000
+        for key, value in energy_price_dict.items():
+            if key in ["type", "state", None] or value is None:
+                continue
+            energy_price_dict[key] = value * dollars_per_mbtu
 
         return energy_price_dict
 
@@ -288,6 +665,9 @@ class EIADataRetriever:
         Returns:
             dict[str, str | EnergyType | float]: cleaned JSON
         """
+        if len(eia_json["response"]["data"]) == 0:
+            return {"type": energy_type.value, "state": state}
+
         # price key is different for electricity
         accessor = "value"
         if "product" not in eia_json["response"]["data"][0]:
@@ -363,15 +743,15 @@ class EIADataRetriever:
             start_date (datetime.date): the start date, inclusive
             end_date (datetime.date): the end date, non inclusive
 
+        Raises:
+            requests.RequestException: the request failed, or the EIA answered with an error. See `EIADataRetriever._eia_response`
+
         Returns:
             dict: the dictionary in `year-month: price` form
         """
         url = f"{self.eia_base_url}/electricity/retail-sales/data/?frequency=monthly&data[0]=price&facets[stateid][]={state}&facets[sectorid][]=RES&start={start_date.year}-{start_date.month:02}&end={end_date.year}-{end_date.month:02}&sort[0][column]=period&sort[0][direction]=asc&api_key={self.api_key}"
 
-        eia_request = req_get_wrapper(url)
-        eia_request.raise_for_status()
-
-        return eia_request.json()
+        return {"response": self._eia_response(url)}
 
     def monthly_ng_price_per_mcf(
         self, state: str, start_date: datetime.date, end_date: datetime.date
@@ -386,16 +766,16 @@ class EIADataRetriever:
             start_date (datetime.date): the start date, inclusive
             end_date (datetime.date): the end date, non inclusive
 
+        Raises:
+            requests.RequestException: the request failed, or the EIA answered with an error. See `EIADataRetriever._eia_response`
+
         Returns:
             dict: _description_
         """
         # $/mcf
-        url = f"https://api.eia.gov/v2/natural-gas/pri/sum/data/?frequency=monthly&data[0]=value&facets[duoarea][]=S{state}&facets[process][]=PRS&start={start_date.year}-{start_date.month:02}&end={end_date.year}-{end_date.month:02}&sort[0][column]=period&sort[0][direction]=asc&api_key={self.api_key}"
-
-        eia_request = req_get_wrapper(url)
-        eia_request.raise_for_status()
+        url = f"{self.eia_base_url}/natural-gas/pri/sum/data/?frequency=monthly&data[0]=value&facets[duoarea][]=S{state}&facets[process][]=PRS&start={start_date.year}-{start_date.month:02}&end={end_date.year}-{end_date.month:02}&sort[0][column]=period&sort[0][direction]=asc&api_key={self.api_key}"
 
-        return eia_request.json()
+        return {"response": self._eia_response(url)}
 
     def monthly_heating_season_heating_oil_price_per_gal(
         self, state: str, start_date: datetime.date, end_date: datetime.date
@@ -438,31 +818,25 @@ class EIADataRetriever:
             start_date (datetime.date): the start date, inclusive
             end_date (datetime.date): the end date, non inclusive
 
+        Raises:
+            requests.RequestException: the request failed, or the EIA answered with an error. See `EIADataRetriever._eia_response`
+
         Returns:
             dict: _description_
         """
         # heating season is Oct - march, $/gal
-        url = f"https://api.eia.gov/v2/petroleum/pri/wfr/data/?frequency=weekly&data[0]=value&facets[duoarea][]=S{state}&facets[product][]=EPD2F&start={start_date}&end={end_date}&sort[0][column]=period&sort[0][direction]=asc&api_key={self.api_key}"
-
-        eia_request = req_get_wrapper(url)
-        eia_request.raise_for_status()
-
-        json = eia_request.json()
-        df = pl.DataFrame(json["response"]["data"])
-        # becomes int, so months are sig figs
-        df = df.with_columns(pl.col("period").str.strptime(pl.Date))
-        df = df.with_columns(
-            pl.col("period").dt.year().alias("year"),
-            pl.col("period").dt.month().alias("month"),
-        )
-
-        monthly_avg_price = (
-            df.group_by(["year", "month"])
-            .agg(pl.col("value").mean().alias("monthly_avg_price"))
-            .sort("year", "month")
-        )
-
-        return monthly_avg_price
+        url = f"{self.eia_base_url}/petroleum/pri/wfr/data/?frequency=weekly&data[0]=value&facets[process][]=PRS&facets[duoarea][]=S{state}&facets[product][]=EPD2F&start={start_date}&end={end_date}&sort[0][column]=period&sort[0][direction]=asc&api_key={self.api_key}"
+
+        data = self._eia_response(url)["data"]
+        if len(data) == 0:
+            return pl.DataFrame(
+                schema={
+                    "year": pl.Int32,
+                    "month": pl.Int8,
+                    "monthly_avg_price": pl.Float64,
+                }
+            )
+        return self.weekly_json_to_monthly_df(data, state)
 
     def monthly_heating_season_propane_price_per_gal(
         self, state: str, start_date: datetime.date, end_date: datetime.date
@@ -514,32 +888,168 @@ class EIADataRetriever:
             start_date (datetime.date): the start date, inclusive
             end_date (datetime.date): the end date, non inclusive
 
+        Raises:
+            requests.RequestException: the request failed, or the EIA answered with an error. See `EIADataRetriever._eia_response`
+
         Returns:
             dict: _description_
         """
         # heating season is Oct - march, $/gal
-        url = f"https://api.eia.gov/v2/petroleum/pri/wfr/data/?frequency=weekly&data[0]=value&facets[process][]=PRS&facets[duoarea][]=S{state}&facets[product][]=EPLLPA&start={start_date}&end={end_date}&sort[0][column]=period&sort[0][direction]=asc&api_key={self.api_key}"
+        url = f"{self.eia_base_url}/petroleum/pri/wfr/data/?frequency=weekly&data[0]=value&facets[process][]=PRS&facets[duoarea][]=S{state}&facets[product][]=EPLLPA&start={start_date}&end={end_date}&sort[0][column]=period&sort[0][direction]=asc&api_key={self.api_key}"
+
+        data = self._eia_response(url)["data"]
+        if len(data) == 0:
+            return pl.DataFrame(
+                schema={
+                    "year": pl.Int32,
+                    "month": pl.Int8,
+                    "monthly_avg_price": pl.Float64,
+                }
+            )
+        return self.weekly_json_to_monthly_df(data, state)
 
-        eia_request = req_get_wrapper(url)
-        eia_request.raise_for_status()
+    def weekly_to_monthly_lf(self, weekly_lf: pl.LazyFrame) -> pl.LazyFrame:
+        """Average weekly prices by state and month.
+
+        Args:
+            weekly_lf (pl.LazyFrame): LazyFrame with state, period (Date) and value columns, for any number of states
+
+        Returns:
+            pl.LazyFrame: one row per state and month with data, with the columns state, period (the first day of the month) and price
+        """
+        return (
+            weekly_lf.sort("state", "period")
+            .group_by_dynamic("period", every="1mo", by="state")
+            .agg(pl.col("value").mean().round(3).alias("price"))
+        )
+
+    def weekly_json_to_monthly_df(
+        self, data: list[dict[str, Any]], state: str
+    ) -> pl.DataFrame:
+        """Average the weekly data of an EIA response by month.
+
+        Args:
+            data (list[dict[str, Any]]): the response's data, with period and value keys
+            state (str): the state the data is for
+
+        Returns:
+            pl.DataFrame: DataFrame with year, month and monthly_avg_price columns
+        """
+        return (
+            self.weekly_to_monthly_lf(
+                pl.LazyFrame(data).select(
+                    pl.lit(state).alias("state"),
+                    pl.col("period").str.strptime(pl.Date),
+                    pl.col("value").cast(pl.Float64, strict=False),
+                )
+            )
+            .select(
+                pl.col("period").dt.year().alias("year"),
+                pl.col("period").dt.month().alias("month"),
+                pl.col("price").alias("monthly_avg_price"),
+            )
+            .collect()
+        )
+
+    def gap_fill_start_date(
+        self, start_date: datetime.date, gap_policy: GapPolicy | None
+    ) -> datetime.date:
+        """Get the date that prices have to be stored from, to fill the gaps from `start_date` on.
+
+        Args:
+            start_date (datetime.date): the start date, inclusive
+            gap_policy (GapPolicy | None): how to fill months without a price. See `EIADataRetriever.fill_price_gaps`
 
-        json = eia_request.json()
-        # return self.price_json_to_dict(eia_request.json())
-        df = pl.DataFrame(json["response"]["data"])
-        # df = df.with_columns(pl.col("period").str.to_date().alias("period"))
-        df = df.with_columns(pl.col("period").str.strptime(pl.Date))
-        df = df.with_columns(
-            pl.col("period").dt.year().alias("year"),
-            pl.col("period").dt.month().alias("month"),
+        Returns:
+            datetime.date: `GAP_FILL_LOOKBACK_YEARS` years before `start_date` for policies that fill from earlier prices, else `start_date`
+        """
+        if gap_policy in (None, self.GapPolicy.NULL):
+            return start_date
+        return datetime.date(
+            start_date.year - GAP_FILL_LOOKBACK_YEARS, start_date.month, 1
         )
 
-        monthly_avg_price = (
-            df.group_by(["year", "month"])
-            .agg(pl.col("value").mean().alias("monthly_avg_price"))
-            .sort("year", "month")
+    def fill_price_gaps(
+        self,
+        price_lf: pl.LazyFrame,
+        start_date: datetime.date,
+        end_date: datetime.date,
+        gap_policy: GapPolicy,
+    ) -> pl.LazyFrame:
+        """Give every state and fuel in a long format price LazyFrame a row for every month, filling missing prices by a policy.
+
+        Note:
+            For `GapPolicy.FORWARD_FILL` and `GapPolicy.SEASONAL`, `price_lf` should also hold the prices from `EIADataRetriever.gap_fill_start_date` on, so that the first months can be filled.
+
+            `GapPolicy.SEASONAL` fills a month from the same month of the latest prior year that has a price. Propane and heating oil are only priced in `HEATING_SEASON_MONTHS`, so their other months, and any month no prior year has, carry the latest earlier price instead, like `GapPolicy.FORWARD_FILL`.
+
+        Args:
+            price_lf (pl.LazyFrame): LazyFrame with state, fuel, period, raw_price and unit columns. See `EIADataRetriever.price_df`
+            start_date (datetime.date): the start date, inclusive
+            end_date (datetime.date): the end date, non inclusive
+            gap_policy (GapPolicy): how to fill months without a price
+
+        Returns:
+            pl.LazyFrame: the state, fuel, period, raw_price and unit columns from `start_date` to `end_date`, plus a filled column that is true for prices filled by the policy
+        """
+        periods = month_periods(start_date, end_date)
+        last_year, last_month = map(int, periods[-1].split("-"))
+        grid_start_year = start_date.year
+        if gap_policy != self.GapPolicy.NULL:
+            grid_start_year -= GAP_FILL_LOOKBACK_YEARS
+        months_lf = pl.LazyFrame(
+            {
+                "period": pl.date_range(
+                    datetime.date(grid_start_year, start_date.month, 1),
+                    datetime.date(last_year, last_month, 1),
+                    "1mo",
+                    eager=True,
+                )
+            }
         )
 
-        return monthly_avg_price
+        match gap_policy:
+            case self.GapPolicy.NULL:
+                filled_price = pl.col("raw_price")
+            case self.GapPolicy.FORWARD_FILL:
+                filled_price = pl.col("raw_price").forward_fill().over("state", "fuel")
+            case self.GapPolicy.SEASONAL:
+                # the same month's price from the latest prior year that has one, else the latest earlier price, which is the end of the last heating season for off-season fuels
+                filled_price = pl.coalesce(
+                    pl.col("raw_price")
+                    .forward_fill()
+                    .over("state", "fuel", pl.col("period").dt.month()),
+                    pl.col("raw_price").forward_fill().over("state", "fuel"),
+                )
+
+        return (
+            price_lf.select("state", "fuel", "unit")
+            .unique()
+            .join(months_lf, how="cross")
+            .join(
+                price_lf.select("state", "fuel", "period", "raw_price"),
+                on=["state", "fuel", "period"],
+                how="left",
+            )
+            .sort("state", "fuel", "period")
+            .with_columns(
+                filled_price.alias("_filled_price"),
+            )
+            .filter(
+                pl.col("period") >= datetime.date(start_date.year, start_date.month, 1)
+            )
+            .select(
+                "state",
+                "fuel",
+                "period",
+                pl.col("_filled_price").alias("raw_price"),
+                "unit",
+                (
+                    pl.col("raw_price").is_null()
+                    & pl.col("_filled_price").is_not_null()
+                ).alias("filled"),
+            )
+        )
 
     def monthly_price_per_mbtu_by_energy_type(
         self,
@@ -559,194 +1069,1195 @@ class EIADataRetriever:
 
         Raises:
             NotImplementedError: Invalid energy type
+            requests.RequestException: the missing months could not be fetched and none are stored
 
         Returns:
             dict: year-month: price in USD to BTU
         """
         if len(state) > 2:
             state = sts.lookup(state).abbr  # type: ignore
-        match energy_type:
-            case self.EnergyType.PROPANE:
-                return self.price_per_mbtu_with_efficiency(
-                    self.price_to_clean_dict(
-                        self.monthly_heating_season_propane_price_per_gal(
-                            state, start_date, end_date
-                        ),
-                        energy_type,
-                        state,
-                    )
-                )
-            case self.EnergyType.NATURAL_GAS:
-                return self.price_per_mbtu_with_efficiency(
-                    self.price_to_clean_dict(
-                        self.monthly_ng_price_per_mcf(state, start_date, end_date),
-                        energy_type,
-                        state,
-                    )
-                )
-            case self.EnergyType.ELECTRICITY:
-                return self.price_per_mbtu_with_efficiency(
-                    self.price_to_clean_dict(
-                        self.monthly_electricity_price_per_kwh(
-                            state, start_date, end_date
-                        ),
-                        energy_type,
-                        state,
-                    )
-                )
-            case self.EnergyType.HEATING_OIL:
-                return self.price_per_mbtu_with_efficiency(
-                    self.price_to_clean_dict(
-                        self.monthly_heating_season_heating_oil_price_per_gal(
-                            state, start_date, end_date
-                        ),
-                        energy_type,
-                        state,
-                    )
-                )
-            case _:
-                raise NotImplementedError(f"Unsupported energy type: {energy_type}")
-
-    def monthly_price_per_mbtu_by_energy_type_by_state(
-        self, state: str, start_date: datetime.date, end_date: datetime.date
-    ) -> list[Any]:
-        """Get all available energy prices per MBTU, taking efficiency into account, for a state.
+        periods = self.ensure_prices_stored(energy_type, state, start_date, end_date)
+        return self.price_per_mbtu_with_efficiency(
+            self.stored_price_dict(energy_type, state, periods)
+        )
 
-        Note:
-            Please keep times to within a year. For the non oil and propane, you have to go a month past.
+    def ensure_prices_stored(
+        self,
+        energy_type: EnergyType,
+        state: str,
+        start_date: datetime.date,
+        end_date: datetime.date,
+    ) -> list[str]:
+        """Fetch the months of an energy type's prices that are missing from the price store.
 
         Args:
-            state (str): 2 character postal code
-            start_date (datetime.date): start date
-            end_date (datetime.date): end date
+            energy_type (EnergyType): the energy type
+            state (str): the 2 character postal code of a state
+            start_date (datetime.date): the start date, inclusive
+            end_date (datetime.date): the end date, non inclusive
+
+        Raises:
+            NotImplementedError: Invalid energy type
+            requests.RequestException: the missing months could not be fetched and none are stored
 
         Returns:
-            list[Any]: list of price dicts for available energy types for a state
+            list[str]: the months the EIA publishes prices for in the range, in `YYYY-MM` form
         """
-        if len(state) > 2:
-            state = sts.lookup(state).abbr  # type: ignore
+        if energy_type not in self.ENERGY_TYPE_UNITS_AND_SOURCES:
+            raise NotImplementedError(f"Unsupported energy type: {energy_type}")
 
-        dicts_to_return = []
-        if state in self.HEATING_OIL_STATES_ABBR:
-            dicts_to_return.append(
-                self.monthly_price_per_mbtu_by_energy_type(
-                    self.EnergyType.HEATING_OIL, state, start_date, end_date
-                )
-            )
-        if state in self.PROPANE_STATES_ABBR:
-            dicts_to_return.append(
-                self.monthly_price_per_mbtu_by_energy_type(
-                    self.EnergyType.PROPANE, state, start_date, end_date
-                )
-            )
-        dicts_to_return.append(
-            self.monthly_price_per_mbtu_by_energy_type(
-                self.EnergyType.NATURAL_GAS, state, start_date, end_date
-            )
-        )
-        dicts_to_return.append(
-            self.monthly_price_per_mbtu_by_energy_type(
-                self.EnergyType.ELECTRICITY, state, start_date, end_date
-            )
+        periods = self.expected_periods(energy_type, start_date, end_date)
+        missing_periods = self.price_store.missing_periods(
+            energy_type.name, state, periods
         )
-        log(f"{dicts_to_return = }", "debug")
-        return dicts_to_return
-
-
-class CensusDataRetriever:
-    """Interact with the Census data API.
-
-    Note:
-        ACS5 paths can be found here: https://api.census.gov/data/2019/acs/acs5.html"""
-
-    def __init__(self) -> None:
-        self.base_url = "https://data.census.gov/"
-        # https://api.census.gov/data/2021/acs/acs5/profile/variables.html
-        self.api_key = os.getenv("CENSUS_API_KEY")
+        if len(missing_periods) == 0:
+            return periods
         if self.api_key is None:
             log(
-                "No Census API key found in a .env file in project directory. please request a key at https://api.census.gov/data/key_signup.html",
-                "critical",
+                f"No EIA API key, {len(missing_periods)} months of {energy_type.name} prices for {state} are not stored and will be missing.",
+                "info",
             )
-            exit()
-        self.MAX_COL_NAME_LENGTH = 80
-
-    def _get(self, url: str) -> requests.Response | None:
-        r = requests.get(url, timeout=65)
-        if r.status_code == 400:
-            log(f"Unknown variable {r.text.split("variable ")[-1]}", "info")
-            return None
-        return r
+            return periods
 
-    def get_and_cache_data(
-        self, file_name: str, url_to_lookup_on_miss: str
-    ) -> dict[str, str] | bool:
-        """Cache files.
+        try:
+            self.refresh_stored_prices(energy_type, state, missing_periods)
+        except requests.RequestException as e:
+            log(f"Could not fetch {energy_type.name} prices for {state}: {e}", "error")
+            if len(self.price_store.get_prices(energy_type.name, state, periods)) == 0:
+                raise
+        return periods
+
+    def stored_price_dict(
+        self, energy_type: EnergyType, state: str, periods: list[str]
+    ) -> dict[str, str | EnergyType | float | None]:
+        """Get an energy type's stored prices in the same form as `EIADataRetriever.price_to_clean_dict`.
 
         Args:
-            file_name (str): file name to save/lookup
-            url_to_lookup_on_miss (str): the Census url to lookup
+            energy_type (EnergyType): the energy type
+            state (str): the 2 character postal code of a state
+            periods (list[str]): the months in `YYYY-MM` form
 
         Returns:
-            bool | dict[str, str] | None | Any: the dict of `tablename: label` or
+            dict[str, str | EnergyType | float | None]: `year-month: price` for the stored months, plus "type" and "state"
         """
-        CENSUS_DATA_CACHE_PATH.mkdir(parents=True, exist_ok=True)
-
-        my_json = None
-
-        try:
-            with open(CENSUS_DATA_CACHE_PATH / file_name, mode="r") as f:
-                log(f"Reading {file_name}", "debug")
-                try:
-                    my_json = json.load(f)
-                except json.JSONDecodeError:
-                    log("Could not decode cached census file", "error")
-                    return False
-        except FileNotFoundError:
-            req = self._get(url_to_lookup_on_miss)
-            log(f"Getting {url_to_lookup_on_miss}...", "info")
-            if req is None:
-                log(f"Could not get census file {file_name}.", "error")
-                return False
-            req.raise_for_status()
-            my_json = req.json()
-            with open(CENSUS_DATA_CACHE_PATH / file_name, "w") as f:
-                json.dump(my_json, f)
-
-        return my_json
-
-    def get_race_makeup_by_zcta(self, zcta: str) -> str | None:
-        """Get race make up by zcta from. DO NOT USE
+        price_dict: dict[str, Any] = {
+            period: price
+            for period, price in self.price_store.get_prices(
+                energy_type.name, state, periods
+            ).items()
+            if period in periods
+        }
+        price_dict["type"] = energy_type.value
+        price_dict["state"] = state
+        return price_dict
 
-        Note:
-            use `get_table_group_for_zcta_by_state_by_year`
+    def expected_periods(
+        self,
+        energy_type: EnergyType,
+        start_date: datetime.date,
+        end_date: datetime.date,
+    ) -> list[str]:
+        """Get the months that the EIA publishes prices for an energy type in.
 
         Args:
-            zcta (str): zcta
+            energy_type (EnergyType): the energy type
+            start_date (datetime.date): the start date, inclusive
+            end_date (datetime.date): the end date, non inclusive
 
         Returns:
-            str | None: text or none
+            list[str]: the months in `YYYY-MM` form
         """
-        # get white, black, american indian/native alaskan, asian, NH/PI, other. note that these are estimates, margin of error can be had with "M"
-        req = self._get(
-            f"https://api.census.gov/data/2021/acs/acs5/profile?get=DP05_0064E,DP05_0065E,DP05_0066E,DP05_0067E,DP05_0068E,DP05_0069E&for=zip%20code%20tabulation%20area:{zcta}&key={self.api_key}"
-        )
-        if req is None:
-            return None
-        return req.text
+        periods = month_periods(start_date, end_date)
+        if energy_type in (self.EnergyType.PROPANE, self.EnergyType.HEATING_OIL):
+            periods = [
+                period
+                for period in periods
+                if int(period[5:]) in self.HEATING_SEASON_MONTHS
+            ]
+        return periods
 
-    def _get_acs5_profile_table_to_group_name(
-        self, table: str, year: str
-    ) -> dict[str, Any] | None:
-        """Get a JSON representation of a table's attributes.
+    def fetch_raw_prices(
+        self,
+        energy_type: EnergyType,
+        state: str,
+        start_date: datetime.date,
+        end_date: datetime.date,
+    ) -> dict[str, float | None]:
+        """Get an energy type's prices from the EIA, in the unit they are published in.
+
+        Args:
+            energy_type (EnergyType): the energy type
+            state (str): the 2 character postal code of a state
+            start_date (datetime.date): the start date, inclusive
+            end_date (datetime.date): the end date, non inclusive
+
+        Raises:
+            NotImplementedError: Invalid energy type
+            requests.RequestException: the request failed, or the EIA answered with an error
+
+        Returns:
+            dict[str, float | None]: `year-month: price`
+        """
+        match energy_type:
+            case self.EnergyType.PROPANE:
+                price_struct = self.monthly_heating_season_propane_price_per_gal(
+                    state, start_date, end_date
+                )
+            case self.EnergyType.NATURAL_GAS:
+                price_struct = self.monthly_ng_price_per_mcf(
+                    state, start_date, end_date
+                )
+            case self.EnergyType.ELECTRICITY:
+                price_struct = self.monthly_electricity_price_per_kwh(
+                    state, start_date, end_date
+                )
+            case self.EnergyType.HEATING_OIL:
+                price_struct = self.monthly_heating_season_heating_oil_price_per_gal(
+                    state, start_date, end_date
+                )
+            case _:
+                raise NotImplementedError(f"Unsupported energy type: {energy_type}")
+        price_dict = self.price_to_clean_dict(price_struct, energy_type, state)
+        del price_dict["type"], price_dict["state"]
+        return price_dict  # type: ignore
+
+    def refresh_stored_prices(
+        self, energy_type: EnergyType, state: str, periods: list[str]
+    ) -> None:
+        """Fetch months of an energy type's prices and store them.
+
+        Note:
+            One request is made for the range spanning `periods`. Months in `periods` that the EIA has no data for are stored as null, so that they are not requested again until they are stale or `backend.pricestore.NULL_PRICE_MAX_AGE` has passed. See `EnergyPriceStore.missing_periods`.
+
+        Args:
+            energy_type (EnergyType): the energy type
+            state (str): the 2 character postal code of a state
+            periods (list[str]): the months to fetch in `YYYY-MM` form
+        """
+        first_year, first_month = map(int, min(periods).split("-"))
+        last_year, last_month = map(int, max(periods).split("-"))
+        start_date = datetime.date(first_year, first_month, 1)
+        end_date = datetime.date(last_year + last_month // 12, last_month % 12 + 1, 1)
+        raw_price_dict = self.fetch_raw_prices(energy_type, state, start_date, end_date)
+        unit, source = self.ENERGY_TYPE_UNITS_AND_SOURCES[energy_type]
+        self.price_store.put_prices(
+            energy_type.name,
+            state,
+            {period: raw_price_dict.get(period) for period in periods},
+            unit,
+            f"{self.eia_base_url}/{source}",
+        )
+
+    def bulk_series_url(
+        self,
+        energy_type: EnergyType,
+        states: list[str],
+        start_date: datetime.date,
+        end_date: datetime.date,
+        offset: int = 0,
+    ) -> str:
+        """Build the URL for one page of an energy type's series for many states.
+
+        Args:
+            energy_type (EnergyType): the energy type
+            states (list[str]): the 2 character postal codes of the states
+            start_date (datetime.date): the start date, inclusive
+            end_date (datetime.date): the end date, non inclusive
+            offset (int, optional): the first row of the page. Defaults to 0.
+
+        Returns:
+            str: the URL
+        """
+        (
+            route,
+            frequency,
+            data_column,
+            state_facet,
+            state_format,
+            facets,
+        ) = self.ENERGY_TYPE_SERIES[energy_type]
+        facets = facets | {
+            state_facet: [state_format.format(state) for state in states]
+        }
+        facet_params = "".join(
+            f"&facets[{facet}][]={value}"
+            for facet, values in facets.items()
+            for value in values
+        )
+        if frequency == "monthly":
+            start = f"{start_date.year}-{start_date.month:02}"
+            end = f"{end_date.year}-{end_date.month:02}"
+        else:
+            start, end = start_date, end_date
+        return f"{self.eia_base_url}/{route}/data/?frequency={frequency}&data[0]={data_column}{facet_params}&start={start}&end={end}&sort[0][column]=period&sort[0][direction]=asc&sort[1][column]={state_facet}&sort[1][direction]=asc&offset={offset}&length={EIA_MAX_ROWS_PER_REQUEST}&api_key={self.api_key}"
+
+    def _eia_response(self, url: str) -> dict[str, Any]:
+        """Get the `response` object of an EIA API request.
+
+        Args:
+            url (str): the url
+
+        Raises:
+            requests.RequestException: the request failed, or the body is not a data response, such as the error the EIA answers a bad key or too many requests with
+
+        Returns:
+            dict[str, Any]: the response, with at least `total` and `data`
+        """
+        eia_request = req_get_wrapper(url)
+        try:
+            response = eia_request.json()["response"]
+            response["total"], response["data"]
+        except (ValueError, KeyError, TypeError) as e:
+            # the url is not logged, since it holds the API key
+            raise requests.RequestException(
+                f"Unexpected EIA response: {eia_request.text[:200]}"
+            ) from e
+        return response
+
+    def bulk_raw_prices(
+        self,
+        energy_type: EnergyType,
+        states: list[str],
+        start_date: datetime.date,
+        end_date: datetime.date,
+    ) -> dict[str, dict[str, float | None]]:
+        """Get an energy type's monthly prices for many states, in the unit they are published in.
+
+        Note:
+            All states are requested together. The first page tells how many rows there are, and the remaining pages of `EIA_MAX_ROWS_PER_REQUEST` rows are fetched concurrently. Weekly prices are averaged by month.
+
+        Args:
+            energy_type (EnergyType): the energy type
+            states (list[str]): the 2 character postal codes of the states
+            start_date (datetime.date): the start date, inclusive
+            end_date (datetime.date): the end date, non inclusive
+
+        Raises:
+            requests.RequestException: a page could not be fetched, or the EIA answered with an error. See `EIADataRetriever._eia_response`
+
+        Returns:
+            dict[str, dict[str, float | None]]: `state: {year-month: price}` for the states that have data
+        """
+        first_page = self._eia_response(
+            self.bulk_series_url(energy_type, states, start_date, end_date)
+        )
+        offsets = range(
+            EIA_MAX_ROWS_PER_REQUEST, int(first_page["total"]), EIA_MAX_ROWS_PER_REQUEST
+        )
+        with ThreadPoolExecutor(max_workers=MAX_EIA_PAGE_WORKERS) as executor:
+            pages = list(
+                executor.map(
+                    lambda offset: self._eia_response(
+                        self.bulk_series_url(
+                            energy_type, states, start_date, end_date, offset
+                        )
+                    )["data"],
+                    offsets,
+                )
+            )
+        rows = first_page["data"] + [row for page in pages for row in page]
+        if len(rows) == 0:
+            return {}
+
+        (
+            _,
+            frequency,
+            data_column,
+            state_facet,
+            state_format,
+            _,
+        ) = self.ENERGY_TYPE_SERIES[energy_type]
+        lf = pl.LazyFrame(rows).select(
+            pl.col(state_facet).str.slice(state_format.index("{}")).alias("state"),
+            pl.col("period"),
+            pl.col(data_column).cast(pl.Float64, strict=False).alias("value"),
+        )
+        if frequency == "weekly":
+            lf = self.weekly_to_monthly_lf(
+                lf.with_columns(pl.col("period").str.strptime(pl.Date))
+            )
+        else:
+            lf = lf.rename({"value": "price"})
+        df = lf.select(
+            "state",
+            pl.col("period").cast(pl.Utf8).str.slice(0, 7),
+            "price",
+        ).collect()
+        prices_by_state: dict[str, dict[str, float | None]] = {}
+        for state, period, price in df.rows():
+            prices_by_state.setdefault(state, {})[period] = price
+        return prices_by_state
+
+    def bulk_refresh_stored_prices(
+        self, energy_type: EnergyType, states: list[str], periods: list[str]
+    ) -> None:
+        """Fetch months of an energy type's prices for many states and store them.
+
+        Note:
+            Months in `periods` that the EIA has no data for are stored as null. See `EIADataRetriever.refresh_stored_prices`.
+
+        Args:
+            energy_type (EnergyType): the energy type
+            states (list[str]): the 2 character postal codes of the states
+            periods (list[str]): the months to fetch in `YYYY-MM` form
+        """
+        first_year, first_month = map(int, min(periods).split("-"))
+        last_year, last_month = map(int, max(periods).split("-"))
+        start_date = datetime.date(first_year, first_month, 1)
+        end_date = datetime.date(last_year + last_month // 12, last_month % 12 + 1, 1)
+        prices_by_state = self.bulk_raw_prices(
+            energy_type, states, start_date, end_date
+        )
+
+        unit, source = self.ENERGY_TYPE_UNITS_AND_SOURCES[energy_type]
+        for state in states:
+            state_prices = prices_by_state.get(state, {})
+            self.price_store.put_prices(
+                energy_type.name,
+                state,
+                {period: state_prices.get(period) for period in periods},
+                unit,
+                f"{self.eia_base_url}/{source}",
+            )
+
+    def monthly_price_per_mbtu_by_energy_type_for_states(
+        self,
+        energy_type: EnergyType,
+        start_date: datetime.date,
+        end_date: datetime.date,
+        states: list[str] | None = None,
+    ) -> list[dict[str, str | EnergyType | float]]:
+        """Get the cost per MBTU for the given energy type for many states, over the given period of time.
+
+        Note:
+            The months missing from the price store are fetched for all states at once with `EIADataRetriever.bulk_refresh_stored_prices`, instead of one request per state.
+
+        Args:
+            energy_type (EnergyType): the energy type
+            start_date (datetime.date): the start date, inclusive
+            end_date (datetime.date): the end date, non inclusive
+            states (list[str] | None, optional): the 2 character postal codes of the states. Defaults to None, meaning every state that the energy type is tracked in.
+
+        Returns:
+            list[dict[str, str | EnergyType | float]]: one price dict per state, in the form of `EIADataRetriever.monthly_price_per_mbtu_by_energy_type`
+        """
+        if states is None:
+            match energy_type:
+                case self.EnergyType.HEATING_OIL:
+                    states = sorted(self.HEATING_OIL_STATES_ABBR)
+                case self.EnergyType.PROPANE:
+                    states = sorted(self.PROPANE_STATES_ABBR)
+                case _:
+                    states = [state.abbr for state in sts.STATES]
+
+        periods = self.expected_periods(energy_type, start_date, end_date)
+        missing_periods = set()
+        states_to_refresh = []
+        for state in states:
+            state_missing_periods = self.price_store.missing_periods(
+                energy_type.name, state, periods
+            )
+            if len(state_missing_periods) > 0:
+                missing_periods.update(state_missing_periods)
+                states_to_refresh.append(state)
+
+        if len(states_to_refresh) > 0:
+            if self.api_key is None:
+                log(
+                    f"No EIA API key, {energy_type.name} prices for {len(states_to_refresh)} states are not fully stored and will be missing.",
+                    "info",
+                )
+            else:
+                try:
+                    self.bulk_refresh_stored_prices(
+                        energy_type, states_to_refresh, sorted(missing_periods)
+                    )
+                except requests.RequestException as e:
+                    log(f"Could not fetch {energy_type.name} prices: {e}", "error")
+
+        return [
+            self.price_per_mbtu_with_efficiency(
+                self.stored_price_dict(energy_type, state, periods)
+            )
+            for state in states
+        ]
+
+    def bulk_series_to_monthly_prices(
+        self, energy_type: EnergyType, data: list[list[Any]]
+    ) -> dict[str, float | None]:
+        """Turn the data of a bulk download series into monthly prices.
+
+        Args:
+            energy_type (EnergyType): the energy type of the series
+            data (list[list[Any]]): the series' `[period, value]` pairs, with periods in `YYYYMM` or `YYYYMMDD` form
+
+        Returns:
+            dict[str, float | None]: `year-month: price`. Weekly prices are averaged by month
+        """
+        prices_by_period: dict[str, list[float]] = {}
+        for period, value in data:
+            year_month = f"{period[:4]}-{period[4:6]}"
+            if (
+                energy_type in (self.EnergyType.PROPANE, self.EnergyType.HEATING_OIL)
+                and int(period[4:6]) not in self.HEATING_SEASON_MONTHS
+            ):
+                continue
+            prices = prices_by_period.setdefault(year_month, [])
+            # missing values are strings like "NA" or "--"
+            if isinstance(value, (int, float)):
+                prices.append(value)
+
+        is_weekly = self.ENERGY_TYPE_SERIES[energy_type][1] == "weekly"
+        monthly_prices: dict[str, float | None] = {}
+        for year_month, prices in prices_by_period.items():
+            if len(prices) == 0:
+                monthly_prices[year_month] = None
+            elif is_weekly:
+                monthly_prices[year_month] = round(sum(prices) / len(prices), 3)
+            else:
+                monthly_prices[year_month] = prices[0]
+        return monthly_prices
+
+    def ingest_bulk_archive(
+        self, archive_path: Path, states: list[str] | None = None
+    ) -> dict[str, int]:
+        """Load the series this class uses from a local EIA bulk download into the price store.
+
+        Note:
+            Bulk downloads are zip files of JSON lines, one series per line. Lines are decompressed and read one at a time, and only lines whose series ID matches `EIADataRetriever.BULK_SERIES_ID_PATTERNS` are parsed, so memory use is bounded by the largest series. The ELEC, NG and PET files each hold some of the series.
+
+        Args:
+            archive_path (Path): the zip file
+            states (list[str] | None, optional): the 2 character postal codes of the states to load. Defaults to None, meaning all states.
+
+        Returns:
+            dict[str, int]: `fuel: number of months stored`
+        """
+        series_id_regex = re.compile(r'"series_id"\s*:\s*"([^"]+)"')
+        months_stored = {energy_type.name: 0 for energy_type in self.EnergyType}
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.namelist():
+                with archive.open(member) as member_file:
+                    for line in io.TextIOWrapper(member_file, encoding="utf-8"):
+                        series_id_match = series_id_regex.search(line)
+                        if series_id_match is None:
+                            continue
+                        for (
+                            energy_type,
+                            pattern,
+                        ) in self.BULK_SERIES_ID_PATTERNS.items():
+                            series_match = pattern.fullmatch(series_id_match.group(1))
+                            if series_match is not None:
+                                break
+                        else:
+                            continue
+                        state = series_match.group(1)
+                        if states is not None and state not in states:
+                            continue
+
+                        series = json.loads(line)
+                        monthly_prices = self.bulk_series_to_monthly_prices(
+                            energy_type, series.get("data", [])
+                        )
+                        unit, _ = self.ENERGY_TYPE_UNITS_AND_SOURCES[energy_type]
+                        self.price_store.put_prices(
+                            energy_type.name,
+                            state,
+                            monthly_prices,
+                            unit,
+                            f"bulk download {archive_path.name}: {series["series_id"]}",
+                        )
+                        months_stored[energy_type.name] += len(monthly_prices)
+        log(f"Ingested {archive_path}: {months_stored}", "info")
+        return months_stored
+
+    def energy_types_for_state(self, state: str) -> list[EnergyType]:
+        """Get the energy types that the EIA tracks prices of in a state.
+
+        Args:
+            state (str): 2 character postal code
+
+        Returns:
+            list[EnergyType]: the energy types
+        """
+        energy_types = []
+        if state in self.HEATING_OIL_STATES_ABBR:
+            energy_types.append(self.EnergyType.HEATING_OIL)
+        if state in self.PROPANE_STATES_ABBR:
+            energy_types.append(self.EnergyType.PROPANE)
+        energy_types.append(self.EnergyType.NATURAL_GAS)
+        energy_types.append(self.EnergyType.ELECTRICITY)
+        return energy_types
+
+    def ensure_prices_stored_concurrently(
+        self,
+        energy_types: list[EnergyType],
+        state: str,
+        start_date: datetime.date,
+        end_date: datetime.date,
+    ) -> dict[EnergyType, str]:
+        """Run `EIADataRetriever.ensure_prices_stored` for several energy types at once.
+
+        Args:
+            energy_types (list[EnergyType]): the energy types
+            state (str): 2 character postal code
+            start_date (datetime.date): the start date, inclusive
+            end_date (datetime.date): the end date, non inclusive
+
+        Returns:
+            dict[EnergyType, str]: `energy type: error` for the energy types that raised or did not finish within `EIA_SERIES_TIMEOUT_SECONDS`
+        """
+        executor = ThreadPoolExecutor(max_workers=len(energy_types))
+        futures = [
+            executor.submit(
+                self.ensure_prices_stored, energy_type, state, start_date, end_date
+            )
+            for energy_type in energy_types
+        ]
+        wait(futures, timeout=EIA_SERIES_TIMEOUT_SECONDS)
+        # don't block on series that timed out
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        errors = {}
+        for energy_type, future in zip(energy_types, futures):
+            if not future.done():
+                errors[
+                    energy_type
+                ] = f"timed out after {EIA_SERIES_TIMEOUT_SECONDS} seconds"
+            elif future.exception() is not None:
+                errors[energy_type] = repr(future.exception())
+            else:
+                continue
+            log(
+                f"Could not get {energy_type.name} prices for {state}: {errors[energy_type]}",
+                "error",
+            )
+        return errors
+
+    def monthly_price_per_mbtu_by_energy_type_by_state(
+        self, state: str, start_date: datetime.date, end_date: datetime.date
+    ) -> list[Any]:
+        """Get all available energy prices per MBTU, taking efficiency into account, for a state.
+
+        Note:
+            Please keep times to within a year. For the non oil and propane, you have to go a month past.
+
+            The energy types are fetched concurrently. An energy type that raises or does not finish within `EIA_SERIES_TIMEOUT_SECONDS` is returned as `{"type", "state", "error"}` instead of its prices.
+
+        Args:
+            state (str): 2 character postal code
+            start_date (datetime.date): start date
+            end_date (datetime.date): end date
+
+        Returns:
+            list[Any]: list of price dicts for available energy types for a state
+        """
+        if len(state) > 2:
+            state = sts.lookup(state).abbr  # type: ignore
+
+        energy_types = self.energy_types_for_state(state)
+        errors = self.ensure_prices_stored_concurrently(
+            energy_types, state, start_date, end_date
+        )
+        dicts_to_return = []
+        for energy_type in energy_types:
+            if energy_type in errors:
+                dicts_to_return.append(
+                    {
+                        "type": energy_type.value,
+                        "state": state,
+                        "error": errors[energy_type],
+                    }
+                )
+                continue
+            dicts_to_return.append(
+                self.price_per_mbtu_with_efficiency(
+                    self.stored_price_dict(
+                        energy_type,
+                        state,
+                        self.expected_periods(energy_type, start_date, end_date),
+                    )
+                )
+            )
+        log(f"{dicts_to_return = }", "debug")
+        return dicts_to_return
+
+    def price_df(
+        self,
+        energy_types: list[EnergyType],
+        states: list[str],
+        start_date: datetime.date,
+        end_date: datetime.date,
+        gap_policy: GapPolicy | None = None,
+    ) -> pl.DataFrame:
+        """Get stored prices as a long format DataFrame.
+
+        Note:
+            Nothing is fetched. Use `EIADataRetriever.ensure_prices_stored` or `EIADataRetriever.bulk_refresh_stored_prices` first.
+
+        Args:
+            energy_types (list[EnergyType]): the energy types
+            states (list[str]): the 2 character postal codes of the states
+            start_date (datetime.date): the start date, inclusive
+            end_date (datetime.date): the end date, non inclusive
+            gap_policy (GapPolicy | None, optional): how to fill months without a price. See `EIADataRetriever.fill_price_gaps`. Defaults to None, meaning only stored months are returned.
+
+        Returns:
+            pl.DataFrame: one row per state, fuel and month, with the columns state, fuel (the `EnergyType` name), period (the first day of the month), raw_price and unit, plus filled if `gap_policy` is given
+        """
+        periods = month_periods(start_date, end_date)
+        if len(periods) == 0:
+            return self.price_store.get_price_df([], [], "", "")
+        fill_start_date = self.gap_fill_start_date(start_date, gap_policy)
+        price_df = self.price_store.get_price_df(
+            [energy_type.name for energy_type in energy_types],
+            states,
+            f"{fill_start_date.year}-{fill_start_date.month:02}",
+            periods[-1],
+        )
+        if gap_policy is None:
+            return price_df
+        return self.fill_price_gaps(
+            price_df.lazy(), start_date, end_date, gap_policy
+        ).collect()
+
+    def with_price_per_mbtu(self, price_df: pl.DataFrame) -> pl.DataFrame:
+        """Add the price per MBTU, taking efficiency into account, to a long format price DataFrame.
+
+        See also:
+            `EIADataRetriever.ENERGY_TYPE_CONVERSIONS` for the appliance each fuel is priced for, and `EIADataRetriever.price_df`
+
+        Args:
+            price_df (pl.DataFrame): DataFrame with fuel and raw_price columns
+
+        Returns:
+            pl.DataFrame: `price_df` with a price_per_mbtu column
+        """
+        dollars_per_mbtu_df = pl.DataFrame(
+            {
+                "fuel": [
+                    energy_type.name for energy_type in self.ENERGY_TYPE_CONVERSIONS
+                ],
+                "_dollars_per_mbtu": [
+                    dollars_per_unit / (btu_per_unit * heater.value) * 1_000
+                    for btu_per_unit, dollars_per_unit, heater in self.ENERGY_TYPE_CONVERSIONS.values()
+                ],
+            }
+        )
+        return (
+            price_df.join(dollars_per_mbtu_df, on="fuel", how="left")
+            .with_columns(
+                (pl.col("raw_price") * pl.col("_dollars_per_mbtu")).alias(
+                    "price_per_mbtu"
+                )
+            )
+            .drop("_dollars_per_mbtu")
+        )
+
+    def heater_efficiency_df(self) -> pl.DataFrame:
+        """Get the fuel by heater efficiency matrix.
+
+        Note:
+            Heaters without an EIA priced fuel, such as wood and pellet stoves, are left out. See `EIADataRetriever.HEATER_FUELS`.
+
+        Returns:
+            pl.DataFrame: one row per heater, with the columns heater, fuel (the `EnergyType` name), and dollars_per_mbtu_per_unit, the factor that turns a raw price of the fuel into the heater's price per MBTU
+        """
+        heaters = []
+        fuels = []
+        factors = []
+        for heater_name, heater in self.HeaterEfficiencies.__members__.items():
+            heater_fuel = self.HEATER_FUELS[heater_name]
+            if heater_fuel is None:
+                continue
+            energy_type, btu_per_unit = heater_fuel
+            dollars_per_unit = self.ENERGY_TYPE_CONVERSIONS[energy_type][1]
+            heaters.append(heater_name)
+            fuels.append(energy_type.name)
+            factors.append(dollars_per_unit / (btu_per_unit * heater.value) * 1_000)
+        return pl.DataFrame(
+            {
+                "heater": heaters,
+                "fuel": fuels,
+                "dollars_per_mbtu_per_unit": factors,
+            }
+        )
+
+    def heater_price_per_mbtu_df(self, price_df: pl.DataFrame) -> pl.DataFrame:
+        """Get the price per MBTU of every heater, for every state and month in a long format price DataFrame.
+
+        Note:
+            Each price is broadcast against every heater that burns its fuel with a single join against `EIADataRetriever.heater_efficiency_df`.
+
+        Args:
+            price_df (pl.DataFrame): DataFrame with state, fuel, period and raw_price columns. See `EIADataRetriever.price_df`
+
+        Returns:
+            pl.DataFrame: one row per state, month and heater, with the columns state, period, heater, fuel and price_per_mbtu
+        """
+        return (
+            price_df.lazy()
+            .join(self.heater_efficiency_df().lazy(), on="fuel", how="inner")
+            .select(
+                "state",
+                "period",
+                "heater",
+                "fuel",
+                (pl.col("raw_price") * pl.col("dollars_per_mbtu_per_unit")).alias(
+                    "price_per_mbtu"
+                ),
+            )
+            .collect()
+        )
+
+    def pivot_price_df(
+        self,
+        price_df: pl.DataFrame,
+        values: str = "price_per_mbtu",
+        columns: str = "fuel",
+    ) -> pl.DataFrame:
+        """Pivot a long format price DataFrame into one row per period and one column per fuel.
+
+        Args:
+            price_df (pl.DataFrame): DataFrame with period, `columns` and `values` columns, for a single state
+            values (str, optional): the column to pivot. Defaults to "price_per_mbtu".
+            columns (str, optional): the column whose values become the new columns, such as "heater". Defaults to "fuel".
+
+        Returns:
+            pl.DataFrame: the pivoted DataFrame, sorted by period
+        """
+        return price_df.pivot(
+            values=values, index="period", columns=columns, aggregate_function=None
+        ).sort("period")
+
+    def build_price_cube(
+        self,
+        start_date: datetime.date,
+        end_date: datetime.date,
+        cube_path: Path | None = None,
+    ) -> pl.DataFrame:
+        """Compute the price per MBTU of every heater, for every state and month in a range, and save it as an Arrow IPC file.
+
+        Note:
+            Missing months are first fetched into the price store for all states at once. The range then replaces its months in the existing cube, so that building one year at a time keeps the other years. The file is written to a temporary path and swapped in, so readers never see a partial cube.
+
+        Args:
+            start_date (datetime.date): the start date, inclusive
+            end_date (datetime.date): the end date, non inclusive
+            cube_path (Path | None, optional): the cube file. Defaults to the cube of `EIADataRetriever.eia_base_url`.
+
+        Returns:
+            pl.DataFrame: the cube, with the columns state, period, heater, fuel and price_per_mbtu, sorted by state and period
+        """
+        cube_path = cube_path or self.price_cube_path
+        for energy_type in self.EnergyType:
+            self.monthly_price_per_mbtu_by_energy_type_for_states(
+                energy_type, start_date, end_date
+            )
+        range_cube_df = self.heater_price_per_mbtu_df(
+            self.price_df(
+                list(self.EnergyType),
+                [state.abbr for state in sts.STATES],
+                start_date,
+                end_date,
+            )
+        )
+
+        with _price_cube_lock:
+            cube_dfs = [range_cube_df]
+            if cube_path.exists():
+                cube_dfs.append(
+                    pl.scan_ipc(cube_path)
+                    .filter(
+                        (pl.col("period") < start_date) | (pl.col("period") >= end_date)
+                    )
+                    .collect()
+                )
+            cube_df = pl.concat(cube_dfs).sort("state", "period", "heater")
+            cube_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_cube_path = cube_path.with_suffix(".arrow.tmp")
+            cube_df.write_ipc(temp_cube_path)
+            os.replace(temp_cube_path, cube_path)
+        log(f"Built the energy price cube with {cube_df.height} rows.", "info")
+        return cube_df
+
+    def build_price_cube_in_background(
+        self,
+        start_date: datetime.date,
+        end_date: datetime.date,
+        cube_path: Path | None = None,
+    ) -> threading.Thread | None:
+        """Run `EIADataRetriever.build_price_cube` in a daemon thread.
+
+        Note:
+            Nothing is started while a background build of the same range and cube is running.
+
+        Args:
+            start_date (datetime.date): the start date, inclusive
+            end_date (datetime.date): the end date, non inclusive
+            cube_path (Path | None, optional): the cube file. Defaults to the cube of `EIADataRetriever.eia_base_url`.
+
+        Returns:
+            threading.Thread | None: the thread. None if the range is already being built
+        """
+        cube_path = cube_path or self.price_cube_path
+        build_key = (start_date, end_date, cube_path)
+        with _price_cube_builds_lock:
+            if build_key in _price_cube_builds_in_flight:
+                log(
+                    f"The energy price cube is already being built from {start_date} to {end_date}.",
+                    "debug",
+                )
+                return None
+            _price_cube_builds_in_flight.add(build_key)
+
+        def build() -> None:
+            try:
+                self.build_price_cube(start_date, end_date, cube_path)
+            finally:
+                with _price_cube_builds_lock:
+                    _price_cube_builds_in_flight.discard(build_key)
+
+        thread = threading.Thread(target=build, daemon=True)
+        thread.start()
+        return thread
+
+    def price_cube_slice(
+        self, state: str, year: int, cube_path: Path | None = None
+    ) -> pl.DataFrame:
+        """Get a state's year from the price cube.
+
+        Note:
+            The cube file is memory mapped, so only the slice is read.
+
+        Args:
+            state (str): 2 character postal code
+            year (int): the year
+            cube_path (Path | None, optional): the cube file. Defaults to the cube of `EIADataRetriever.eia_base_url`.
+
+        Returns:
+            pl.DataFrame: the slice, in the form of `EIADataRetriever.build_price_cube`. Empty if the cube does not have it
+        """
+        cube_path = cube_path or self.price_cube_path
+        if len(state) > 2:
+            state = sts.lookup(state).abbr  # type: ignore
+        if not cube_path.exists():
+            return pl.DataFrame(
+                schema={
+                    "state": pl.Utf8,
+                    "period": pl.Date,
+                    "heater": pl.Utf8,
+                    "fuel": pl.Utf8,
+                    "price_per_mbtu": pl.Float64,
+                }
+            )
+        return (
+            pl.scan_ipc(cube_path, memory_map=True)
+            .filter((pl.col("state") == state) & (pl.col("period").dt.year() == year))
+            .collect()
+        )
+
+    def is_price_cube_slice_stale(
+        self, cube_slice_df: pl.DataFrame, year: int, today: datetime.date | None = None
+    ) -> bool:
+        """Check whether a state's year from the price cube may lack prices that the EIA has published since the cube was built.
+
+        Note:
+            A year is stale if it reaches into the months that the EIA can still revise, see `backend.pricestore.REVISABLE_MONTHS`, or if the slice is missing any of its months. Electricity is published every month, so a fully built past year has all 12.
+
+        Args:
+            cube_slice_df (pl.DataFrame): the slice. See `EIADataRetriever.price_cube_slice`
+            year (int): the year of the slice
+            today (datetime.date | None, optional): the current date. Defaults to None, meaning today.
+
+        Returns:
+            bool: whether the year should be fetched through the price store and built again
+        """
+        if f"{year}-12" >= first_revisable_period(today):
+            return True
+        cube_periods = set(
+            cube_slice_df.get_column("period").dt.strftime("%Y-%m").to_list()
+        )
+        return not cube_periods.issuperset(
+            month_periods(datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1))
+        )
+
+    def monthly_price_per_mbtu_df_by_state(
+        self,
+        state: str,
+        start_date: datetime.date,
+        end_date: datetime.date,
+        gap_policy: GapPolicy | None = None,
+    ) -> pl.DataFrame:
+        """Get all available energy prices per MBTU, taking efficiency into account, for a state as a long format DataFrame.
+
+        Note:
+            Missing months are fetched concurrently, like `EIADataRetriever.monthly_price_per_mbtu_by_energy_type_by_state`, including the earlier months that `gap_policy` fills from. Energy types that could not be fetched are left out.
+
+        Args:
+            state (str): 2 character postal code
+            start_date (datetime.date): the start date, inclusive
+            end_date (datetime.date): the end date, non inclusive
+            gap_policy (GapPolicy | None, optional): how to fill months without a price. See `EIADataRetriever.price_df`. Defaults to None.
+
+        Returns:
+            pl.DataFrame: see `EIADataRetriever.price_df` and `EIADataRetriever.with_price_per_mbtu`
+        """
+        if len(state) > 2:
+            state = sts.lookup(state).abbr  # type: ignore
+
+        energy_types = self.energy_types_for_state(state)
+        errors = self.ensure_prices_stored_concurrently(
+            energy_types,
+            state,
+            self.gap_fill_start_date(start_date, gap_policy),
+            end_date,
+        )
+        return self.with_price_per_mbtu(
+            self.price_df(
+                [
+                    energy_type
+                    for energy_type in energy_types
+                    if energy_type not in errors
+                ],
+                [state],
+                start_date,
+                end_date,
+                gap_policy,
+            )
+        )
+
+
+class CensusDataRetriever:
+    """Interact with the Census data API.
+
+    Note:
+        ACS5 paths can be found here: https://api.census.gov/data/2019/acs/acs5.html"""
+
+    class ACS5Dataset(StrEnum):
+        PROFILE = "profile"
+        SUBJECT = "subject"
+        # B and C tables, at the root of the acs5 path
+        DETAILED = "detailed"
+
+    def __init__(self) -> None:
+        self.base_url = "https://data.census.gov/"
+        # point this at `backend.censusserver.CensusStandInServer` to work offline
+        self.census_base_url = os.getenv("CENSUS_BASE_URL", CENSUS_API_BASE_URL)
+        # https://api.census.gov/data/2021/acs/acs5/profile/variables.html
+        self.api_key = os.getenv("CENSUS_API_KEY")
+        if self.api_key is None:
+            log(
+                "No Census API key found in a .env file in project directory, requests are limited to 500 a day. please request a key at https://api.census.gov/data/key_signup.html",
+                "info",
+            )
+        self.MAX_COL_NAME_LENGTH = 80
+        # responses from another server, such as a stand-in, are kept apart
+        cache_dir_path = (
+            CENSUS_DATA_CACHE_PATH
+            if self.census_base_url == CENSUS_API_BASE_URL
+            else CENSUS_DATA_CACHE_PATH.with_name(
+                f"cache-{hashlib.sha1(self.census_base_url.encode()).hexdigest()[:8]}"
+            )
+        )
+        self.cache = CensusCache(
+            cache_dir_path,
+            int(os.getenv("CENSUS_CACHE_MAX_BYTES", CENSUS_CACHE_MAX_BYTES)),
+        )
+
+    def _get(self, url: str, stream: bool = False) -> requests.Response | None:
+        wait_for_host(url)
+        r = requests.get(url, timeout=65, stream=stream)
+        if r.status_code == 400:
+            log(f"Unknown variable {r.text.split("variable ")[-1]}", "info")
+            return None
+        return r
+
+    def get_and_cache_data(
+        self, file_name: str, url_to_lookup_on_miss: str
+    ) -> dict[str, str] | bool:
+        """Cache files.
+
+        Note:
+            A cached file that is corrupt is fetched again. See `CensusCache`.
+
+        Args:
+            file_name (str): file name to save/lookup
+            url_to_lookup_on_miss (str): the Census url to lookup
+
+        Returns:
+            bool | dict[str, str] | None | Any: the dict of `tablename: label` or False if it could not be fetched
+        """
+        my_json = self.cache.get_json(file_name)
+        if my_json is not None:
+            log(f"Reading {file_name}", "debug")
+            return my_json
+
+        with _census_request_slots:
+            req = self._get(url_to_lookup_on_miss)
+            log(f"Getting {url_to_lookup_on_miss}...", "info")
+            if req is None:
+                log(f"Could not get census file {file_name}.", "error")
+                return False
+            req.raise_for_status()
+            my_json = req.json()
+        self.cache.put_json(file_name, my_json)
+        return my_json
+
+    def get_and_cache_file(
+        self, file_name: str, url_to_lookup_on_miss: str
+    ) -> TextIO | None:
+        """Cache a response without parsing it.
+
+        Note:
+            The response is streamed into the cache, compressed, and only added to it once complete, so an interrupted download is never mistaken for a cached file. At most `MAX_CENSUS_WORKERS` downloads run at once.
+
+        Args:
+            file_name (str): file name to save/lookup
+            url_to_lookup_on_miss (str): the Census url to lookup
+
+        Returns:
+            TextIO | None: the cached response, to be closed by the caller. None if it could not be downloaded
+        """
+        cached_file = self.cache.open_text(file_name)
+        if cached_file is not None:
+            log(f"Reading {file_name}", "debug")
+            return cached_file
+
+        log(f"Getting {url_to_lookup_on_miss}...", "info")
+        with _census_request_slots:
+            req = self._get(url_to_lookup_on_miss, stream=True)
+            if req is None:
+                log(f"Could not get census file {file_name}.", "error")
+                return None
+            with req:
+                req.raise_for_status()
+                self.cache.put_chunks(file_name, req.iter_content(JSON_READ_CHUNK_SIZE))
+        return self.cache.open_text(file_name)
+
+    def _cached_response_df(
+        self,
+        file_name: str,
+        url: str,
+        header_columns: Callable[[list[str]], dict[int, tuple[str, pl.PolarsDataType]]],
+        table_name: str,
+    ) -> pl.DataFrame | None:
+        """Get a data response as a typed DataFrame, parsing it only once.
+
+        Note:
+            The parsed table is cached as `table_name` and memory mapped on later calls. See `CensusCache.get_df`.
+
+        Args:
+            file_name (str): the response's file name. See `CensusDataRetriever.get_and_cache_file`
+            url (str): the Census url of the response
+            header_columns (Callable[[list[str]], dict[int, tuple[str, pl.PolarsDataType]]]): see `read_census_response_df`
+            table_name (str): the parsed table's name. It must change whenever `header_columns` would make different columns
+
+        Returns:
+            pl.DataFrame | None: the table, or None if it could not be fetched or is not a valid response. A response that is not valid is removed from the cache
+        """
+        df = self.cache.get_df(table_name)
+        if df is not None:
+            return df
+        data_file = self.get_and_cache_file(file_name, url)
+        if data_file is None:
+            return None
+        df = read_census_response_df(data_file, header_columns)
+        if df is None:
+            # so that the response is fetched again instead of failing on every read
+            self.cache.remove(file_name)
+            return None
+        self.cache.put_df(table_name, df)
+        return df
+
+    def _label_rules_hash(self) -> str:
+        return hashlib.sha1(
+            json.dumps(
+                [CENSUS_LABEL_INDEX_VERSION, REPLACEMENT_DICT, self.MAX_COL_NAME_LENGTH]
+            ).encode()
+        ).hexdigest()
+
+    def _acs5_dataset_url(self, dataset: ACS5Dataset, year: str) -> str:
+        if dataset == self.ACS5Dataset.DETAILED:
+            return f"{self.census_base_url}/{year}/acs/acs5"
+        return f"{self.census_base_url}/{year}/acs/acs5/{dataset}"
+
+    def _acs5_table_request(
+        self, dataset: ACS5Dataset, table: str, year: str, for_value: str = "*"
+    ) -> tuple[str, str]:
+        """Make the cache file name and url of a table's ZCTA group response.
+
+        Args:
+            dataset (ACS5Dataset): the dataset the table is in
+            table (str): the table
+            year (str): the year
+            for_value (str, optional): the ZCTAs. See `zcta_for_values`. Defaults to "*", meaning all ZCTAs.
+
+        Returns:
+            tuple[str, str]: the file name and the url
+        """
+        url = f"{self._acs5_dataset_url(dataset, year)}?get=group({table})&for=zip%20code%20tabulation%20area:{for_value}"
+        if for_value == "*":
+            return f"{year}-acs-{dataset}-table-{table}.json", url
+        for_value_hash = hashlib.sha1(for_value.encode()).hexdigest()[:12]
+        return f"{year}-acs-{dataset}-table-{table}-zctas-{for_value_hash}.json", url
+
+    def _zcta_table_df(
+        self,
+        file_name: str,
+        url: str,
+        table: str,
+        variables: dict[str, Any],
+        dataset: ACS5Dataset,
+        year: str,
+    ) -> pl.DataFrame | None:
+        """Get a ZCTA group response as a typed DataFrame with translated column names.
+
+        Note:
+            Columns that are dropped from the output (NAME, GEO_ID, annotations, and variables whose label could not be used) are never parsed. The remaining variables get the dtype of their predicateType, see `CENSUS_PREDICATE_TYPE_DTYPES`. The table is parsed once, see `CensusDataRetriever._cached_response_df`.
+
+        Args:
+            file_name (str): the response's file name. See `CensusDataRetriever.get_and_cache_file`
+            url (str): the Census url of the response
+            table (str): the table
+            variables (dict[str, Any]): the table's groups metadata variables
+            dataset (ACS5Dataset): the dataset the table is in
+            year (str): the year
+
+        Returns:
+            pl.DataFrame | None: the table, or None if it could not be fetched or is not a valid table
+        """
+        drop_pattern = re.compile(f"(?i)^ann|{table}")
+
+        def header_columns(
+            raw_headers: list[str],
+        ) -> dict[int, tuple[str, pl.PolarsDataType]]:
+            headers = list(raw_headers)
+            self.translate_acs5_headers(dataset, headers, table, year)
+            columns: dict[int, tuple[str, pl.PolarsDataType]] = {}
+            for idx, (raw_header, header) in enumerate(zip(raw_headers, headers)):
+                if raw_header in ("NAME", "GEO_ID") or drop_pattern.search(header):
+                    continue
+                if header == "zip code tabulation area":
+                    columns[idx] = ("ZCTA", pl.Int32)
+                    continue
+                columns[idx] = (header, census_variable_dtype(variables, raw_header))
+            return columns
+
+        return self._cached_response_df(
+            file_name,
+            url,
+            header_columns,
+            f"{file_name}-{self._label_rules_hash()[:12]}.arrow",
+        )
+
+    def acs5_table_variables(
+        self, dataset: ACS5Dataset, table: str, year: str
+    ) -> dict[str, Any] | None:
+        """Get a table's groups metadata variables.
 
         Note:
-            Tables must be:
-                * DP02
-                * DP02PR
-                * DP03
-                * DP04
-                * DP05
+            Profile tables are listed at https://api.census.gov/data/2022/acs/acs5/profile/groups.html, subject tables at https://www.census.gov/acs/www/data/data-tables-and-tools/subject-tables/ and detailed tables at https://api.census.gov/data/2022/acs/acs5/groups.html
 
             Returned object will have entries similar to:
             ```json
@@ -761,244 +2272,581 @@ class CensusDataRetriever:
             ```
 
         Args:
-            table (str): the table to lookup
-            year (str): which acs5 year to look up
+            dataset (ACS5Dataset): the dataset the table is in
+            table (str): the table
+            year (str): the year
 
         Returns:
-            str | Any: json object
+            dict[str, Any] | None: `variable: attributes`, or None if the metadata could not be fetched
         """
-        file_name = f"{year}-acs5-profile-groups-{table}.json"
-        groups_url = (
-            f"https://api.census.gov/data/{year}/acs/acs5/profile/groups/{table}.json"
-        )
+        file_name = f"{year}-acs5-{dataset}-groups-{table}.json"
+        groups_url = f"{self._acs5_dataset_url(dataset, year)}/groups/{table}.json"
         groups_to_label_translation = self.get_and_cache_data(file_name, groups_url)
         if groups_to_label_translation is False:
             log("Something is wrong with groups label dict", "warn")
             return None
         return groups_to_label_translation["variables"]  # type: ignore
 
-    def _translate_and_truncate_unique_acs5_profile_groups_to_labels_for_header_list(
-        self, headers: list[str], table: str, year: str
-    ) -> None:
-        """Get the label name for a table and row for the acs5 profile surveys.
+    @classmethod
+    def acs5_dataset_for_table(cls, table: str) -> ACS5Dataset:
+        """Find the dataset a table is in from its code.
 
         Args:
-            headers (list[str]): header row
-            table (str): have to look again
-            year (str): the year
+            table (str): the table, like "DP05", "S1901" or "B19013"
+
+        Raises:
+            ValueError: if the table is not a profile, subject or detailed table
 
         Returns:
-            None: translates the list of table_row_selector to its english label
+            ACS5Dataset: the dataset
         """
-        # is going to read the file multiple times, save last req as {"table": req_json[table]...} for this?
-        groups_to_label_translation_dict = self._get_acs5_profile_table_to_group_name(
-            table, year
+        if table.upper().startswith("DP"):
+            return cls.ACS5Dataset.PROFILE
+        if table.upper().startswith("S"):
+            return cls.ACS5Dataset.SUBJECT
+        if table.upper().startswith(("B", "C")):
+            return cls.ACS5Dataset.DETAILED
+        raise ValueError(
+            f"{table} is not an ACS 5 year profile, subject or detailed table"
         )
-        if groups_to_label_translation_dict is None:
-            log("Could not translate headers", "warn")
-            return groups_to_label_translation_dict
 
+    def acs5_label_index(
+        self, dataset: ACS5Dataset, table: str, year: str
+    ) -> dict[str, str] | None:
+        """Get the column name of every variable of a table.
+
+        Note:
+            Built once from the groups metadata with `shorten_census_label`, then kept in memory and saved next to the metadata, so that headers are translated without reading the metadata again.
+
+        Args:
+            dataset (ACS5Dataset): the dataset the table is in
+            table (str): the table
+            year (str): the year
+
+        Returns:
+            dict[str, str] | None: `variable: column name`, or None if the groups metadata could not be fetched
+        """
+        index_key = (str(self.cache.cache_dir_path), year, str(dataset), table)
+        with _census_label_index_lock:
+            label_index = _census_label_indexes.get(index_key)
+        if label_index is not None:
+            return label_index
+
+        rules_hash = self._label_rules_hash()
+        index_name = f"{year}-acs5-{dataset}-labels-{table}.json"
+        saved_index = self.cache.get_json(index_name)
+        if isinstance(saved_index, dict) and saved_index.get("rules") == rules_hash:
+            label_index = saved_index.get("labels")
+
+        if label_index is None:
+            variables = self.acs5_table_variables(dataset, table, year)
+            if variables is None:
+                return None
+            label_index = {
+                variable: shorten_census_label(
+                    attributes["label"], self.MAX_COL_NAME_LENGTH
+                )
+                for variable, attributes in variables.items()
+            }
+            self.cache.put_json(
+                index_name, {"rules": rules_hash, "labels": label_index}
+            )
+
+        with _census_label_index_lock:
+            _census_label_indexes[index_key] = label_index
+        return label_index
+
+    def translate_acs5_headers(
+        self, dataset: ACS5Dataset, headers: list[str], table: str, year: str
+    ) -> None:
+        """Translate a header row of variables to their column names, in place.
+
+        Note:
+            A column name that is already in the row is not used twice, and the variable is kept instead. Other headers, like "NAME", are left as they are.
+
+        Args:
+            dataset (ACS5Dataset): the dataset the table is in
+            headers (list[str]): header row
+            table (str): the table
+            year (str): the year
+        """
+        label_index = self.acs5_label_index(dataset, table, year)
+        if label_index is None:
+            log("Could not translate headers", "error")
+            return
+
+        seen_headers: set[str] = set()
         for idx, header in enumerate(headers):
-            new_col_name_dict = groups_to_label_translation_dict.get(header)
-            if new_col_name_dict is None:
-                # returns none if not in dict, means we have custom name and can continue
+            new_col_name = label_index.get(header)
+            if new_col_name is not None and new_col_name not in seen_headers:
+                headers[idx] = new_col_name
+            seen_headers.add(headers[idx])
+
+    def resolve_acs5_variables(
+        self,
+        dataset: ACS5Dataset,
+        table: str,
+        year: str,
+        variables_or_label_patterns: list[str],
+    ) -> list[str]:
+        """Resolve variable names and label patterns against a table's groups metadata.
+
+        Note:
+            An entry that is not a variable of the table is a case insensitive regex, searched for in each variable's label, such as "Estimate!!.*Median income". Entries that match nothing are logged and skipped.
+
+        Args:
+            dataset (ACS5Dataset): the dataset the table is in
+            table (str): the table
+            year (str): the year
+            variables_or_label_patterns (list[str]): variable names, like "S1901_C01_012E", and label patterns
+
+        Returns:
+            list[str]: the variable names, in the order they were asked for, without duplicates
+        """
+        variables = self.acs5_table_variables(dataset, table, year)
+        if variables is None:
+            return []
+
+        resolved_variables: dict[str, None] = {}
+        for entry in variables_or_label_patterns:
+            if entry in variables:
+                resolved_variables[entry] = None
                 continue
-            new_col_name = new_col_name_dict["label"]
-            # qgis doesnt allow field names of 80+ chars. massage into form, then cut off
-            # delimiter for table subsection
-            new_col_name = new_col_name.replace("$", "D")
-            new_col_name = new_col_name.replace(",", "")
-            new_col_name = new_col_name.replace("'", "")
-            new_col_name = re.sub(r"\s+", " ", new_col_name)
-            new_col_name = new_col_name.replace("!!", " ")
-            # easier to read
-            new_col_name_parts = new_col_name.split(" ")
-            for idy, no_format in enumerate(new_col_name_parts):
-                new_col_name_parts[idy] = no_format.capitalize()
-            new_col_name = "".join(new_col_name_parts)
-            # shortenings to fit length requirement
-            for key, value in REPLACEMENT_DICT.items():
-                new_col_name = re.sub(key, value, new_col_name)
-            # limiter
-            new_col_name = new_col_name[
-                : min(len(new_col_name), self.MAX_COL_NAME_LENGTH)
+            label_pattern = re.compile(entry, re.I)
+            matches = [
+                variable
+                for variable, attributes in sorted(variables.items())
+                if label_pattern.search(attributes.get("label", ""))
             ]
+            if len(matches) == 0:
+                log(f"{entry} matches no variable of {table} in {year}", "info")
+            resolved_variables.update(dict.fromkeys(matches))
+        return list(resolved_variables)
 
-            if new_col_name not in headers[:idx]:
-                headers[idx] = new_col_name
+    def _variables_for_zcta_df(
+        self,
+        dataset: ACS5Dataset,
+        year: str,
+        variables: list[str],
+        variable_metadata: dict[str, Any],
+        for_value: str = "*",
+    ) -> pl.DataFrame | None:
+        """Get up to `CENSUS_MAX_VARIABLES_PER_REQUEST` variables for some ZCTAs.
 
-    def generate_acs5_profile_table_group_for_zcta_by_year(
-        self, table: str, year: str
-    ) -> str:
-        """CSV output of an acs 5 year profile survey table.
+        Args:
+            dataset (ACS5Dataset): the dataset the variables are in
+            year (str): the year
+            variables (list[str]): the variables
+            variable_metadata (dict[str, Any]): the groups metadata of the variables, for their predicateType
+            for_value (str, optional): the ZCTAs. See `zcta_for_values`. Defaults to "*", meaning all ZCTAs.
 
-        TODO:
-            Update func name
+        Returns:
+            pl.DataFrame | None: ZCTA and one column per variable, or None if the request failed
+        """
+        request_hash = hashlib.sha1(
+            f"{",".join(variables)}&for={for_value}".encode()
+        ).hexdigest()[:12]
+        file_name = f"{year}-acs-{dataset}-variables-{request_hash}.json"
+        url = f"{self._acs5_dataset_url(dataset, year)}?get={",".join(variables)}&for=zip%20code%20tabulation%20area:{for_value}"
+
+        def header_columns(
+            headers: list[str],
+        ) -> dict[int, tuple[str, pl.PolarsDataType]]:
+            return {
+                idx: ("ZCTA", pl.Int32)
+                if header == "zip code tabulation area"
+                else (header, census_variable_dtype(variable_metadata, header))
+                for idx, header in enumerate(headers)
+                if header == "zip code tabulation area" or header in variables
+            }
+
+        return self._cached_response_df(
+            file_name, url, header_columns, f"{file_name}.arrow"
+        )
+
+    def get_acs5_variables_for_zcta(
+        self,
+        dataset: ACS5Dataset,
+        table: str,
+        year: str,
+        variables_or_label_patterns: list[str],
+        zctas: list[str] | None = None,
+    ) -> pl.DataFrame | None:
+        """Get only some variables of a table, for all or some ZCTAs.
+
+        Note:
+            Variables are resolved with `CensusDataRetriever.resolve_acs5_variables`, then requested `CENSUS_MAX_VARIABLES_PER_REQUEST` at a time for each batch of ZCTAs, up to `MAX_CENSUS_WORKERS` requests at once. Each request is cached on its own, so asking for the same variables again does not make any requests.
 
         Args:
-            table (str): census demo acs5 table
-            year (str): year to search
+            dataset (ACS5Dataset): the dataset the table is in
+            table (str): the table
+            year (str): the year
+            variables_or_label_patterns (list[str]): variable names and label patterns
+            zctas (list[str] | None, optional): the 5 digit ZCTAs to get. See `backend.helper.metro_name_to_zcta_list` and `backend.helper.state_to_zcta_list`. Defaults to None, meaning all ZCTAs.
 
         Returns:
-            str: file path where output is saved
+            pl.DataFrame | None: ZCTA and one typed column per variable, named by variable. None if no variable could be fetched
         """
-        file_name = f"{year}-acs-profile-table-{table}.json"
-        url = f"https://api.census.gov/data/{year}/acs/acs5/profile?get=group({table})&for=zip%20code%20tabulation%20area:*"
-        list_of_list_table_json = self.get_and_cache_data(file_name, url)
+        variable_metadata = self.acs5_table_variables(dataset, table, year) or {}
+        variables = self.resolve_acs5_variables(
+            dataset, table, year, variables_or_label_patterns
+        )
+        variable_chunks = [
+            variables[idx : idx + CENSUS_MAX_VARIABLES_PER_REQUEST]
+            for idx in range(0, len(variables), CENSUS_MAX_VARIABLES_PER_REQUEST)
+        ]
+        for_values = zcta_for_values(zctas)
+        with ThreadPoolExecutor(max_workers=MAX_CENSUS_WORKERS) as executor:
+            request_futures = [
+                [
+                    executor.submit(
+                        self._variables_for_zcta_df,
+                        dataset,
+                        year,
+                        variable_chunk,
+                        variable_metadata,
+                        for_value,
+                    )
+                    for for_value in for_values
+                ]
+                for variable_chunk in variable_chunks
+            ]
 
-        if list_of_list_table_json is False:
+        chunk_dfs = []
+        failed_requests = 0
+        for chunk_futures in request_futures:
+            batch_dfs = [future.result() for future in chunk_futures]
+            failed_requests += sum(batch_df is None for batch_df in batch_dfs)
+            batch_dfs = [batch_df for batch_df in batch_dfs if batch_df is not None]
+            if len(batch_dfs) > 0:
+                chunk_dfs.append(pl.concat(batch_dfs))
+        if len(chunk_dfs) == 0:
+            log(f"Could not get any variables of {table} in {year}", "error")
+            return None
+        if failed_requests > 0:
             log(
-                f"Could not load table {table}. Perhaps the api is down or there was an error saving/reading the file.",
-                "warn",
+                f"{failed_requests} of {len(variable_chunks) * len(for_values)} requests for variables of {table} in {year} failed",
+                "error",
             )
-            return ""
+        return functools.reduce(
+            lambda left_df, right_df: left_df.join(right_df, on="ZCTA", how="outer"),
+            chunk_dfs,
+        ).select("ZCTA", pl.exclude("ZCTA"))
 
-        self._translate_and_truncate_unique_acs5_profile_groups_to_labels_for_header_list(
-            list_of_list_table_json[0],  # type: ignore
-            table,
-            year,  # type: ignore
+    def get_acs5_tables(
+        self, jobs: list[tuple[ACS5Dataset, str, str, list[str] | None]]
+    ) -> list[pl.DataFrame | None]:
+        """Get many tables, years and geographies at once.
+
+        Note:
+            Each job is `(dataset, table, year, zctas)`, with zctas None for all ZCTAs. The groups metadata and label index of each table and year are fetched once, however many jobs share them. Jobs are then split into requests, all ZCTAs at once or `for` lists of up to `CENSUS_MAX_ZCTA_LIST_LENGTH` characters, and a request shared by several jobs is made once. A job for some ZCTAs is filtered out of the all-ZCTA response instead when that response is cached or also asked for.
+
+            Metadata and requests each run through one pool of `MAX_CENSUS_WORKERS` threads, and every response is cached and parsed once, see `CensusDataRetriever._zcta_table_df`.
+
+        Args:
+            jobs (list[tuple[ACS5Dataset, str, str, list[str] | None]]): `(dataset, table, year, zctas)`. See `CensusDataRetriever.acs5_dataset_for_table`
+
+        Returns:
+            list[pl.DataFrame | None]: the table of each job, in the order of `jobs`, with translated column names and a ZCTA column. None for jobs that could not be fetched
+        """
+        table_keys = list(
+            dict.fromkeys((dataset, table, year) for dataset, table, year, _ in jobs)
         )
 
-        df = pl.DataFrame(list_of_list_table_json, orient="row")
-        # funky stuff to get the first list to be the name of the columns
-        df = (
-            df.rename(df.head(1).to_dicts().pop())
-            .slice(1)  # type: ignore
-            .drop("NAME", cs.matches("(?i)^(ann)"), cs.matches(f"(?i){table}"))
-            .rename({"zip code tabulation area": "ZCTA"})
-            .cast(
-                {
-                    "ZCTA": pl.Int32,
-                }
+        def get_table_variables(
+            table_key: tuple[CensusDataRetriever.ACS5Dataset, str, str],
+        ) -> dict[str, Any]:
+            self.acs5_label_index(*table_key)
+            return self.acs5_table_variables(*table_key) or {}
+
+        national_table_keys = {
+            (dataset, table, year)
+            for dataset, table, year, zctas in jobs
+            if zctas is None
+            or self.cache.contains(self._acs5_table_request(dataset, table, year)[0])
+        }
+        job_requests = [
+            [(dataset, table, year, "*")]
+            if (dataset, table, year) in national_table_keys
+            else [
+                (dataset, table, year, for_value)
+                for for_value in zcta_for_values(zctas)
+            ]
+            for dataset, table, year, zctas in jobs
+        ]
+        table_requests = list(
+            dict.fromkeys(
+                request for request_keys in job_requests for request in request_keys
             )
         )
-        table_file_name = CENSUS_DATA_DIR_PATH / f"acs5-profile-group-{table}-zcta.csv"
-        df.write_csv(table_file_name)
-        return str(table_file_name)
 
-    def _get_acs5_subject_table_to_group_name(
-        self, table: str, year: str
-    ) -> dict[str, Any] | None:
-        """Get a JSON representation of a table's attributes.
+        with ThreadPoolExecutor(max_workers=MAX_CENSUS_WORKERS) as executor:
+            table_variables = dict(
+                zip(table_keys, executor.map(get_table_variables, table_keys))
+            )
 
-        Note:
-            Tables can be found at: https://www.census.gov/acs/www/data/data-tables-and-tools/subject-tables/
+            def get_request_df(
+                request: tuple[CensusDataRetriever.ACS5Dataset, str, str, str],
+            ) -> pl.DataFrame | None:
+                dataset, table, year, for_value = request
+                return self._zcta_table_df(
+                    *self._acs5_table_request(dataset, table, year, for_value),
+                    table,
+                    table_variables[(dataset, table, year)],
+                    dataset,
+                    year,
+                )
 
-            Returned object will have entries similar to:
-            ```json
-            "DP05_0037M": {
-                "label": "Margin of Error!!RACE!!Total population!!One race!!White",
-                "concept": "ACS DEMOGRAPHIC AND HOUSING ESTIMATES",
-                "predicateType": "int",
-                "group": "DP05",
-                "limit": 0,
-                "predicateOnly": true
-            }
-            ```
+            request_dfs = dict(
+                zip(table_requests, executor.map(get_request_df, table_requests))
+            )
+        log(
+            f"Got {len(jobs)} ACS 5 year tables from {len(table_keys)} tables and years in {len(table_requests)} requests",
+            "debug",
+        )
+
+        table_dfs: list[pl.DataFrame | None] = []
+        for (dataset, table, year, zctas), request_keys in zip(jobs, job_requests):
+            batch_dfs = [request_dfs[request] for request in request_keys]
+            failed_requests = sum(batch_df is None for batch_df in batch_dfs)
+            if failed_requests > 0:
+                log(
+                    f"{failed_requests} of {len(request_keys)} requests for {table} in {year} failed",
+                    "error",
+                )
+            batch_dfs = [batch_df for batch_df in batch_dfs if batch_df is not None]
+            if len(batch_dfs) == 0:
+                table_dfs.append(None)
+                continue
+            table_df = pl.concat(batch_dfs, how="vertical_relaxed")
+            if zctas is not None and (dataset, table, year) in national_table_keys:
+                log(f"Filtering {len(zctas)} ZCTAs out of {table} in {year}", "debug")
+                table_df = table_df.filter(
+                    pl.col("ZCTA").is_in([int(zcta) for zcta in zctas])
+                )
+            table_dfs.append(table_df)
+        return table_dfs
+
+    def get_acs5_table_for_zctas(
+        self, dataset: ACS5Dataset, table: str, year: str, zctas: list[str] | None
+    ) -> pl.DataFrame | None:
+        """Get a whole table for some ZCTAs.
 
         Args:
-            table (str): the table to lookup
-            year (str): which acs5 year to look up
+            dataset (ACS5Dataset): the dataset the table is in
+            table (str): the table
+            year (str): the year
+            zctas (list[str] | None): the 5 digit ZCTAs, or None for all ZCTAs
 
         Returns:
-            str | Any: variables
+            pl.DataFrame | None: see `CensusDataRetriever.get_acs5_tables`
         """
-        file_name = f"{year}-acs5-subject-groups-{table}.json"
-        groups_url = (
-            f"https://api.census.gov/data/{year}/acs/acs5/subject/groups/{table}.json"
-        )
-        groups_to_label_translation = self.get_and_cache_data(file_name, groups_url)
-        if groups_to_label_translation is False:
-            log("Something is wrong with groups label dict", "warn")
-            return None
-        return groups_to_label_translation["variables"]  # type: ignore
+        return self.get_acs5_tables([(dataset, table, year, zctas)])[0]
 
-    def _translate_and_truncate_unique_acs5_subject_groups_to_labels_for_header_list(
-        self, headers: list[str], table: str, year: str
-    ) -> None:
-        """Gets the label name for a table and row for the acs5 profile surveys.
+    def generate_acs5_table_group_for_zcta_by_year(
+        self, dataset: ACS5Dataset, table: str, year: str
+    ) -> str:
+        """Parquet output of an acs 5 year table for every ZCTA.
 
         Args:
-            headers (list[str]): headers
-            table (str): table
-            year (str): year
+            dataset (ACS5Dataset): the dataset the table is in
+            table (str): the table
+            year (str): year to search
+
+        Returns:
+            str: file path where output is saved. Empty if the table could not be fetched
         """
-        # is going to read the file multiple times, save last req as {"table": req_json[table]...} for this?
-        groups_to_label_translation_dict = self._get_acs5_subject_table_to_group_name(
-            table, year
-        )
-        if groups_to_label_translation_dict is None:
-            log("Could not translate headers", "warn")
-            return groups_to_label_translation_dict
+        return self._write_acs5_table(dataset, table, year, None, None)
 
-        for idx, header in enumerate(headers):
-            new_col_name_dict = groups_to_label_translation_dict.get(header)
-            if new_col_name_dict is None:
-                # returns none if not in dict, means we have custom name and can continue
-                continue
-            new_col_name = new_col_name_dict["label"]
-            # qgis doesnt allow field names of 80+ chars. massage into form, then cut off
-            # delimiter for table subsection
-            new_col_name = new_col_name.replace("$", "D")
-            new_col_name = new_col_name.replace(",", "")
-            new_col_name = new_col_name.replace("'", "")
-            new_col_name = re.sub(r"\s+", " ", new_col_name)
-            new_col_name = new_col_name.replace("!!", " ")
-            # easier to read
-            new_col_name_parts = new_col_name.split(" ")
-            for idy, no_format in enumerate(new_col_name_parts):
-                new_col_name_parts[idy] = no_format.capitalize()
-            new_col_name = "".join(new_col_name_parts)
-            # shortenings to fit length requirement
-            for key, value in REPLACEMENT_DICT.items():
-                new_col_name = re.sub(key, value, new_col_name)
-            # limiter
-            new_col_name = new_col_name[
-                : min(len(new_col_name), self.MAX_COL_NAME_LENGTH)
-            ]
+    def generate_acs5_table_group_for_msa_by_year(
+        self, dataset: ACS5Dataset, table: str, year: str, msa_name: str
+    ) -> str:
+        """Parquet output of an acs 5 year table for the ZCTAs of a Metropolitan Statistical Area.
 
-            if new_col_name not in headers[:idx]:
-                headers[idx] = new_col_name
+        Args:
+            dataset (ACS5Dataset): the dataset the table is in
+            table (str): the table
+            year (str): year to search
+            msa_name (str): name of the Metropolitan Statistical Area
+
+        Returns:
+            str: file path where output is saved. Empty if the table could not be fetched
+        """
+        file_safe_msa_name = msa_name.strip().replace(", ", "_").replace(" ", "_")
+        return self._write_acs5_table(
+            dataset, table, year, metro_name_to_zcta_list(msa_name), file_safe_msa_name
+        )
 
-    def generate_acs5_subject_table_group_for_zcta_by_year(
-        self, table: str, year: str
+    def generate_acs5_table_group_for_state_by_year(
+        self, dataset: ACS5Dataset, table: str, year: str, state: str
     ) -> str:
-        """CSV output of a acs 5 year subject survey table
+        """Parquet output of an acs 5 year table for the ZCTAs of a state.
 
         Args:
-            table (str): census acs5 table
+            dataset (ACS5Dataset): the dataset the table is in
+            table (str): the table
             year (str): year to search
+            state (str): the state's name or postal code
+
+        Returns:
+            str: file path where output is saved. Empty if the table could not be fetched
         """
-        file_name = f"{year}-acs-subject-table-{table}.json"
-        url = f"https://api.census.gov/data/{year}/acs/acs5/subject?get=group({table})&for=zip%20code%20tabulation%20area:*"
-        list_of_list_table_json = self.get_and_cache_data(file_name, url)
-        if list_of_list_table_json is False:
+        state_code = sts.lookup(state)
+        return self._write_acs5_table(
+            dataset,
+            table,
+            year,
+            state_to_zcta_list(state),
+            state_code.abbr if state_code is not None else state,
+        )
+
+    def _write_acs5_table(
+        self,
+        dataset: ACS5Dataset,
+        table: str,
+        year: str,
+        zctas: list[str] | None,
+        scope_name: str | None,
+    ) -> str:
+        if zctas is not None and len(zctas) == 0:
+            log(f"No ZCTAs found for {scope_name}", "error")
+            return ""
+        df = self.get_acs5_table_for_zctas(dataset, table, year, zctas)
+        if df is None:
             log(
-                f"Could not load table {table}. Perhaps the api is down or there was an error saving/reading the file.",
-                "warn",
+                f"Could not load table {table} for {scope_name or "all ZCTAs"}.",
+                "error",
             )
             return ""
+        CENSUS_DATA_DIR_PATH.mkdir(parents=True, exist_ok=True)
+        scope_suffix = "" if scope_name is None else f"-{scope_name}"
+        table_file_path = (
+            CENSUS_DATA_DIR_PATH
+            / f"acs5-{dataset}-group-{table}-{year}-zcta{scope_suffix}.parquet"
+        )
+        df.write_parquet(table_file_path)
+        return str(table_file_path)
 
-        self._translate_and_truncate_unique_acs5_subject_groups_to_labels_for_header_list(
-            list_of_list_table_json[0],  # type: ignore
-            table,
-            year,  # type: ignore
+    def build_acs5_panel(
+        self,
+        tables: list[str],
+        years: list[str],
+        zctas: list[str] | None = None,
+        panel_name: str = "national",
+    ) -> Path | None:
+        """Get several tables for several years and save them as one dataset, partitioned by year.
+
+        Note:
+            Every table and year is fetched in one batch, see `CensusDataRetriever.get_acs5_tables`. Downloads are capped across all batches, see `CensusDataRetriever.get_and_cache_file`.
+
+            Columns are named `{table}_{column name}`, using the label index of each year (see `CensusDataRetriever.acs5_label_index`), so that a variable whose code changes between years stays in one column. Every year has every column, null in years without it.
+
+            The dataset is saved to `CENSUS_PANEL_DIR_PATH/{panel_name}/year={year}/data.parquet`, replacing any earlier panel of the same name. Read it with `pl.scan_parquet(path / "*/*.parquet", hive_partitioning=True)`.
+
+        Args:
+            tables (list[str]): profile, subject and detailed tables, like "S1901", "DP05" and "B19013"
+            years (list[str]): the years
+            zctas (list[str] | None, optional): the 5 digit ZCTAs to get. See `backend.helper.metro_name_to_zcta_list` and `backend.helper.state_to_zcta_list`. Defaults to None, meaning all ZCTAs.
+            panel_name (str, optional): the name of the dataset's folder. Defaults to "national".
+
+        Returns:
+            Path | None: the dataset's folder, or None if no table could be fetched for any year
+        """
+        jobs = [(table, year) for year in years for table in tables]
+        table_dfs = self.get_acs5_tables(
+            [
+                (self.acs5_dataset_for_table(table), table, year, zctas)
+                for table, year in jobs
+            ]
         )
 
-        df = pl.DataFrame(list_of_list_table_json, orient="row")
-        # funky stuff to get the first list to be the name of the columns
-        df = (
-            df.rename(df.head(1).to_dicts().pop())
-            .slice(1)  # type: ignore
-            .drop("NAME", cs.matches("(?i)^(ann)"), cs.matches(f"(?i){table}"))
-            .rename({"zip code tabulation area": "ZCTA"})
-            .cast(
+        year_dfs: dict[str, pl.DataFrame] = {}
+        for (table, year), table_df in zip(jobs, table_dfs):
+            if table_df is None:
+                log(f"Could not load table {table} for {year}.", "error")
+                continue
+            table_df = table_df.rename(
                 {
-                    "ZCTA": pl.Int32,
+                    column: f"{table}_{column}"
+                    for column in table_df.columns
+                    if column != "ZCTA"
                 }
             )
+            year_dfs[year] = (
+                table_df
+                if year not in year_dfs
+                else year_dfs[year].join(table_df, on="ZCTA", how="outer")
+            )
+        if len(year_dfs) == 0:
+            log(f"Could not load any table for panel {panel_name}.", "error")
+            return None
+
+        # the supertype of every column over all years, without concatenating the years
+        panel_schema = (
+            pl.concat(
+                [year_df.clear() for year_df in year_dfs.values()],
+                how="diagonal_relaxed",
+            )
+            .select("ZCTA", pl.exclude("ZCTA"))
+            .schema
+        )
+        panel_dir_path = CENSUS_PANEL_DIR_PATH / panel_name
+        temp_panel_dir_path = panel_dir_path.with_name(f"{panel_name}.tmp")
+        shutil.rmtree(temp_panel_dir_path, ignore_errors=True)
+        for year, year_df in year_dfs.items():
+            partition_path = temp_panel_dir_path / f"year={year}"
+            partition_path.mkdir(parents=True)
+            year_df.select(
+                pl.col(column).cast(dtype)
+                if column in year_df.columns
+                else pl.lit(None, dtype=dtype).alias(column)
+                for column, dtype in panel_schema.items()
+            ).write_parquet(partition_path / "data.parquet")
+        shutil.rmtree(panel_dir_path, ignore_errors=True)
+        os.replace(temp_panel_dir_path, panel_dir_path)
+        log(
+            f"Saved {len(tables)} tables for {len(year_dfs)} years to {panel_dir_path}",
+            "info",
+        )
+        return panel_dir_path
+
+    def generate_acs5_panel_for_msa(
+        self, tables: list[str], years: list[str], msa_name: str
+    ) -> Path | None:
+        """Build a panel of tables and years for the ZCTAs of a Metropolitan Statistical Area.
+
+        Args:
+            tables (list[str]): see `CensusDataRetriever.build_acs5_panel`
+            years (list[str]): the years
+            msa_name (str): name of the Metropolitan Statistical Area
+
+        Returns:
+            Path | None: see `CensusDataRetriever.build_acs5_panel`
+        """
+        file_safe_msa_name = msa_name.strip().replace(", ", "_").replace(" ", "_")
+        zctas = metro_name_to_zcta_list(msa_name)
+        if len(zctas) == 0:
+            log(f"No ZCTAs found for {file_safe_msa_name}", "error")
+            return None
+        return self.build_acs5_panel(tables, years, zctas, file_safe_msa_name)
+
+    def get_race_makeup_by_zcta(self, zcta: str) -> str | None:
+        """Get race make up by zcta from. DO NOT USE
+
+        Note:
+            use `get_table_group_for_zcta_by_state_by_year`
+
+        Args:
+            zcta (str): zcta
+
+        Returns:
+            str | None: text or none
+        """
+        # get white, black, american indian/native alaskan, asian, NH/PI, other. note that these are estimates, margin of error can be had with "M"
+        req = self._get(
+            f"{self._acs5_dataset_url(self.ACS5Dataset.PROFILE, "2021")}?get=DP05_0064E,DP05_0065E,DP05_0066E,DP05_0067E,DP05_0068E,DP05_0069E&for=zip%20code%20tabulation%20area:{zcta}"
+            + (f"&key={self.api_key}" if self.api_key is not None else "")
         )
-        table_file_name = CENSUS_DATA_DIR_PATH / f"acs5-subject-group-{table}-zcta.csv"
-        # may not have to write. but cache func doesn't return whether it hits or not
-        df.write_csv(table_file_name)
-        return str(table_file_name)
+        if req is None:
+            return None
+        return req.text
@@ -0,0 +1,449 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import Iterator
+
+import polars as pl
+
+from backend.eiaserver import EIAStandInServer
+from backend.heatingcost import heating_cost_lf
+from backend.helper import get_zip_zcta_crosswalk_df, state_to_zcta_list
+from backend.pricestore import EnergyPriceStore
+from backend.redfinscraper import CATEGORY_PATTERNS
+from backend import secondarydata
+from backend.censuscache import CensusCache
+from backend.censusjoin import census_enriched_listings_lf
+from backend.censusserver import CensusStandInServer
+from backend.secondarydata import (
+    DEFAULT_ACS5_PANEL_TABLES,
+    DEFAULT_ACS5_PANEL_YEARS,
+    REPLACEMENT_DICT,
+    CensusDataRetriever,
+    EIADataRetriever,
+)
+from backend.us import states as sts
+
+# the backend redirects stdout to the log file
+out = sys.__stdout__
+
+
+def synthetic_price_df(years: int, seed: int = 0) -> pl.DataFrame:
+    """Make a long format price DataFrame with every state, fuel and month over `years` years."""
+    rng = random.Random(seed)
+    months = [
+        datetime.date(2024 - years + month // 12, month % 12 + 1, 1)
+        for month in range(years * 12)
+    ]
+    rows = [
+        (state.abbr, energy_type.name, month, rng.uniform(1, 30))
+        for state in sts.STATES
+        for energy_type in EIADataRetriever.EnergyType
+        for month in months
+    ]
+    return pl.DataFrame(
+        rows,
+        schema={
+            "state": pl.Utf8,
+            "fuel": pl.Utf8,
+            "period": pl.Date,
+            "raw_price": pl.Float64,
+        },
+        orient="row",
+    )
+
+
+def heater_price_per_mbtu_dicts(
+    eia: EIADataRetriever, price_df: pl.DataFrame
+) -> list[dict]:
+    """The dict based equivalent of `EIADataRetriever.heater_price_per_mbtu_df`: one `year-month: price` dict per state and heater."""
+    price_dicts: dict[tuple[str, str], dict] = {}
+    for state, fuel, period, raw_price in price_df.rows():
+        price_dicts.setdefault((state, fuel), {})[
+            f"{period.year}-{period.month:02}"
+        ] = raw_price
+
+    result = []
+    for heater_name, heater in EIADataRetriever.HeaterEfficiencies.__members__.items():
+        heater_fuel = EIADataRetriever.HEATER_FUELS[heater_name]
+        if heater_fuel is None:
+            continue
+        energy_type, btu_per_unit = heater_fuel
+        dollars_per_unit = EIADataRetriever.ENERGY_TYPE_CONVERSIONS[energy_type][1]
+        for (state, fuel), price_dict in price_dicts.items():
+            if fuel != energy_type.name:
+                continue
+            heater_dict = {"state": state, "heater": heater_name}
+            for key, value in price_dict.items():
+                heater_dict[key] = (
+                    value * dollars_per_unit / (btu_per_unit * heater.value) * 1_000
+                )
+            result.append(heater_dict)
+    return result
+
+
+def benchmark_heater_matrix(years: int, repeat: int) -> None:
+    eia = EIADataRetriever()
+    price_df = synthetic_price_df(years)
+    print(
+        f"Heater price matrix: {len(sts.STATES)} states x {years} years x {len(EIADataRetriever.HeaterEfficiencies.__members__)} heaters, {price_df.height} prices",
+        file=out,
+    )
+
+    for name, func in [
+        ("DataFrame", lambda: eia.heater_price_per_mbtu_df(price_df)),
+        ("dicts", lambda: heater_price_per_mbtu_dicts(eia, price_df)),
+    ]:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        print(f"  {name}: best of {repeat}: {min(timings):.3f} s", file=out)
+
+
+def synthetic_listings_df(listings: int, seed: int = 0) -> pl.DataFrame:
+    """Make listings in the form of `full_info.csv`, spread over every state, with random heating categories."""
+    rng = random.Random(seed)
+    state_abbrs = [state.abbr for state in sts.STATES]
+    return pl.DataFrame(
+        {
+            "STATE OR PROVINCE": [rng.choice(state_abbrs) for _ in range(listings)],
+            "SQUARE FEET": [rng.randint(600, 5000) for _ in range(listings)],
+            **{
+                category: [rng.random() < 0.2 for _ in range(listings)]
+                for category in CATEGORY_PATTERNS
+            },
+        },
+        schema_overrides={"SQUARE FEET": pl.UInt32},
+    )
+
+
+def benchmark_heating_cost(listings: int, repeat: int) -> None:
+    eia = EIADataRetriever()
+    listings_df = synthetic_listings_df(listings)
+    heater_price_df = eia.heater_price_per_mbtu_df(synthetic_price_df(1))
+    print(
+        f"Heating cost: {listings} listings in {len(sts.STATES)} states, {heater_price_df.height} heater prices",
+        file=out,
+    )
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        heating_cost_lf(listings_df.lazy(), heater_price_df.lazy()).collect()
+        timings.append(time.perf_counter() - start)
+    print(f"  best of {repeat}: {min(timings):.3f} s", file=out)
+
+
+# words that ACS labels are made of, including every phrase in `REPLACEMENT_DICT`
+CENSUS_LABEL_WORDS = [
+    "Estimate",
+    "Percent",
+    "Margin of Error",
+    "Total population",
+    "One race",
+    "Two or more races",
+    "White",
+    "Black or African American",
+    "American Indian and Alaska Native",
+    "Asian",
+    "Native Hawaiian and Other Pacific Islander",
+    "Some other race",
+    "Hispanic or Latino",
+    "Not Hispanic or Latino",
+    "Households",
+    "Median income (dollars)",
+    "$50,000 to $74,999",
+    "25 years and over",
+    "Women's",
+]
+
+
+def synthetic_census_groups(table: str, variables: int, seed: int = 0) -> dict:
+    """Make the groups metadata of a table with `variables` variables, in the form the Census API returns it."""
+    rng = random.Random(seed)
+    return {
+        "variables": {
+            f"{table}_{idx:04}{suffix}": {
+                "label": "!!".join(
+                    rng.choice(CENSUS_LABEL_WORDS) for _ in range(rng.randint(2, 5))
+                ),
+                "predicateType": "int",
+                "group": table,
+            }
+            for idx in range(variables // 2)
+            for suffix in ["E", "M"]
+        }
+    }
+
+
+def translate_census_headers_reference(
+    census: CensusDataRetriever, headers: list[str], table: str, year: str
+) -> None:
+    """The translation done before the label index: read the metadata on every call, apply each replacement in turn and look back over the row for duplicates."""
+    variables = (
+        census.acs5_table_variables(
+            CensusDataRetriever.ACS5Dataset.PROFILE, table, year
+        )
+        or {}
+    )
+    for idx, header in enumerate(headers):
+        if header not in variables:
+            continue
+        col_name = variables[header]["label"]
+        col_name = col_name.replace("$", "D").replace(",", "").replace("'", "")
+        col_name = re.sub(r"\s+", " ", col_name).replace("!!", " ")
+        col_name = "".join(word.capitalize() for word in col_name.split(" "))
+        for key, value in REPLACEMENT_DICT.items():
+            col_name = re.sub(key, value, col_name)
+        col_name = col_name[: census.MAX_COL_NAME_LENGTH]
+        if col_name not in headers[:idx]:
+            headers[idx] = col_name
+
+
+def benchmark_census_labels(years: int, variables: int, repeat: int) -> None:
+    """Time translating a profile table's header row for every year, before and after the label index."""
+    os.environ.setdefault("CENSUS_API_KEY", "benchmark")
+    census = CensusDataRetriever()
+    census.cache = CensusCache(Path(tempfile.mkdtemp()))
+    table = "DP05"
+    year_list = [str(2024 - year) for year in range(years)]
+    groups = synthetic_census_groups(table, variables)
+    for year in year_list:
+        census.cache.put_json(f"{year}-acs5-profile-groups-{table}.json", groups)
+    headers = ["NAME", *groups["variables"], "zip code tabulation area"]
+    print(
+        f"Census labels: {len(headers)} headers x {years} years, translated {repeat} times",
+        file=out,
+    )
+
+    def translate_all(translate) -> float:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for year in year_list:
+                translate(list(headers), year)
+        return time.perf_counter() - start
+
+    reference_seconds = translate_all(
+        lambda row, year: translate_census_headers_reference(census, row, table, year)
+    )
+    print(f"  reference: {reference_seconds:.3f} s", file=out)
+
+    def translate_indexed(row: list[str], year: str) -> None:
+        census.translate_acs5_headers(
+            CensusDataRetriever.ACS5Dataset.PROFILE, row, table, year
+        )
+
+    secondarydata._census_label_indexes.clear()
+    for year in year_list:
+        census.cache.remove(f"{year}-acs5-profile-labels-{table}.json")
+    start = time.perf_counter()
+    for year in year_list:
+        translate_indexed(list(headers), year)
+    print(f"  index, built: {time.perf_counter() - start:.3f} s", file=out)
+
+    secondarydata._census_label_indexes.clear()
+    start = time.perf_counter()
+    for year in year_list:
+        translate_indexed(list(headers), year)
+    print(f"  index, from disk: {time.perf_counter() - start:.3f} s", file=out)
+
+    print(
+        f"  index, in memory: {translate_all(translate_indexed):.3f} s",
+        file=out,
+    )
+
+
+def synthetic_census_response_chunks(
+    variables: list[str], zctas: int, seed: int = 0
+) -> Iterator[bytes]:
+    """Make an all-ZCTA group response of a table, one row at a time, in the form the Census API returns it."""
+    rng = random.Random(seed)
+    yield json.dumps(["NAME", *variables, "zip code tabulation area"]).encode()
+    for zcta in range(zctas):
+        row = [
+            f"ZCTA5 {zcta:05}",
+            *(str(rng.randint(0, 100_000)) for _ in variables),
+            f"{zcta:05}",
+        ]
+        yield b",\n" + json.dumps(row).encode()
+
+
+def benchmark_census_cache(variables: int, zctas: int) -> None:
+    """Time reading a cached all-ZCTA table by parsing its response, then from its memory mapped table."""
+    os.environ.setdefault("CENSUS_API_KEY", "benchmark")
+    census = CensusDataRetriever()
+    census.cache = CensusCache(Path(tempfile.mkdtemp()))
+    table, year = "DP05", "2022"
+    dataset = CensusDataRetriever.ACS5Dataset.PROFILE
+    groups = synthetic_census_groups(table, variables)
+    census.cache.put_json(f"{year}-acs5-profile-groups-{table}.json", groups)
+    file_name, url = census._acs5_table_request(dataset, table, year)
+    census.cache.put_chunks(
+        file_name,
+        [
+            b"[",
+            *synthetic_census_response_chunks(list(groups["variables"]), zctas),
+            b"]",
+        ],
+    )
+    print(
+        f"Census cache: {zctas} ZCTAs x {variables} variables, {census.cache.size() / 1024**2:.1f} MB compressed",
+        file=out,
+    )
+
+    for name in ["parsed", "memory mapped"]:
+        start = time.perf_counter()
+        census._zcta_table_df(file_name, url, table, groups["variables"], dataset, year)
+        print(f"  {name}: {time.perf_counter() - start:.3f} s", file=out)
+
+
+def benchmark_census_enrichment(listings: int, variables: int, repeat: int) -> None:
+    """Time attaching Census columns to listings in every ZIP code through the ZIP code to ZCTA crosswalk."""
+    rng = random.Random(0)
+    crosswalk_df = get_zip_zcta_crosswalk_df()
+    zip_codes = crosswalk_df.get_column("ZIP").to_list()
+    listings_df = pl.DataFrame(
+        {
+            "ZIP OR POSTAL CODE": [rng.choice(zip_codes) for _ in range(listings)],
+            "PRICE": [rng.randint(50_000, 2_000_000) for _ in range(listings)],
+        },
+        schema={"ZIP OR POSTAL CODE": pl.UInt32, "PRICE": pl.UInt32},
+    )
+    zctas = crosswalk_df.get_column("ZCTA").unique()
+    census_df = pl.DataFrame(
+        [
+            zctas,
+            *[
+                pl.Series(f"column_{idx}", [rng.random() for _ in range(zctas.len())])
+                for idx in range(variables)
+            ],
+        ]
+    )
+    print(
+        f"Census enrichment: {listings} listings, {census_df.height} ZCTAs x {variables} columns",
+        file=out,
+    )
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        census_enriched_listings_lf(listings_df.lazy(), census_df.lazy()).collect()
+        timings.append(time.perf_counter() - start)
+    print(f"  best of {repeat}: {min(timings):.3f} s", file=out)
+
+
+def benchmark_eia_fetch(years: int, latency_seconds: float) -> None:
+    """Time fetching every fuel for every state from the local EIA stand-in, into an empty price store and then from it."""
+    server = EIAStandInServer(latency_seconds=latency_seconds)
+    server.start_in_thread()
+    eia = EIADataRetriever()
+    eia.eia_base_url = server.base_url
+    eia.api_key = "benchmark"
+    eia.price_store = EnergyPriceStore(Path(tempfile.mkdtemp()) / "energy_prices.db")
+    start_date = datetime.date(2024 - years, 1, 1)
+    end_date = datetime.date(2024, 1, 1)
+    print(
+        f"EIA fetch: {len(sts.STATES)} states x {years} years x {len(EIADataRetriever.EnergyType)} fuels, {latency_seconds} s latency",
+        file=out,
+    )
+
+    for name in ["empty store", "stored"]:
+        requests_before = server.requests_served
+        start = time.perf_counter()
+        for energy_type in EIADataRetriever.EnergyType:
+            eia.monthly_price_per_mbtu_by_energy_type_for_states(
+                energy_type, start_date, end_date
+            )
+        print(
+            f"  {name}: {time.perf_counter() - start:.3f} s, {server.requests_served - requests_before} requests",
+            file=out,
+        )
+    server.shutdown()
+
+
+def benchmark_census_fetch(latency_seconds: float, state: str) -> None:
+    """Time building a panel of a state's ZCTAs from the local Census stand-in, into an empty cache and then from it."""
+    server = CensusStandInServer(latency_seconds=latency_seconds)
+    server.start_in_thread()
+    os.environ.setdefault("CENSUS_API_KEY", "benchmark")
+    census = CensusDataRetriever()
+    census.census_base_url = server.base_url
+    census.cache = CensusCache(Path(tempfile.mkdtemp()))
+    secondarydata.CENSUS_PANEL_DIR_PATH = Path(tempfile.mkdtemp())
+    zctas = state_to_zcta_list(state)
+    print(
+        f"Census fetch: {len(DEFAULT_ACS5_PANEL_TABLES)} tables x {len(DEFAULT_ACS5_PANEL_YEARS)} years x {len(zctas)} ZCTAs in {state}, {latency_seconds} s latency",
+        file=out,
+    )
+
+    for name in ["empty cache", "cached"]:
+        secondarydata._census_label_indexes.clear()
+        requests_before = server.requests_served
+        start = time.perf_counter()
+        census.build_acs5_panel(
+            DEFAULT_ACS5_PANEL_TABLES, DEFAULT_ACS5_PANEL_YEARS, zctas, state
+        )
+        print(
+            f"  {name}: {time.perf_counter() - start:.3f} s, {server.requests_served - requests_before} requests",
+            file=out,
+        )
+    server.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark backend hot paths.")
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--listings",
+        type=int,
+        default=2_000_000,
+        help="Listings for the heating cost benchmark",
+    )
+    parser.add_argument(
+        "--census-variables",
+        type=int,
+        default=1000,
+        help="Variables per table for the Census label benchmark",
+    )
+    parser.add_argument(
+        "--census-zctas",
+        type=int,
+        default=33_000,
+        help="ZCTAs for the Census cache benchmark",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.2,
+        help="Seconds of latency for the EIA and Census stand-ins",
+    )
+    parser.add_argument(
+        "--census-state",
+        default="VA",
+        help="State whose ZCTAs the Census fetch benchmark builds a panel of",
+    )
+    # so that --help and usage errors reach the terminal
+    with redirect_stdout(out), redirect_stderr(sys.__stderr__):
+        args = parser.parse_args()
+
+    benchmark_heater_matrix(args.years, args.repeat)
+    benchmark_heating_cost(args.listings, args.repeat)
+    benchmark_census_labels(args.years, args.census_variables, args.repeat)
+    benchmark_census_cache(args.census_variables, args.census_zctas)
+    benchmark_census_enrichment(args.listings, 50, args.repeat)
+    benchmark_eia_fetch(args.years, args.latency)
+    benchmark_census_fetch(args.latency, args.census_state)
+
+
+if __name__ == "__main__":
+    main()
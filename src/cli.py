@@ -0,0 +1,337 @@
+import argparse
+import datetime
+import sys
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+import polars as pl
+
+from backend.censusjoin import enrich_metro_listings
+from backend.censusserver import DEFAULT_MEASURES_PER_TABLE, CensusStandInServer
+from backend.eiaserver import EIAStandInServer
+from backend.heatingcost import DEFAULT_MBTU_PER_SQUARE_FOOT, metro_heating_cost_df
+from backend.redfinscraper import OUTPUT_DIR_PATH, RedfinApi
+from backend.helper import state_to_zcta_list
+from backend.secondarydata import (
+    DEFAULT_ACS5_PANEL_TABLES,
+    DEFAULT_ACS5_PANEL_YEARS,
+    CensusDataRetriever,
+    EIADataRetriever,
+)
+from backend.us import states as sts
+
+# the backend redirects stdout to the log file
+out = sys.__stdout__
+
+
+def plan(args: argparse.Namespace) -> None:
+    """Print the estimated cost of crawling a metro, without making any requests."""
+    crawl_plan = RedfinApi().plan_metro_crawl(
+        args.msa_name,
+        use_cached_gis_csv_csv=args.use_cache,
+        crawl_strategy=RedfinApi.CrawlStrategy(args.strategy),
+    )
+    print(f"Crawl plan for {crawl_plan["msa_name"]}:", file=out)
+    print(f"  ZIP codes: {crawl_plan["zip_codes"]}", file=out)
+    print(
+        f"  Listings: ~{crawl_plan["listings"]}, {crawl_plan["listings_to_classify"]} left to classify",
+        file=out,
+    )
+    for endpoint, count in crawl_plan["requests"].items():
+        print(f"  {endpoint}: {count}", file=out)
+    print(
+        f"  Estimated time: {datetime.timedelta(seconds=round(crawl_plan["estimated_seconds"]))}",
+        file=out,
+    )
+
+
+def ingest_eia(args: argparse.Namespace) -> None:
+    """Load EIA bulk download archives into the energy price store."""
+    eia = EIADataRetriever()
+    for archive_path in args.archives:
+        months_stored = eia.ingest_bulk_archive(archive_path, states=args.states)
+        print(f"{archive_path}:", file=out)
+        for fuel, months in months_stored.items():
+            print(f"  {fuel}: {months} months", file=out)
+
+
+def build_price_cube(args: argparse.Namespace) -> None:
+    """Build the energy price cube for a range of years."""
+    cube_df = EIADataRetriever().build_price_cube(
+        datetime.date(args.start_year, 1, 1), datetime.date(args.end_year + 1, 1, 1)
+    )
+    print(f"Energy price cube has {cube_df.height} rows.", file=out)
+
+
+def price_cube(args: argparse.Namespace) -> None:
+    """Print a state's year of heater prices from the energy price cube."""
+    eia = EIADataRetriever()
+    cube_slice_df = eia.price_cube_slice(args.state, args.year)
+    if cube_slice_df.height == 0:
+        print(
+            f"The energy price cube has no prices for {args.state} in {args.year}. Run build-price-cube first.",
+            file=out,
+        )
+        return
+    with pl.Config(tbl_rows=-1, tbl_cols=-1):
+        print(
+            eia.pivot_price_df(cube_slice_df, columns="heater"),
+            file=out,
+        )
+
+
+def heating_cost(args: argparse.Namespace) -> None:
+    """Estimate the heating cost of every listing in a crawled metro and save it next to its `full_info.csv`."""
+    file_safe_msa_name = args.msa_name.strip().replace(", ", "_").replace(" ", "_")
+    metro_dir_path = OUTPUT_DIR_PATH / file_safe_msa_name
+    cost_df = metro_heating_cost_df(
+        metro_dir_path / "full_info.csv",
+        args.year,
+        mbtu_per_square_foot=args.mbtu_per_square_foot,
+    )
+    cost_df.write_csv(metro_dir_path / "heating_costs.csv")
+    summary_df = (
+        cost_df.group_by("current_heater")
+        .agg(
+            pl.count().alias("houses"),
+            pl.col("current_cost").mean().round(0),
+            pl.col("heat_pump_ducted_savings").mean().round(0),
+            pl.col("heat_pump_ductless_savings").mean().round(0),
+        )
+        .sort("houses", descending=True)
+    )
+    print(f"Mean yearly heating cost and heat pump savings in {args.year}:", file=out)
+    with pl.Config(tbl_rows=-1, tbl_cols=-1):
+        print(summary_df, file=out)
+    print(f"Saved to {metro_dir_path / "heating_costs.csv"}", file=out)
+
+
+def census_panel(args: argparse.Namespace) -> None:
+    """Build a panel of Census tables over several years for a metro, a state or every ZCTA."""
+    census = CensusDataRetriever()
+    if args.msa is not None:
+        panel_dir_path = census.generate_acs5_panel_for_msa(
+            args.tables, args.years, args.msa
+        )
+    elif args.state is not None:
+        state = sts.lookup(args.state)
+        panel_dir_path = census.build_acs5_panel(
+            args.tables,
+            args.years,
+            state_to_zcta_list(args.state),
+            state.abbr if state is not None else args.state,
+        )
+    else:
+        panel_dir_path = census.build_acs5_panel(args.tables, args.years)
+    if panel_dir_path is None:
+        print("Could not build the panel. See the log for details.", file=out)
+        return
+    print(f"Saved to {panel_dir_path}", file=out)
+
+
+def census_enrich(args: argparse.Namespace) -> None:
+    """Attach columns of a Census panel to every listing in a crawled metro and save them next to its `full_info.csv`."""
+    enriched_path = enrich_metro_listings(
+        args.msa_name, args.year, column_patterns=args.columns, panel_name=args.panel
+    )
+    if enriched_path is None:
+        print("Could not enrich the listings. See the log for details.", file=out)
+        return
+    print(f"Saved to {enriched_path}", file=out)
+
+
+def eia_server(args: argparse.Namespace) -> None:
+    """Run the local EIA API stand-in until interrupted."""
+    server = EIAStandInServer(
+        (args.host, args.port),
+        latency_seconds=args.latency,
+        error_rate=args.error_rate,
+    )
+    print(
+        f"Serving the EIA stand-in. Set EIA_BASE_URL={server.base_url} to use it.",
+        file=out,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+def census_server(args: argparse.Namespace) -> None:
+    """Run the local Census API stand-in until interrupted."""
+    server = CensusStandInServer(
+        (args.host, args.port),
+        latency_seconds=args.latency,
+        unknown_variable_rate=args.unknown_variable_rate,
+        measures_per_table=args.measures,
+    )
+    print(
+        f"Serving the Census stand-in. Set CENSUS_BASE_URL={server.base_url} to use it.",
+        file=out,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Run backend tasks without the GUI.",
+    )
+    subparsers = parser.add_subparsers(required=True)
+
+    plan_parser = subparsers.add_parser(
+        "plan",
+        help="Estimate the requests and time a metro crawl would take, without making any requests.",
+    )
+    plan_parser.add_argument("msa_name", help="Metropolitan Statistical Area name")
+    plan_parser.add_argument(
+        "--strategy",
+        choices=[strategy.value for strategy in RedfinApi.CrawlStrategy],
+        default=RedfinApi.CrawlStrategy.ZIP.value,
+    )
+    plan_parser.add_argument(
+        "--use-cache",
+        action="store_true",
+        help="Plan a crawl that reuses the metro's cached GIS CSV",
+    )
+    plan_parser.set_defaults(func=plan)
+
+    ingest_eia_parser = subparsers.add_parser(
+        "ingest-eia",
+        help="Load EIA bulk download zip files (ELEC, NG, PET) into the energy price store.",
+    )
+    ingest_eia_parser.add_argument(
+        "archives", nargs="+", type=Path, help="Paths to the bulk download zip files"
+    )
+    ingest_eia_parser.add_argument(
+        "--states",
+        nargs="+",
+        help="2 character postal codes of the states to load. Defaults to all states",
+    )
+    ingest_eia_parser.set_defaults(func=ingest_eia)
+
+    build_price_cube_parser = subparsers.add_parser(
+        "build-price-cube",
+        help="Compute every heater's price per MBTU for every state and month, fetching missing prices.",
+    )
+    build_price_cube_parser.add_argument("start_year", type=int)
+    build_price_cube_parser.add_argument(
+        "end_year", type=int, help="The last year, inclusive"
+    )
+    build_price_cube_parser.set_defaults(func=build_price_cube)
+
+    price_cube_parser = subparsers.add_parser(
+        "price-cube",
+        help="Print a state's heater prices per MBTU for a year from the energy price cube.",
+    )
+    price_cube_parser.add_argument("state", help="2 character postal code")
+    price_cube_parser.add_argument("year", type=int)
+    price_cube_parser.set_defaults(func=price_cube)
+
+    heating_cost_parser = subparsers.add_parser(
+        "heating-cost",
+        help="Estimate the yearly heating cost of every listing in a crawled metro, and its savings with a heat pump.",
+    )
+    heating_cost_parser.add_argument(
+        "msa_name", help="Metropolitan Statistical Area name"
+    )
+    heating_cost_parser.add_argument("year", type=int, help="The year of prices to use")
+    heating_cost_parser.add_argument(
+        "--mbtu-per-square-foot",
+        type=float,
+        default=DEFAULT_MBTU_PER_SQUARE_FOOT,
+        help="Yearly heating load per square foot, in MBTU",
+    )
+    heating_cost_parser.set_defaults(func=heating_cost)
+
+    census_panel_parser = subparsers.add_parser(
+        "census-panel",
+        help="Save ACS 5 year tables for several years as one dataset partitioned by year.",
+    )
+    census_panel_parser.add_argument(
+        "--tables",
+        nargs="+",
+        default=DEFAULT_ACS5_PANEL_TABLES,
+        help="Profile, subject and detailed tables, like S1901, DP05 or B19013",
+    )
+    census_panel_parser.add_argument(
+        "--years", nargs="+", default=DEFAULT_ACS5_PANEL_YEARS
+    )
+    census_panel_scope = census_panel_parser.add_mutually_exclusive_group()
+    census_panel_scope.add_argument(
+        "--msa", help="Only the ZCTAs of this Metropolitan Statistical Area"
+    )
+    census_panel_scope.add_argument(
+        "--state", help="Only the ZCTAs of this state. Defaults to every ZCTA"
+    )
+    census_panel_parser.set_defaults(func=census_panel)
+
+    census_enrich_parser = subparsers.add_parser(
+        "census-enrich",
+        help="Attach Census panel columns to every listing in a crawled metro, by the ZCTA of its ZIP code.",
+    )
+    census_enrich_parser.add_argument(
+        "msa_name", help="Metropolitan Statistical Area name"
+    )
+    census_enrich_parser.add_argument("year", type=int, help="The panel year to use")
+    census_enrich_parser.add_argument(
+        "--columns",
+        nargs="+",
+        help="Column names or case insensitive regular expressions. Defaults to every column",
+    )
+    census_enrich_parser.add_argument(
+        "--panel",
+        help="The panel to use. Defaults to the metro's panel from census-panel --msa",
+    )
+    census_enrich_parser.set_defaults(func=census_enrich)
+
+    eia_server_parser = subparsers.add_parser(
+        "eia-server",
+        help="Run a local stand-in for the EIA API with synthetic prices.",
+    )
+    eia_server_parser.add_argument("--host", default="127.0.0.1")
+    eia_server_parser.add_argument("--port", type=int, default=8765)
+    eia_server_parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to every response"
+    )
+    eia_server_parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of requests answered with a 503",
+    )
+    eia_server_parser.set_defaults(func=eia_server)
+
+    census_server_parser = subparsers.add_parser(
+        "census-server",
+        help="Run a local stand-in for the Census API with synthetic ACS tables.",
+    )
+    census_server_parser.add_argument("--host", default="127.0.0.1")
+    census_server_parser.add_argument("--port", type=int, default=8766)
+    census_server_parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to every response"
+    )
+    census_server_parser.add_argument(
+        "--unknown-variable-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of data requests answered with an unknown variable 400",
+    )
+    census_server_parser.add_argument(
+        "--measures",
+        type=int,
+        default=DEFAULT_MEASURES_PER_TABLE,
+        help="Estimated quantities in each synthetic table",
+    )
+    census_server_parser.set_defaults(func=census_server)
+
+    # so that --help and usage errors reach the terminal
+    with redirect_stdout(out), redirect_stderr(sys.__stderr__):
+        args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
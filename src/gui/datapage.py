@@ -5,12 +5,17 @@ import threading
 import webbrowser
 
 import customtkinter as ctk
+import polars as pl
 
 # from matplotlib.backend_bases import key_press_handler
 from backend import EIADataRetriever, helper
+from backend.crawlplanner import CrawlPhase, CrawlProgress
 from backend.helper import log
-from backend.secondarydata import CensusDataRetriever
-from backend.us import states as sts
+from backend.secondarydata import (
+    DEFAULT_ACS5_PANEL_TABLES,
+    DEFAULT_ACS5_PANEL_YEARS,
+    CensusDataRetriever,
+)
 from CTkMessagebox import CTkMessagebox
 from matplotlib import pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
@@ -111,6 +116,11 @@ class DataPage(ctk.CTkFrame):
             text="Generate Census data",
             command=self.generate_census_reports,
         )
+        self.crawl_progress_bar = ctk.CTkProgressBar(self.log_frame)
+        self.crawl_progress_bar.set(0)
+        self.crawl_progress_label = ctk.CTkLabel(
+            self.log_frame, text="", font=self.roboto_font
+        )
         self.census_reporter_state_label.bind(
             "<Button-1>", lambda x: self.open_census_reporter_state()
         )
@@ -152,7 +162,7 @@ class DataPage(ctk.CTkFrame):
 
         self.census_reporter_frame.rowconfigure((0, 1), weight=1)
 
-        self.log_frame.rowconfigure(0, weight=1)
+        self.log_frame.rowconfigure((0, 1, 2), weight=1)
 
         # placement
         self.content_frame.grid(column=0, row=0, sticky="news")
@@ -179,6 +189,10 @@ class DataPage(ctk.CTkFrame):
         self.log_frame.grid(column=0, row=3, sticky="news")
         self.census_button.grid(column=0, row=0, pady=10, padx=(0, 10))
         self.log_button.grid(column=1, row=0, pady=10, padx=(10, 0))
+        self.crawl_progress_bar.grid(
+            column=0, row=1, columnspan=2, sticky="ew", padx=20
+        )
+        self.crawl_progress_label.grid(column=0, row=2, columnspan=2)
 
     def set_msa_name(self, msa_name: str) -> None:
         """Set the msa name and update objects that rely on the msa name. Includes drop downs and and generating the energy plot.
@@ -209,19 +223,67 @@ class DataPage(ctk.CTkFrame):
             daemon=True,
         ).start()
 
+    def track_crawl_progress(self, progress: CrawlProgress) -> None:
+        """Show the progress of a crawl and its interim heating estimate, polling until the crawl is done or has failed.
+
+        Args:
+            progress (CrawlProgress): the progress of the crawl
+        """
+        snapshot = progress.snapshot()
+        self.crawl_progress_bar.set(snapshot["fraction"])
+        text = f"{snapshot["phase"]}: {snapshot["done"]}/{snapshot["total"]}"
+        top_categories = sorted(
+            snapshot["interim_estimate"].items(), key=lambda x: x[1], reverse=True
+        )[:3]
+        if len(top_categories) > 0:
+            text += " | Interim estimate: " + ", ".join(
+                f"{category} {share:.0%}" for category, share in top_categories
+            )
+        self.crawl_progress_label.configure(text=text)
+        if snapshot["phase"] not in (CrawlPhase.DONE, CrawlPhase.FAILED):
+            self.after(1000, self.track_crawl_progress, progress)
+
     def generate_energy_plot(self, year: int, state: str) -> None:
         """Call the EIA API and generate a plot with the received data.
 
         Note:
             Call this in a thread so that it doesn't freeze the GUI
             Update: might want to just get the data and plot on the main thread
+
+            Prices are read from the energy price cube when it has the state and year and the year is not stale, see `EIADataRetriever.is_price_cube_slice_stale`. Otherwise they are fetched through the price store, and if the EIA has any for the year, the cube is built for the year in the background.
         """
+        heater_labels = {
+            "PROPANE_FURNACE": "Propane Furnace",
+            "OIL_BOILER": "Heating Oil Boiler",
+            "NG_FURNACE": "Natural Gas Furnace",
+            "HEAT_PUMP_DUCTED": "Ducted Heat Pump",
+        }
         eia = EIADataRetriever()
-        energy_price_per_mbtu_by_type_for_state = (
-            eia.monthly_price_per_mbtu_by_energy_type_by_state(
-                state, datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+        start_date = datetime.date(year, 1, 1)
+        end_date = datetime.date(year + 1, 1, 1)
+        heater_price_df = eia.price_cube_slice(state, year)
+        if eia.is_price_cube_slice_stale(heater_price_df, year):
+            heater_price_df = eia.heater_price_per_mbtu_df(
+                eia.monthly_price_per_mbtu_df_by_state(state, start_date, end_date)
             )
+            # a year the EIA has no prices for yet would be built again on every plot
+            if heater_price_df.get_column("price_per_mbtu").is_not_null().any():
+                eia.build_price_cube_in_background(start_date, end_date)
+        price_df = eia.pivot_price_df(
+            heater_price_df.filter(pl.col("heater").is_in(list(heater_labels))),
+            columns="heater",
         )
+        # every month of the year, so that missing months plot as gaps
+        price_df = pl.DataFrame(
+            {
+                "period": pl.date_range(
+                    datetime.date(year, 1, 1),
+                    datetime.date(year, 12, 1),
+                    "1mo",
+                    eager=True,
+                )
+            }
+        ).join(price_df, on="period", how="left")
 
         fig = Figure(layout="compressed", facecolor="#dbdbdb")
         ax = fig.add_subplot()
@@ -255,50 +317,15 @@ class DataPage(ctk.CTkFrame):
             labels[i] = month_names[i]
         ax.set_xticklabels(labels)
 
-        for energy_dict in energy_price_per_mbtu_by_type_for_state:
-            if len(energy_dict) < 3:
-                log(
-                    f"Issue with energy type {energy_dict.get("type")} for state {energy_dict.get("state")}",
-                    "debug",
-                )
+        for heater, label in heater_labels.items():
+            if heater not in price_df.columns:
+                log(f"No {heater} prices for state {state}", "debug")
                 continue
-            match energy_dict.get("type"):
-                case EIADataRetriever.EnergyType.PROPANE.value:
-                    result_list = []
-                    for month in months:
-                        key = f"{year}-{month:02}"
-                        val = energy_dict.get(key, float("NaN"))
-                        if val is None:
-                            val = float("NaN")
-                        result_list.append(val)
-                    ax.plot(months, result_list, label="Propane Furnace")
-                case EIADataRetriever.EnergyType.HEATING_OIL.value:
-                    result_list = []
-                    for month in months:
-                        key = f"{year}-{month:02}"
-                        val = energy_dict.get(key, float("NaN"))
-                        if val is None:
-                            val = float("NaN")
-                        result_list.append(val)
-                    ax.plot(months, result_list, label="Heating Oil Boiler")
-                case EIADataRetriever.EnergyType.NATURAL_GAS.value:
-                    result_list = []
-                    for month in months:
-                        key = f"{year}-{month:02}"
-                        val = energy_dict.get(key, float("NaN"))
-                        if val is None:
-                            val = float("NaN")
-                        result_list.append(val)
-                    ax.plot(months, result_list, label="Natural Gas Furnace")
-                case EIADataRetriever.EnergyType.ELECTRICITY.value:
-                    result_list = []
-                    for month in months:
-                        key = f"{year}-{month:02}"
-                        val = energy_dict.get(key, float("NaN"))
-                        if val is None:
-                            val = float("NaN")
-                        result_list.append(val)
-                    ax.plot(months, result_list, label="Ducted Heat Pump")
+            ax.plot(
+                months,
+                price_df[heater].fill_null(float("NaN")).to_list(),
+                label=label,
+            )
         ax.legend()
         with threading.Lock():
             canvas = FigureCanvasTkAgg(fig, master=self.energy_graph_frame)
@@ -313,14 +340,12 @@ class DataPage(ctk.CTkFrame):
 
     def open_census_reporter_state(self) -> None:
         """Census reporter state label callback"""
-        state_link = helper.get_census_report_url_page(
-            sts.lookup(self.select_state_dropdown.get()).name  # type: ignore
-        )
+        state_link = helper.census_reporter_url(self.select_state_dropdown.get())
         webbrowser.open_new_tab(state_link)
 
     def open_census_reporter_metro(self) -> None:
         """Census reporter metro label callback"""
-        metro_link = helper.get_census_report_url_page(f"{self.msa_name} metro area")  # type: ignore
+        metro_link = helper.census_reporter_url(self.msa_name)  # type: ignore
         webbrowser.open_new_tab(metro_link)
 
     def state_dropdown_callback(self, state: str) -> None:
@@ -383,19 +408,14 @@ class DataPage(ctk.CTkFrame):
             )
 
     def generate_census_reports(self) -> None:
+        """Build a panel of census tables over recent years for the ZCTAs of the selected MSA."""
         log("Fetching census reports...", "info")
-        c = CensusDataRetriever()
-        threading.Thread(
-            target=c.generate_acs5_subject_table_group_for_zcta_by_year,
-            args=(
-                "S1901",
-                "2019",
-            ),
-        ).start()
         threading.Thread(
-            target=c.generate_acs5_profile_table_group_for_zcta_by_year,
+            target=CensusDataRetriever().generate_acs5_panel_for_msa,
             args=(
-                "DP05",
-                "2019",
+                DEFAULT_ACS5_PANEL_TABLES,
+                DEFAULT_ACS5_PANEL_YEARS,
+                self.msa_name,
             ),
+            daemon=True,
         ).start()
@@ -73,6 +73,12 @@ class SearchPage(ctk.CTkFrame):
             command=self.validate_entry_box_and_search,
         )
         self.cache_chb = ctk.CTkCheckBox(self.search_frame, text="Use cache")
+        self.tile_chb = ctk.CTkCheckBox(self.search_frame, text="Crawl by tile")
+        CTkToolTip(
+            self.tile_chb,
+            delay=0.25,
+            message="Cover the MSA with map tiles instead of searching each ZIP code.\nUses fewer requests for MSAs with many sparse ZIP codes.",
+        )
 
         self.columnconfigure((0, 2), weight=1)
         self.columnconfigure(1, weight=4)
@@ -89,11 +95,12 @@ class SearchPage(ctk.CTkFrame):
         self.suggestion_list_box.grid(column=1, row=2, sticky="new", pady=(10, 0))
 
         self.search_frame.columnconfigure(0, weight=1)
-        self.search_frame.rowconfigure((0, 1), weight=1)
+        self.search_frame.rowconfigure((0, 1, 2), weight=1)
         # pady is hacky but whatever
         self.search_frame.grid(column=2, row=1, padx=(40, 0), pady=(46, 0))
         self.search_button.grid(column=0, row=0, sticky="w")
         self.cache_chb.grid(column=0, row=1, pady=(20, 0), sticky="w")
+        self.tile_chb.grid(column=0, row=2, pady=(10, 0), sticky="w")
 
         self.suggestion_list_box.grid_remove()
         self.search_bar.bind(
@@ -185,6 +192,8 @@ class SearchPage(ctk.CTkFrame):
             msa_name (str): Metropolitan Statistical Area name
         """
         redfin_searcher = RedfinApi()
+        if self.data_page is not None:
+            self.data_page.track_crawl_progress(redfin_searcher.progress)
         lock = threading.Lock()
         with lock:
             threading.Thread(
@@ -193,6 +202,9 @@ class SearchPage(ctk.CTkFrame):
                     msa_name,
                     self.filters_page.get_values(),
                     bool(self.cache_chb.get()),
+                    RedfinApi.CrawlStrategy.TILE
+                    if self.tile_chb.get()
+                    else RedfinApi.CrawlStrategy.ZIP,
                 ),
                 daemon=True,
             ).start()
@@ -0,0 +1,72 @@
+import polars as pl
+import pytest
+
+from backend.censuscache import CensusCache
+from backend.secondarydata import CensusDataRetriever
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CensusCache(tmp_path / "cache")
+
+
+def test_put_chunks_round_trip(cache):
+    cache.put_chunks("response.json", [b'[["a",', b' "b"]]'])
+
+    assert cache.contains("response.json")
+    with cache.open_text("response.json") as f:
+        assert f.read() == '[["a", "b"]]'
+
+
+def test_put_json_round_trip(cache):
+    cache.put_json("groups.json", {"variables": {"A": {"label": "x"}}})
+
+    assert cache.get_json("groups.json") == {"variables": {"A": {"label": "x"}}}
+
+
+def test_corrupt_entry_is_removed(tmp_path, cache):
+    cache.put_json("groups.json", [1, 2, 3])
+    (tmp_path / "cache" / "groups.json.gz").write_bytes(b"not gzip")
+
+    reopened_cache = CensusCache(tmp_path / "cache")
+    assert reopened_cache.get_json("groups.json") is None
+    assert not reopened_cache.contains("groups.json")
+
+
+def test_failed_write_leaves_no_files(tmp_path, cache):
+    def chunks():
+        yield b"[1,"
+        raise ConnectionError("connection lost")
+
+    with pytest.raises(ConnectionError):
+        cache.put_chunks("response.json", chunks())
+
+    assert not cache.contains("response.json")
+    assert [path.name for path in (tmp_path / "cache").iterdir()] == ["cache_index.db"]
+
+
+def test_evict_removes_least_recently_read(tmp_path):
+    cache = CensusCache(tmp_path / "cache", max_bytes=1)
+    cache.put_df("old.arrow", pl.DataFrame({"a": [1]}))
+    cache.put_df("new.arrow", pl.DataFrame({"a": [2]}))
+
+    assert not cache.contains("old.arrow")
+    assert cache.get_df("new.arrow").get_column("a").to_list() == [2]
+
+
+def test_unparsable_response_is_removed(cache):
+    census = CensusDataRetriever()
+    census.cache = cache
+    # a truncated body still matches its checksum
+    cache.put_chunks("response.json", [b'[["A", "zip code tabulation area"], ["1"'])
+
+    df = census._cached_response_df(
+        "response.json",
+        "http://127.0.0.1:9/data",
+        lambda headers: {0: ("A", pl.Int64)},
+        "response.arrow",
+    )
+
+    assert df is None
+    assert not cache.contains("response.json")
+    assert not cache.contains("response.arrow")
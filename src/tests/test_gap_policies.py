@@ -0,0 +1,87 @@
+import datetime
+
+import polars as pl
+import pytest
+
+from backend.secondarydata import GAP_FILL_LOOKBACK_YEARS, EIADataRetriever
+
+HEATING_SEASON_MONTHS = [1, 2, 3, 10, 11, 12]
+
+
+@pytest.fixture
+def eia():
+    return EIADataRetriever()
+
+
+def price_lf(prices: dict[datetime.date, float]) -> pl.LazyFrame:
+    return pl.LazyFrame(
+        {
+            "state": ["VA"] * len(prices),
+            "fuel": ["PROPANE"] * len(prices),
+            "period": list(prices),
+            "raw_price": list(prices.values()),
+            "unit": ["$/gal"] * len(prices),
+        }
+    )
+
+
+def fill(eia, prices, gap_policy) -> pl.DataFrame:
+    return eia.fill_price_gaps(
+        price_lf(prices),
+        datetime.date(2023, 1, 1),
+        datetime.date(2024, 1, 1),
+        gap_policy,
+    ).collect()
+
+
+def heating_season_prices(years: list[int]) -> dict[datetime.date, float]:
+    return {
+        datetime.date(year, month, 1): year - 2000 + month / 100
+        for year in years
+        for month in HEATING_SEASON_MONTHS
+    }
+
+
+def test_null_policy_leaves_gaps(eia):
+    df = fill(eia, heating_season_prices([2023]), eia.GapPolicy.NULL)
+
+    assert df.height == 12
+    assert df.get_column("raw_price").null_count() == 6
+    assert not df.get_column("filled").any()
+
+
+def test_forward_fill_policy(eia):
+    prices = heating_season_prices([2022, 2023])
+    del prices[datetime.date(2023, 1, 1)]
+
+    df = fill(eia, prices, eia.GapPolicy.FORWARD_FILL)
+
+    assert df.get_column("raw_price").to_list()[:4] == [22.12, 23.02, 23.03, 23.03]
+    assert df.filter(pl.col("filled")).height == 7
+
+
+def test_seasonal_policy_uses_the_same_month_of_earlier_years(eia):
+    prices = heating_season_prices([2021, 2022, 2023])
+    del prices[datetime.date(2023, 2, 1)]
+
+    df = fill(eia, prices, eia.GapPolicy.SEASONAL)
+
+    assert df.get_column("raw_price").to_list()[1] == 22.02
+
+
+def test_seasonal_policy_fills_off_season_months(eia):
+    df = fill(eia, heating_season_prices([2022, 2023]), eia.GapPolicy.SEASONAL)
+
+    off_season_df = df.filter(pl.col("period").dt.month().is_between(4, 9))
+    assert off_season_df.get_column("raw_price").to_list() == [23.03] * 6
+    assert off_season_df.get_column("filled").all()
+
+
+def test_gap_fill_start_date(eia):
+    start_date = datetime.date(2023, 1, 1)
+
+    assert eia.gap_fill_start_date(start_date, None) == start_date
+    assert eia.gap_fill_start_date(start_date, eia.GapPolicy.NULL) == start_date
+    assert eia.gap_fill_start_date(start_date, eia.GapPolicy.SEASONAL) == datetime.date(
+        2023 - GAP_FILL_LOOKBACK_YEARS, 1, 1
+    )
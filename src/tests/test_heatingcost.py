@@ -0,0 +1,36 @@
+import polars as pl
+import pytest
+
+from backend.heatingcost import current_heater_expr
+from backend.redfinscraper import CATEGORY_PATTERNS
+
+
+def classify(heating_text: str) -> str | None:
+    df = pl.DataFrame(
+        {
+            category: [pattern.search(heating_text) is not None]
+            for category, pattern in CATEGORY_PATTERNS.items()
+        }
+    )
+    return df.select(current_heater_expr()).item()
+
+
+@pytest.mark.parametrize(
+    "heating_text, heater",
+    [
+        ("Heat Pump, Forced Air, Natural Gas", "HEAT_PUMP_DUCTED"),
+        ("Propane Gas, Forced Air", "PROPANE_FURNACE"),
+        ("Propane Gas, Radiator", "PROPANE_BOILER"),
+        ("Natural Gas, Forced Air", "NG_FURNACE"),
+        ("Gas, Hot Water Boiler", "NG_BOILER"),
+        ("Oil, Furnace", "OIL_FURNACE"),
+        ("Oil, Radiator", "OIL_BOILER"),
+        ("Electric, Baseboard", "BASEBOARD"),
+    ],
+)
+def test_current_heater(heating_text, heater):
+    assert classify(heating_text) == heater
+
+
+def test_current_heater_without_a_known_fuel():
+    assert classify("Wood Stove") is None
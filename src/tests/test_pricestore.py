@@ -0,0 +1,78 @@
+import datetime
+import sqlite3
+
+import pytest
+
+from backend.pricestore import EnergyPriceStore, first_revisable_period, month_periods
+
+TODAY = datetime.date(2024, 6, 15)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return EnergyPriceStore(tmp_path / "energy_prices.db")
+
+
+def set_fetched_at(store, fetched_at):
+    with sqlite3.connect(store.db_path) as conn:
+        conn.execute("UPDATE prices SET fetched_at = ?", (fetched_at,))
+
+
+def test_month_periods():
+    assert month_periods(datetime.date(2023, 11, 1), datetime.date(2024, 2, 1)) == [
+        "2023-11",
+        "2023-12",
+        "2024-01",
+    ]
+    assert month_periods(datetime.date(2024, 1, 1), datetime.date(2024, 1, 1)) == []
+
+
+def test_first_revisable_period():
+    assert first_revisable_period(TODAY) == "2024-03"
+    assert first_revisable_period(datetime.date(2024, 2, 1)) == "2023-11"
+
+
+def test_missing_periods_skips_stored_and_future_months(store):
+    store.put_prices("ELECTRICITY", "VA", {"2023-01": 14.1, "2023-02": 14.5}, "c", "s")
+
+    assert store.missing_periods(
+        "ELECTRICITY", "VA", ["2023-01", "2023-02", "2023-03", "2024-07"], TODAY
+    ) == ["2023-03"]
+
+
+def test_missing_periods_refetches_stale_revisable_months(store):
+    store.put_prices("ELECTRICITY", "VA", {"2023-01": 14.1, "2024-04": 15.0}, "c", "s")
+    assert (
+        store.missing_periods("ELECTRICITY", "VA", ["2023-01", "2024-04"], TODAY) == []
+    )
+
+    set_fetched_at(store, "2000-01-01T00:00:00")
+
+    assert store.missing_periods(
+        "ELECTRICITY", "VA", ["2023-01", "2024-04"], TODAY
+    ) == ["2024-04"]
+
+
+def test_missing_periods_refetches_stale_null_months(store):
+    store.put_prices("NATURAL_GAS", "VA", {"2023-01": None, "2023-02": 12.0}, "c", "s")
+    assert (
+        store.missing_periods("NATURAL_GAS", "VA", ["2023-01", "2023-02"], TODAY) == []
+    )
+
+    set_fetched_at(store, "2000-01-01T00:00:00")
+
+    assert store.missing_periods(
+        "NATURAL_GAS", "VA", ["2023-01", "2023-02"], TODAY
+    ) == ["2023-01"]
+
+
+def test_get_price_df(store):
+    store.put_prices("PROPANE", "VA", {"2023-01": 2.5, "2023-02": None}, "$/gal", "s")
+
+    df = store.get_price_df(["PROPANE"], ["VA"], "2023-01", "2023-12")
+
+    assert df.get_column("period").to_list() == [
+        datetime.date(2023, 1, 1),
+        datetime.date(2023, 2, 1),
+    ]
+    assert df.get_column("raw_price").to_list() == [2.5, None]
@@ -0,0 +1,105 @@
+import io
+import json
+
+import polars as pl
+import pytest
+
+from backend import secondarydata
+from backend.secondarydata import (
+    CENSUS_JAM_VALUES,
+    census_rows_to_df,
+    iter_json_array_rows,
+)
+
+ROWS = [
+    ["NAME", "DP05_0001E", "zip code tabulation area"],
+    ["ZCTA5 20001", "43486", "20001"],
+    ["ZCTA5 20002", None, "20002"],
+    ["ZCTA5 20003", "-666666666", "20003"],
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64, 1 << 16])
+def test_iter_json_array_rows_splits_rows_across_reads(monkeypatch, chunk_size):
+    monkeypatch.setattr(secondarydata, "JSON_READ_CHUNK_SIZE", chunk_size)
+    text = json.dumps(ROWS, indent=1)
+
+    assert list(iter_json_array_rows(io.StringIO(text))) == ROWS
+
+
+def test_iter_json_array_rows_keeps_strings_with_separators(monkeypatch):
+    monkeypatch.setattr(secondarydata, "JSON_READ_CHUNK_SIZE", 3)
+    rows = [["a, ]b", "[c]"], {"d": "e\n,f"}]
+
+    assert list(iter_json_array_rows(io.StringIO(json.dumps(rows)))) == rows
+
+
+def test_iter_json_array_rows_empty_array():
+    assert list(iter_json_array_rows(io.StringIO(" \n[ ]"))) == []
+
+
+def test_iter_json_array_rows_empty_body():
+    with pytest.raises(ValueError):
+        list(iter_json_array_rows(io.StringIO("")))
+
+
+def test_iter_json_array_rows_not_an_array():
+    with pytest.raises(ValueError):
+        list(iter_json_array_rows(io.StringIO('{"error": "unknown variable"}')))
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '[["a", "1"], ["b", "2"]',
+        '[["a", "1"], ["b", "2"],',
+        '[["a", "1"], ["b", "2',
+    ],
+)
+def test_iter_json_array_rows_truncated_array(monkeypatch, text):
+    monkeypatch.setattr(secondarydata, "JSON_READ_CHUNK_SIZE", 4)
+    rows = iter_json_array_rows(io.StringIO(text))
+
+    assert next(rows) == ["a", "1"]
+    with pytest.raises(ValueError):
+        list(rows)
+
+
+def test_census_rows_to_df_nulls_jam_values(monkeypatch):
+    monkeypatch.setattr(secondarydata, "CENSUS_ROWS_PER_BATCH", 2)
+    rows = [
+        [str(jam_value), str(jam_value), "ZCTA5 00000"]
+        for jam_value in CENSUS_JAM_VALUES
+    ] + [["12", "3.5", "ZCTA5 20001"], [None, "", "ZCTA5 20002"]]
+
+    df = census_rows_to_df(
+        rows,
+        {
+            0: ("estimate", pl.Int64),
+            1: ("percent", pl.Float64),
+            2: ("name", pl.Utf8),
+        },
+    )
+
+    jam_nulls = [None] * len(CENSUS_JAM_VALUES)
+    assert df.schema == {"estimate": pl.Int64, "percent": pl.Float64, "name": pl.Utf8}
+    assert df.get_column("estimate").to_list() == jam_nulls + [12, None]
+    assert df.get_column("percent").to_list() == jam_nulls + [3.5, None]
+    assert df.get_column("name").to_list()[-1] == "ZCTA5 20002"
+
+
+def test_census_rows_to_df_keeps_only_wanted_columns():
+    df = census_rows_to_df(
+        iter(ROWS[1:]),
+        {1: ("DP05_0001E", pl.Int64), 2: ("ZCTA", pl.Utf8)},
+    )
+
+    assert df.columns == ["DP05_0001E", "ZCTA"]
+    assert df.get_column("DP05_0001E").to_list() == [43486, None, None]
+
+
+def test_census_rows_to_df_no_rows():
+    df = census_rows_to_df([], {0: ("DP05_0001E", pl.Int64)})
+
+    assert df.height == 0
+    assert df.schema == {"DP05_0001E": pl.Int64}